@@ -0,0 +1,210 @@
+import hashlib
+import re
+import threading
+import time
+import zlib
+from typing import Iterable, Optional, Tuple
+import numpy as np
+
+# Cache of assistant answers keyed by the question asked. A question is first looked up by the
+# hash of its normalized text, then by cosine similarity between hashed word and character
+# n-gram vectors, so rephrasings of an already answered question reuse its answer without a
+# model call. Entries expire after ttl seconds and can be invalidated per game. Only
+# self-contained questions are cached: one that refers back to the conversation ("tell me
+# more", "is it any good?") has an answer that depends on the asker's thread.
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset("a an the in on of to for and or is are do does did i me my you your it its how what can could would should please".split())
+
+# Words that refer back to earlier turns of a conversation
+CONTEXT_WORDS = frozenset("it its that this these those them they he she him her one ones more else again also instead there then same other another".split())
+MIN_CONTENT_WORDS = 2
+
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 1.0
+CHAR_NGRAM_WEIGHT = 0.3
+
+# Words that carry the question's meaning. A similar (not identical) question only reuses an
+# answer when these match exactly: "Sonic the Hedgehog 2" and "Super Mario 64 DS" score close
+# to the original title but ask about a different game.
+def content_words(normalized_question: str) -> frozenset:
+    return frozenset(word for word in normalized_question.split() if word not in STOPWORDS)
+
+# Lower-case words with punctuation removed; the exact-match key and the text game titles are matched against
+def normalize_question(question: str) -> str:
+    return " ".join(_WORD.findall(question.lower()))
+
+# True if the question can be answered without the conversation it was asked in
+def is_self_contained(question: str) -> bool:
+    words = normalize_question(question).split()
+    if any(word in CONTEXT_WORDS for word in words):
+        return False
+    return sum(word not in STOPWORDS for word in words) >= MIN_CONTENT_WORDS
+
+def question_key(question: str) -> str:
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()
+
+# Signed feature hashing of words, word bigrams and character trigrams into a unit-length vector
+def question_vector(question: str, dimensions: int) -> np.ndarray:
+    words = [word for word in normalize_question(question).split() if word not in STOPWORDS]
+    features = [(word, WORD_WEIGHT) for word in words]
+    features += [(f"{first} {second}", BIGRAM_WEIGHT) for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [(f"#{padded[i:i + 3]}", CHAR_NGRAM_WEIGHT) for i in range(len(padded) - 2)]
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature, weight in features:
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % dimensions] += weight if digest & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class AnswerCache:
+    def __init__(self,
+                 threshold: float = 0.9,
+                 ttl: float = 7 * 24 * 3600,
+                 max_entries: int = 10000,
+                 dimensions: int = 1024):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.dimensions = dimensions
+        self._vectors = np.zeros((min(max_entries, 1024), dimensions), dtype=np.float32)
+        self._stored_at = np.full(len(self._vectors), -np.inf)
+        # Per slot: (exact key, normalized question, answer), or None for a free slot
+        self._entries = [None] * len(self._vectors)
+        self._slots = {}
+        self._used = 0
+        self._next_slot = 0
+        self._lock = threading.RLock()
+        self._counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0, "uncacheable": 0}
+
+    # Cached answer for the question, or None. Returns (answer, similarity) where similarity
+    # is 1.0 for an exact match.
+    def lookup(self, question: str) -> Optional[Tuple[str, float]]:
+        if not is_self_contained(question):
+            with self._lock:
+                self._counters["uncacheable"] += 1
+            return None
+        now = time.time()
+        key = question_key(question)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None and self._is_fresh(slot, now):
+                self._counters["exact_hits"] += 1
+                return self._entries[slot][2], 1.0
+
+            if self._used:
+                vector = question_vector(question, self.dimensions)
+                scores = self._vectors[:self._used] @ vector
+                # Expired and invalidated slots can never match
+                scores[self._stored_at[:self._used] + self.ttl <= now] = -1.0
+                candidates = np.flatnonzero(scores >= self.threshold)
+                if len(candidates):
+                    words = content_words(normalize_question(question))
+                    for slot in candidates[np.argsort(-scores[candidates])]:
+                        if content_words(self._entries[slot][1]) == words:
+                            self._counters["similar_hits"] += 1
+                            return self._entries[slot][2], float(scores[slot])
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, question: str, answer: str, stored_at: Optional[float] = None):
+        if not answer or not is_self_contained(question):
+            return
+        key = question_key(question)
+        vector = question_vector(question, self.dimensions)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._allocate()
+            self._entries[slot] = (key, normalize_question(question), answer)
+            self._vectors[slot] = vector
+            self._stored_at[slot] = time.time() if stored_at is None else stored_at
+            self._slots[key] = slot
+            self._counters["stores"] += 1
+
+    # Load past (question, answer, stored_at) triples, oldest first so newer answers win
+    def warm(self, interactions: Iterable[Tuple[str, str, float]]) -> int:
+        loaded = 0
+        for question, answer, stored_at in interactions:
+            if time.time() < stored_at + self.ttl:
+                self.put(question, answer, stored_at)
+                loaded += 1
+        return loaded
+
+    # Drop every cached answer whose question mentions the game
+    def invalidate_game(self, game_title: str) -> int:
+        title = normalize_question(game_title)
+        if not title:
+            return 0
+        pattern = re.compile(rf"(?:^| ){re.escape(title)}(?: |$)")
+        with self._lock:
+            slots = [slot for slot, entry in enumerate(self._entries[:self._used]) if entry and pattern.search(entry[1])]
+            for slot in slots:
+                self._free(slot)
+            self._counters["invalidations"] += len(slots)
+        return len(slots)
+
+    def invalidate_question(self, question: str) -> bool:
+        with self._lock:
+            slot = self._slots.get(question_key(question))
+            if slot is None:
+                return False
+            self._free(slot)
+            self._counters["invalidations"] += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            for slot in range(self._used):
+                self._entries[slot] = None
+            self._vectors[:] = 0
+            self._stored_at[:] = -np.inf
+            self._slots.clear()
+            self._used = 0
+            self._next_slot = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._slots)
+        return stats
+
+    def _is_fresh(self, slot: int, now: float) -> bool:
+        return now < self._stored_at[slot] + self.ttl
+
+    # Called with self._lock held. Slots fill up in order; once max_entries are in use the
+    # oldest slot is reused, so the matrix never grows past max_entries rows.
+    def _allocate(self) -> int:
+        if self._used < self.max_entries:
+            if self._used == len(self._vectors):
+                self._grow()
+            slot = self._used
+            self._used += 1
+            return slot
+        slot = self._next_slot
+        self._next_slot = (self._next_slot + 1) % self.max_entries
+        if self._entries[slot] is not None:
+            self._counters["evictions"] += 1
+            self._free(slot)
+        return slot
+
+    def _grow(self):
+        capacity = min(self.max_entries, len(self._vectors) * 2)
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        vectors[:len(self._vectors)] = self._vectors
+        stored_at = np.full(capacity, -np.inf)
+        stored_at[:len(self._stored_at)] = self._stored_at
+        self._vectors, self._stored_at = vectors, stored_at
+        self._entries.extend([None] * (capacity - len(self._entries)))
+
+    def _free(self, slot: int):
+        entry = self._entries[slot]
+        if entry is not None and self._slots.get(entry[0]) == slot:
+            del self._slots[entry[0]]
+        self._entries[slot] = None
+        self._vectors[slot] = 0
+        self._stored_at[slot] = -np.inf
@@ -0,0 +1,169 @@
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from bson import ObjectId
+import game_assistant
+from telemetry import request_context
+
+# Batch answering for offline workloads (imported tickets, evaluation sets). Reads
+# {"userId", "question"} records from a JSONL or CSV file, optionally with an "id" column
+# (the record's line number otherwise), and answers them through the normal routing with
+# BATCH_WORKERS in parallel. Results and per-stage timings are appended to the output file
+# after each batch of interactions is stored with one bulk write, so an interrupted run is
+# resumed by starting it again: records already in the output without an error are skipped.
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+BATCH_WRITE_SIZE = int(os.getenv("BATCH_WRITE_SIZE", "100"))
+
+def read_records(input_path):
+    with open(input_path, encoding="utf-8", newline="") as input_file:
+        if input_path.lower().endswith(".csv"):
+            rows = csv.DictReader(input_file)
+        else:
+            rows = (json.loads(line) if line.strip() else None for line in input_file)
+        for line_number, row in enumerate(rows, start=1):
+            if not row:
+                continue
+            user_id, question = row.get("userId"), row.get("question")
+            if not user_id or not question:
+                logging.warning(f"Skipping record {line_number}: userId and question are required")
+                continue
+            yield {"id": str(row.get("id") or line_number), "userId": str(user_id), "question": question}
+
+# Ids of records already answered by a previous run
+def completed_ids(output_path):
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as output_file:
+            for line in output_file:
+                if line.strip():
+                    result = json.loads(line)
+                    if not result.get("error"):
+                        done.add(result["id"])
+    return done
+
+# Interaction ids derived from the record, so storing a record again after a crash is a no-op
+def interaction_id(record):
+    digest = hashlib.sha1(f"{record['userId']}\0{record['id']}\0{record['question']}".encode("utf-8")).digest()
+    return ObjectId(digest[:12])
+
+class BatchRunner:
+    def __init__(self, output_path, workers=BATCH_WORKERS, write_size=BATCH_WRITE_SIZE):
+        self.output_path = output_path
+        self.workers = workers
+        self.write_size = write_size
+        self.counts = {"answered": 0, "failed": 0, "skipped": 0}
+        self._users = {}
+        self._user_locks = {}
+        self._locks_lock = threading.Lock()
+        self._buffer = []
+
+    # One user's questions are answered in order, since they share the user's assistant thread
+    def _user_lock(self, user_id):
+        with self._locks_lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def answer(self, record):
+        start = time.perf_counter()
+        result = {"id": record["id"], "userId": record["userId"], "question": record["question"]}
+        interaction = None
+        try:
+            with self._user_lock(record["userId"]):
+                with request_context("batch", correlation_id=record["id"]) as context:
+                    user = self._users.get(record["userId"])
+                    if user is None:
+                        user = self._users[record["userId"]] = game_assistant.get_or_create_user(record["userId"])
+                    response, source = game_assistant.generate_answer_with_source(user, record["question"])
+            result.update(response=response, source=source)
+            interaction = game_assistant.build_interaction(
+                record["userId"], record["question"], response, source, interaction_id(record), user.get("threadTurns")
+            )
+        except Exception as e:
+            logging.error(f"Error answering record {record['id']}: {e}")
+            result["error"] = str(e)
+            context = None
+        result["seconds"] = round(time.perf_counter() - start, 6)
+        if context is not None:
+            result["stages"] = {stage: round(seconds, 6) for stage, seconds in context.stage_seconds().items()}
+        return result, interaction
+
+    def run(self, records):
+        done = completed_ids(self.output_path)
+        start = time.perf_counter()
+        pending = set()
+        with open(self.output_path, "a", encoding="utf-8") as output_file:
+            executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+            try:
+                for record in records:
+                    if record["id"] in done:
+                        self.counts["skipped"] += 1
+                        continue
+                    done.add(record["id"])
+                    pending.add(executor.submit(self.answer, record))
+                    # Keep only a small window of records in memory however large the input is
+                    if len(pending) >= self.workers * 2:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self._collect(finished, output_file)
+                finished, pending = wait(pending)
+                self._collect(finished, output_file)
+            except KeyboardInterrupt:
+                logging.warning("Interrupted, saving finished records; run again to resume")
+                executor.shutdown(wait=True, cancel_futures=True)
+                self._collect([future for future in pending if future.done() and not future.cancelled()], output_file)
+                raise
+            finally:
+                executor.shutdown(wait=False)
+                self._write(output_file)
+
+        elapsed = time.perf_counter() - start
+        processed = self.counts["answered"] + self.counts["failed"]
+        logging.info(f"Batch finished: {self.counts} in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.2f} records/s)")
+        return self.counts
+
+    def _collect(self, futures, output_file):
+        for future in futures:
+            self._buffer.append(future.result())
+        if len(self._buffer) >= self.write_size:
+            self._write(output_file)
+
+    # Store the buffered interactions with one bulk write, then record them in the output
+    def _write(self, output_file):
+        if not self._buffer:
+            return
+        interactions = [interaction for _, interaction in self._buffer if interaction is not None]
+        if interactions:
+            try:
+                game_assistant.persist_interactions(interactions)
+            except Exception as e:
+                logging.error(f"Error saving {len(interactions)} interactions: {e}")
+                for result, interaction in self._buffer:
+                    if interaction is not None:
+                        result["error"] = f"not saved: {e}"
+
+        for result, _ in self._buffer:
+            self.counts["failed" if result.get("error") else "answered"] += 1
+            output_file.write(json.dumps(result, default=str) + "\n")
+        output_file.flush()
+        self._buffer = []
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of (userId, question) records")
+    parser.add_argument("input", help="JSONL or CSV file with userId and question fields")
+    parser.add_argument("--output", help="JSONL results file (default: <input>.answers.jsonl)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--write-size", type=int, default=BATCH_WRITE_SIZE)
+    args = parser.parse_args()
+
+    game_assistant.check_environment()
+    game_assistant.ensure_indexes()
+    runner = BatchRunner(args.output or f"{args.input}.answers.jsonl", args.workers, args.write_size)
+    runner.run(read_records(args.input))
+
+if __name__ == "__main__":
+    main()
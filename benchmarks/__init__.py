@@ -0,0 +1,2 @@
+# Offline benchmarks: local stand-ins for every upstream plus a synthetic catalog, run with
+# python -m benchmarks.run (see benchmarks/run.py for the scenarios and options)
@@ -0,0 +1,410 @@
+import http.server
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import types
+import urllib.parse
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# One local HTTP server standing in for the Twitch token endpoint, IGDB, RAWG and the
+# OpenAI Assistants API. Each service lives under its own path prefix and has its own
+# latency, error rate and 429 injection, so a benchmark never touches the network.
+
+SERVICES = ("twitch", "igdb", "rawg", "openai")
+
+@dataclass
+class Fault:
+    latency: float = 0.0          # seconds added to every response
+    jitter: float = 0.0           # latency varies uniformly by +/- this fraction
+    error_rate: float = 0.0       # fraction of requests answered with a 500
+    rate_limit_rate: float = 0.0  # fraction of requests answered with a 429
+    retry_after: float = 1.0      # Retry-After sent with injected 429s, in seconds
+
+IGDB_QUERY_PATTERN = re.compile(r'where name ~ "((?:[^"\\]|\\.)*)";')
+IGDB_MULTIQUERY_PATTERN = re.compile(r'query games "(\d+)" \{ [^{}]*?where name ~ "((?:[^"\\]|\\.)*)"; \};')
+THREAD_PATH = re.compile(r"^/threads/([^/]+)/(messages|runs)(?:/([^/]+))?(?:/(cancel))?$")
+
+class FakeUpstreams:
+    def __init__(self,
+                 faults: Optional[Dict[str, Fault]] = None,
+                 miss_rate: float = 0.1,
+                 run_seconds: float = 0.5,
+                 token_expires_in: int = 3600,
+                 seed: int = 0,
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        self.faults = {service: Fault() for service in SERVICES}
+        self.faults.update(faults or {})
+        self.miss_rate = miss_rate
+        self.run_seconds = run_seconds
+        self.token_expires_in = token_expires_in
+        self.counters = {service: {"requests": 0, "errors": 0, "rate_limited": 0} for service in SERVICES}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._assistants = {}
+        self._threads = {}
+        self._runs = {}
+
+        handler = type("Handler", (_Handler,), {"upstreams": self})
+        self._server = http.server.ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Environment variables pointing the application at this server
+    def environment(self) -> Dict[str, str]:
+        return {
+            "TWITCH_TOKEN_URL": f"{self.base_url}/twitch/oauth2/token",
+            "IGDB_API_URL": f"{self.base_url}/igdb/v4",
+            "RAWG_API_URL": f"{self.base_url}/rawg/api",
+            "OPENAI_BASE_URL": f"{self.base_url}/openai/v1",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {service: dict(counters) for service, counters in self.counters.items()}
+
+    # Apply the service's latency and decide whether to inject a failure: returns None or (status, retry_after)
+    def inject(self, service: str):
+        fault = self.faults[service]
+        with self._lock:
+            self.counters[service]["requests"] += 1
+            roll = self._random.random()
+            spread = self._random.uniform(-fault.jitter, fault.jitter)
+        if fault.latency:
+            time.sleep(max(0.0, fault.latency * (1 + spread)))
+        if roll < fault.rate_limit_rate:
+            self._count(service, "rate_limited")
+            return 429, fault.retry_after
+        if roll < fault.rate_limit_rate + fault.error_rate:
+            self._count(service, "errors")
+            return 500, None
+        return None
+
+    def _count(self, service: str, name: str):
+        with self._lock:
+            self.counters[service][name] += 1
+
+    # A title is found unless it falls in the configured miss fraction, decided by a stable hash
+    def is_known(self, title: str) -> bool:
+        return zlib.crc32(title.lower().encode("utf-8")) % 1000 >= self.miss_rate * 1000
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._ids):08d}"
+
+    # Assistants API state
+    def create_assistant(self, body: dict, assistant_id: Optional[str] = None) -> dict:
+        with self._lock:
+            assistant = self._assistants.get(assistant_id) or {"id": self.new_id("asst"), "object": "assistant", "created_at": int(time.time())}
+            assistant.update({key: body[key] for key in ("name", "instructions", "model", "tools") if key in body})
+            self._assistants[assistant["id"]] = assistant
+            return assistant
+
+    def get_assistant(self, assistant_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._assistants.get(assistant_id)
+
+    def create_thread(self) -> dict:
+        thread = {"id": self.new_id("thread"), "object": "thread", "created_at": int(time.time()), "metadata": {}}
+        with self._lock:
+            self._threads[thread["id"]] = []
+        return thread
+
+    def add_message(self, thread_id: str, role: str, text: str, run_id: Optional[str] = None, message_id: Optional[str] = None) -> Optional[dict]:
+        message = {
+            "id": message_id or self.new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "run_id": run_id,
+            "status": "completed",
+            "attachments": [],
+            "metadata": {},
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        }
+        with self._lock:
+            if thread_id not in self._threads:
+                return None
+            self._threads[thread_id].append(message)
+        return message
+
+    def list_messages(self, thread_id: str, run_id: Optional[str], order: str, limit: int) -> Optional[dict]:
+        with self._lock:
+            if thread_id not in self._threads:
+                return None
+            messages = [message for message in self._threads[thread_id] if run_id is None or message["run_id"] == run_id]
+        if order == "desc":
+            messages = messages[::-1]
+        data = messages[:limit]
+        return {
+            "object": "list",
+            "data": data,
+            "first_id": data[0]["id"] if data else None,
+            "last_id": data[-1]["id"] if data else None,
+            "has_more": len(messages) > limit,
+        }
+
+    def create_run(self, thread_id: str, body: dict) -> Optional[dict]:
+        with self._lock:
+            if thread_id not in self._threads:
+                return None
+        run = {
+            "id": self.new_id("run"),
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "assistant_id": body.get("assistant_id"),
+            "status": "queued",
+            "model": "fake",
+            "instructions": "",
+            "tools": [],
+            "metadata": {},
+            "parallel_tool_calls": True,
+            "truncation_strategy": body.get("truncation_strategy"),
+        }
+        with self._lock:
+            self._runs[run["id"]] = (run, time.monotonic() + self.run_seconds)
+        return run
+
+    # A run created with "stream": true: the Assistants streaming events as (event, data) pairs,
+    # with the answer sent one word at a time so the first token arrives well before the run ends
+    def stream_run(self, thread_id: str, body: dict):
+        run = self.create_run(thread_id, body)
+        if run is None:
+            return None
+        with self._lock:
+            run["answered"] = True
+        return self._run_events(run)
+
+    def _run_events(self, run: dict):
+        public = lambda: {key: value for key, value in run.items() if key != "answered"}
+        yield "thread.run.created", public()
+        with self._lock:
+            run["status"] = "in_progress"
+        yield "thread.run.in_progress", public()
+
+        message_id = self.new_id("msg")
+        words = f"Here is some advice about {self._last_user_message(run['thread_id'])}.".split(" ")
+        message = {
+            "id": message_id, "object": "thread.message", "created_at": int(time.time()), "thread_id": run["thread_id"],
+            "role": "assistant", "run_id": run["id"], "status": "in_progress", "attachments": [], "metadata": {},
+            "assistant_id": run["assistant_id"], "content": [],
+        }
+        yield "thread.message.created", message
+        for i, word in enumerate(words):
+            time.sleep(self.run_seconds / len(words))
+            with self._lock:
+                if run["status"] == "cancelled":
+                    yield "thread.run.cancelled", public()
+                    return
+            text = word if i == 0 else f" {word}"
+            yield "thread.message.delta", {
+                "id": message_id,
+                "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": text, "annotations": []}}]},
+            }
+
+        completed = self.add_message(run["thread_id"], "assistant", " ".join(words), run_id=run["id"], message_id=message_id)
+        yield "thread.message.completed", dict(completed, assistant_id=run["assistant_id"])
+        with self._lock:
+            run["status"] = "completed"
+        yield "thread.run.completed", public()
+
+    def get_run(self, run_id: str, cancel: bool = False) -> Optional[dict]:
+        with self._lock:
+            if run_id not in self._runs:
+                return None
+            run, done_at = self._runs[run_id]
+            if run["status"] in ("queued", "in_progress"):
+                if cancel:
+                    run["status"] = "cancelled"
+                elif time.monotonic() >= done_at:
+                    run["status"] = "completed"
+                else:
+                    run["status"] = "in_progress"
+            finished = run["status"] == "completed" and not run.get("answered")
+            if finished:
+                run["answered"] = True
+        if finished:
+            question = self._last_user_message(run["thread_id"])
+            self.add_message(run["thread_id"], "assistant", f"Here is some advice about {question}.", run_id=run_id)
+        return {key: value for key, value in run.items() if key != "answered"}
+
+    def _last_user_message(self, thread_id: str) -> str:
+        with self._lock:
+            for message in reversed(self._threads.get(thread_id, [])):
+                if message["role"] == "user":
+                    return message["content"][0]["text"]["value"]
+        return "your game"
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    upstreams: FakeUpstreams = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # Clients hanging up mid-stream (a cancelled answer) are expected, not server errors
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            self.close_connection = True
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str):
+        url = urllib.parse.urlsplit(self.path)
+        service, _, path = url.path.lstrip("/").partition("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+
+        if service not in SERVICES:
+            return self._send(404, {"error": "unknown service"})
+        failure = self.upstreams.inject(service)
+        if failure:
+            status, retry_after = failure
+            headers = {}
+            if retry_after is not None:
+                headers = {"Retry-After": str(math.ceil(retry_after)), "retry-after-ms": str(int(retry_after * 1000))}
+            return self._send(status, {"error": {"message": "injected failure", "type": "fake"}}, headers)
+
+        handler = getattr(self, f"_{service}")
+        status, result = handler(method, "/" + path, urllib.parse.parse_qs(url.query), body)
+        self._send(status, result)
+
+    def _send(self, status: int, result, headers: Optional[dict] = None):
+        if isinstance(result, types.GeneratorType):
+            return self._send_events(result)
+        payload = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # Server-sent events in chunked encoding, ending with the "done" event like the OpenAI API
+    def _send_events(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for event, data in itertools.chain(events, [("done", "[DONE]")]):
+                chunk = f"event: {event}\ndata: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            events.close()
+
+    def _twitch(self, method, path, query, body):
+        return 200, {"access_token": self.upstreams.new_id("token"), "expires_in": self.upstreams.token_expires_in, "token_type": "bearer"}
+
+    def _igdb_games(self, title: str) -> list:
+        if not self.upstreams.is_known(title):
+            return []
+        return [{
+            "id": zlib.crc32(title.encode("utf-8")),
+            "name": title,
+            "release_dates": [{"date": 946684800}],
+            "platforms": [{"name": "PC"}, {"name": "PlayStation 4"}],
+            "developers": [{"name": "Fake Studio"}],
+            "publishers": [{"name": "Fake Publisher"}],
+        }]
+
+    def _igdb(self, method, path, query, body):
+        if path == "/v4/games":
+            match = IGDB_QUERY_PATTERN.search(body)
+            return 200, self._igdb_games(_unescape(match.group(1))) if match else []
+        if path == "/v4/multiquery":
+            return 200, [
+                {"name": label, "result": self._igdb_games(_unescape(title))}
+                for label, title in IGDB_MULTIQUERY_PATTERN.findall(body)
+            ]
+        return 404, {"message": "not found"}
+
+    def _rawg(self, method, path, query, body):
+        if path != "/api/games":
+            return 404, {"detail": "not found"}
+        title = query.get("search", [""])[0]
+        results = []
+        if self.upstreams.is_known(title):
+            results.append({"name": title, "released": "2000-01-01", "platforms": [{"platform": {"name": "PC"}}]})
+        return 200, {"count": len(results), "results": results}
+
+    def _openai(self, method, path, query, body):
+        upstreams = self.upstreams
+        payload = json.loads(body) if body else {}
+        if not path.startswith("/v1/"):
+            return 404, _openai_error("not found")
+        path = path[len("/v1"):]
+
+        if path == "/assistants" and method == "POST":
+            return 200, upstreams.create_assistant(payload)
+        if path.startswith("/assistants/"):
+            assistant_id = path[len("/assistants/"):]
+            if upstreams.get_assistant(assistant_id) is None:
+                return 404, _openai_error(f"No assistant found with id '{assistant_id}'.")
+            if method == "POST":
+                return 200, upstreams.create_assistant(payload, assistant_id)
+            return 200, upstreams.get_assistant(assistant_id)
+        if path == "/threads" and method == "POST":
+            return 200, upstreams.create_thread()
+
+        match = THREAD_PATH.match(path)
+        if not match:
+            return 404, _openai_error("not found")
+        thread_id, collection, item_id, action = match.groups()
+        if collection == "messages":
+            if method == "POST":
+                result = upstreams.add_message(thread_id, payload.get("role", "user"), str(payload.get("content", "")))
+            else:
+                result = upstreams.list_messages(
+                    thread_id,
+                    query.get("run_id", [None])[0],
+                    query.get("order", ["desc"])[0],
+                    int(query.get("limit", ["20"])[0])
+                )
+        elif item_id is None and payload.get("stream"):
+            result = upstreams.stream_run(thread_id, payload)
+        elif item_id is None:
+            result = upstreams.create_run(thread_id, payload)
+        else:
+            result = upstreams.get_run(item_id, cancel=action == "cancel")
+        return (200, result) if result is not None else (404, _openai_error("not found"))
+
+def _unescape(title: str) -> str:
+    return title.replace('\\"', '"')
+
+def _openai_error(message: str) -> dict:
+    return {"error": {"message": message, "type": "invalid_request_error", "code": None}}
@@ -0,0 +1,299 @@
+import copy
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# In-memory stand-in for the parts of the pymongo API the assistant uses: find/find_one with
+# equality and comparison filters, projections, sort and limit, insert_one/insert_many,
+# update_one/update_many with $set/$inc/$max/$unset/$setOnInsert and upserts, bulk_write and create_index
+# (unique indexes included).
+# The first field of every created index gets a hash index so equality lookups stay cheap,
+# and latency adds a fixed delay per operation to imitate a database round trip.
+
+class MemoryDatabase:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> "MemoryCollection":
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(name, self.latency)
+            return self._collections[name]
+
+    def list_collection_names(self) -> List[str]:
+        with self._lock:
+            return list(self._collections)
+
+class MemoryCollection:
+    def __init__(self, name: str, latency: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self._documents: Dict[Any, dict] = {}
+        self._indexes: Dict[str, Dict[Any, set]] = {}
+        self._unique = set()
+        self._lock = threading.RLock()
+
+    def create_index(self, keys, **kwargs) -> str:
+        field = keys if isinstance(keys, str) else keys[0][0]
+        with self._lock:
+            if field not in self._indexes:
+                index = defaultdict(set)
+                for document_id, document in self._documents.items():
+                    index[_hashable(_get(document, field))].add(document_id)
+                self._indexes[field] = index
+            if kwargs.get("unique"):
+                self._unique.add(field)
+        return f"{field}_1"
+
+    def count_documents(self, query: dict) -> int:
+        self._delay()
+        with self._lock:
+            return sum(1 for _ in self._matching(query))
+
+    def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None) -> Optional[dict]:
+        self._delay()
+        with self._lock:
+            for document in self._matching(query or {}):
+                return _project(document, projection)
+        return None
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None) -> "MemoryCursor":
+        return MemoryCursor(self, query or {}, projection)
+
+    def insert_one(self, document: dict):
+        self._delay()
+        with self._lock:
+            self._insert(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def insert_many(self, documents: Iterable[dict], ordered: bool = True):
+        self._delay()
+        documents = list(documents)
+        write_errors = []
+        with self._lock:
+            for position, document in enumerate(documents):
+                try:
+                    self._insert(document)
+                except DuplicateKeyError as e:
+                    write_errors.append({"index": position, "code": 11000, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors})
+        return SimpleNamespace(inserted_ids=[document["_id"] for document in documents])
+
+    def update_one(self, query: dict, update: dict, upsert: bool = False):
+        self._delay()
+        with self._lock:
+            matched, upserted_id = self._update_one(query, update, upsert)
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_id=upserted_id)
+
+    def update_many(self, query: dict, update: dict):
+        self._delay()
+        with self._lock:
+            documents = list(self._matching(query))
+            for document in documents:
+                self._unindex(document)
+                for operator, fields in update.items():
+                    _apply(document, fields, operator)
+                self._index(document)
+        return SimpleNamespace(matched_count=len(documents), modified_count=len(documents), upserted_id=None)
+
+    def bulk_write(self, operations: List[Any], ordered: bool = True):
+        self._delay()
+        result = SimpleNamespace(inserted_count=0, matched_count=0, modified_count=0, upserted_count=0)
+        with self._lock:
+            for operation in operations:
+                if isinstance(operation, InsertOne):
+                    self._insert(operation._doc)
+                    result.inserted_count += 1
+                elif isinstance(operation, UpdateOne):
+                    matched, upserted_id = self._update_one(operation._filter, operation._doc, operation._upsert)
+                    result.matched_count += matched
+                    result.modified_count += matched
+                    result.upserted_count += upserted_id is not None
+                else:
+                    raise NotImplementedError(f"{type(operation).__name__} is not supported")
+        return result
+
+    def _delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    # Called with self._lock held
+    def _insert(self, document: dict):
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        if document["_id"] in self._documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        for field in self._unique:
+            if self._indexes[field].get(_hashable(_get(document, field))):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {field}_1")
+        stored = copy.deepcopy(document)
+        self._documents[stored["_id"]] = stored
+        self._index(stored)
+
+    # Returns (number of documents matched, id of the upserted document or None)
+    def _update_one(self, query: dict, update: dict, upsert: bool):
+        document = next(self._matching(query), None)
+        if document is None:
+            if not upsert:
+                return 0, None
+            document = {field: value for field, value in query.items() if not isinstance(value, dict)}
+            _apply(document, update.get("$setOnInsert", {}), "$set")
+            inserting = True
+        else:
+            self._unindex(document)
+            inserting = False
+
+        for operator, fields in update.items():
+            if operator != "$setOnInsert":
+                _apply(document, fields, operator)
+
+        if inserting:
+            self._insert(document)
+            return 0, document["_id"]
+        self._index(document)
+        return 1, None
+
+    def _index(self, document: dict):
+        for field, index in self._indexes.items():
+            index[_hashable(_get(document, field))].add(document["_id"])
+
+    def _unindex(self, document: dict):
+        for field, index in self._indexes.items():
+            index[_hashable(_get(document, field))].discard(document["_id"])
+
+    # Candidate documents for a query, narrowed through a hash index when one covers an equality term
+    def _matching(self, query: dict):
+        candidates = None
+        for field, condition in query.items():
+            if field in self._indexes and not isinstance(condition, dict):
+                candidates = self._indexes[field].get(_hashable(condition), set())
+                break
+            if field == "_id" and not isinstance(condition, dict):
+                candidates = {condition} if condition in self._documents else set()
+                break
+        documents = self._documents.values() if candidates is None else (self._documents[i] for i in list(candidates))
+        return (document for document in documents if _matches(document, query))
+
+class MemoryCursor:
+    def __init__(self, collection: MemoryCollection, query: dict, projection: Optional[dict]):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._limit = 0
+
+    def sort(self, key, direction: int = 1) -> "MemoryCursor":
+        self._sort = [(key, direction)] if isinstance(key, str) else list(key)
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    def __iter__(self):
+        collection = self._collection
+        collection._delay()
+        with collection._lock:
+            documents = list(collection._matching(self._query))
+            for field, direction in reversed(self._sort):
+                documents.sort(key=lambda document: _sort_key(_get(document, field)), reverse=direction < 0)
+            if self._limit:
+                documents = documents[:self._limit]
+            return iter([_project(document, self._projection) for document in documents])
+
+def _get(document: dict, path: str):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def _set(document: dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+def _unset(document: dict, path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(parts[-1], None)
+
+def _apply(document: dict, fields: dict, operator: str):
+    for path, value in fields.items():
+        current = _get(document, path)
+        if operator == "$set":
+            _set(document, path, copy.deepcopy(value))
+        elif operator == "$inc":
+            _set(document, path, (current or 0) + value)
+        elif operator == "$max":
+            if current is None or value > current:
+                _set(document, path, value)
+        elif operator == "$min":
+            if current is None or value < current:
+                _set(document, path, value)
+        elif operator == "$unset":
+            _unset(document, path)
+        else:
+            raise NotImplementedError(f"Update operator {operator} is not supported")
+
+_COMPARISONS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$in": lambda value, operand: value in operand,
+    "$exists": lambda value, operand: (value is not None) == bool(operand),
+}
+
+def _matches(document: dict, query: dict) -> bool:
+    for path, condition in query.items():
+        value = _get(document, path)
+        if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            for operator, operand in condition.items():
+                if operator not in _COMPARISONS:
+                    raise NotImplementedError(f"Query operator {operator} is not supported")
+                if not _COMPARISONS[operator](value, operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def _project(document: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return copy.deepcopy(document)
+    include_id = projection.get("_id", 1)
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        result = {field: copy.deepcopy(document[field]) for field in included if field in document}
+    else:
+        excluded = {field for field, flag in projection.items() if not flag}
+        result = {field: copy.deepcopy(value) for field, value in document.items() if field not in excluded}
+    if include_id and "_id" in document:
+        result["_id"] = document["_id"]
+    else:
+        result.pop("_id", None)
+    return result
+
+def _hashable(value):
+    return value if not isinstance(value, (dict, list)) else repr(value)
+
+# Orders None first, as MongoDB does for missing fields
+def _sort_key(value):
+    return (value is not None, value)
@@ -0,0 +1,311 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+import numpy as np
+from bson import ObjectId
+from benchmarks.fake_upstreams import FakeUpstreams, Fault, SERVICES
+from benchmarks.memory_mongo import MemoryDatabase
+from benchmarks.synthetic_catalog import write_catalog
+
+# Offline benchmarks for the hot paths, run against FakeUpstreams, MemoryDatabase and a
+# synthetic catalog so they need no credentials or network access:
+#
+#   python -m benchmarks.run --rows 1000000 --requests 2000 --concurrency 32 \
+#       --fault igdb:latency=0.15,rate_limit_rate=0.02 --fault openai:error_rate=0.01
+#
+# Every scenario reports p50/p95/p99 latency and throughput; --json keeps the results so
+# runs can be compared to catch regressions.
+
+SCENARIOS = ("fetch", "search", "recommendations", "end_to_end")
+
+QUESTION_TEMPLATES = [
+    "How do I beat the final boss in {title}?",
+    "Give me tips and tricks for {title}",
+    "How long does it take to complete {title}?",
+    "What are some games similar to {title}",
+    "Recommend a {genre} game",
+    "I want a genre {genre}",
+    "Is {title} a good {keyword} game?",
+    "I love {keyword} games like {title}",
+]
+
+# Latency figures for a list of per-call durations (seconds)
+def summarize(name: str, latencies: List[float], errors: int, wall_seconds: float) -> dict:
+    milliseconds = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99]) if len(milliseconds) else (0.0, 0.0, 0.0)
+    return {
+        "scenario": name,
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(milliseconds.mean()), 3) if len(milliseconds) else 0.0,
+        "max_ms": round(float(milliseconds.max()), 3) if len(milliseconds) else 0.0,
+        "throughput_per_s": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+# Call function once per input with the given number of concurrent callers and time every call
+def measure(name: str, function: Callable, inputs: list, concurrency: int = 1) -> dict:
+    def timed(argument):
+        start = time.perf_counter()
+        try:
+            function(argument)
+            failed = False
+        except Exception as e:
+            logging.debug(f"{name} failed: {e}")
+            failed = True
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="benchmark") as executor:
+            results = list(executor.map(timed, inputs))
+    else:
+        results = [timed(argument) for argument in inputs]
+    wall_seconds = time.perf_counter() - start
+
+    result = summarize(name, [latency for latency, _ in results], sum(failed for _, failed in results), wall_seconds)
+    logging.info(f"{name}: p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, {result['throughput_per_s']}/s")
+    return result
+
+def timed_once(name: str, function: Callable) -> dict:
+    start = time.perf_counter()
+    function()
+    return summarize(name, [time.perf_counter() - start], 0, time.perf_counter() - start)
+
+# Parse "service:name=value,name=value" into (service, Fault keyword arguments)
+def parse_fault(spec: str):
+    service, _, settings = spec.partition(":")
+    if service not in SERVICES:
+        raise argparse.ArgumentTypeError(f"unknown service {service!r}, expected one of {', '.join(SERVICES)}")
+    values = {}
+    for setting in filter(None, settings.split(",")):
+        name, _, value = setting.partition("=")
+        if name not in Fault.__dataclass_fields__:
+            raise argparse.ArgumentTypeError(f"unknown fault setting {name!r}")
+        values[name] = float(value)
+    return service, values
+
+def build_faults(args) -> Dict[str, Fault]:
+    faults = {}
+    for service in SERVICES:
+        faults[service] = Fault(
+            latency=args.openai_latency if service == "openai" else args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            retry_after=args.retry_after,
+        )
+    for service, values in args.fault:
+        for name, value in values.items():
+            setattr(faults[service], name, value)
+    return faults
+
+# Start the fakes and point the application at them; must run before game_assistant is imported,
+# since upstream URLs and credentials are read at import time
+def prepare_environment(args) -> FakeUpstreams:
+    upstreams = FakeUpstreams(
+        faults=build_faults(args),
+        miss_rate=args.miss_rate,
+        run_seconds=args.run_seconds,
+        seed=args.seed,
+    ).start()
+
+    os.environ.update(upstreams.environment())
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "RAWG_API_KEY": "benchmark",
+        "NEXT_PUBLIC_TWITCH_CLIENT_ID": "benchmark",
+        "TWITCH_CLIENT_SECRET": "benchmark",
+        "MONGODB_URI": "memory://benchmark",
+        "CATALOG_PATH": args.catalog,
+        "INTERACTION_WRITE_BEHIND": "true" if args.write_behind else "false",
+    })
+    # Nothing may persist between runs or leak in from a local .env
+    for name in ("API_CACHE_DB_PATH", "TWITCH_TOKEN_CACHE_PATH", "ASSISTANT_REGISTRY_PATH", "WRITE_BEHIND_SPILL_PATH"):
+        os.environ[name] = ""
+    return upstreams
+
+def synthetic_question(rng: random.Random, titles: List[str], genres: List[str], keywords: List[str]) -> str:
+    return rng.choice(QUESTION_TEMPLATES).format(title=rng.choice(titles), genre=rng.choice(genres), keyword=rng.choice(keywords))
+
+def synthetic_history(rng: random.Random, user_id: str, size: int, titles, genres, keywords) -> List[dict]:
+    start = datetime.datetime(2020, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "userId": user_id,
+            "question": synthetic_question(rng, titles, genres, keywords),
+            "response": "Benchmark response.",
+            "timestamp": start + datetime.timedelta(minutes=i),
+        }
+        for i in range(size)
+    ]
+
+def scenario_fetch(game_assistant, args, rng, titles) -> List[dict]:
+    from game_api_helper import api_cache
+
+    api_cache.clear()
+    sample = rng.sample(titles, min(args.requests, len(titles)))
+    return [
+        measure("fetch_data_from_all_sources (cold cache)", game_assistant.fetch_data_from_all_sources, sample, args.concurrency),
+        measure("fetch_data_from_all_sources (warm cache)", game_assistant.fetch_data_from_all_sources, sample, args.concurrency),
+    ]
+
+def scenario_search(game_assistant, args, rng, titles) -> List[dict]:
+    facet_index = game_assistant.get_facet_index()
+    genres = facet_index.values("genre")
+    consoles = facet_index.values("console")
+
+    words = [word for title in rng.sample(titles, min(args.requests, len(titles))) for word in title.split() if len(word) > 3]
+    substrings = [rng.choice(words) for _ in range(args.requests)]
+    prefixes = [word[:rng.randint(3, len(word))] for word in substrings]
+    exact = [rng.choice(titles) for _ in range(args.requests)]
+    facets = [
+        {"genre": rng.choice(genres), "console": rng.choice(consoles), "year_from": rng.randint(1990, 2015), "page": rng.randint(1, 3)}
+        for _ in range(args.requests)
+    ]
+    return [
+        measure("search_game_by_name (all substring matches)", game_assistant.search_game_by_name, substrings, args.concurrency),
+        measure("search_game_by_name (top 10)", lambda query: game_assistant.search_game_by_name(query, limit=10), prefixes, args.concurrency),
+        measure("fetch_from_csv (exact title)", game_assistant.fetch_from_csv, exact, args.concurrency),
+        measure("search_games (genre + console + years)", lambda facet: game_assistant.search_games(**facet), facets, args.concurrency),
+        measure("answer_genre_question", game_assistant.answer_genre_question, [facet["genre"] for facet in facets], args.concurrency),
+        measure("answer_similar_question", game_assistant.answer_similar_question, exact, args.concurrency),
+    ]
+
+def scenario_recommendations(game_assistant, args, rng, titles) -> List[dict]:
+    genres = game_assistant.get_facet_index().values("genre")
+    keywords = list(game_assistant.RECOMMENDATION_KEYWORDS)
+    history = synthetic_history(rng, "benchmark-history", args.history, titles, genres, keywords)
+
+    results = [
+        measure(f"generate_recommendations ({args.history} interactions)", game_assistant.generate_recommendations, [history] * args.iterations),
+    ]
+
+    # The stored path: history written through persist_interactions and read back
+    for start in range(0, len(history), 1000):
+        game_assistant.persist_interactions([dict(interaction) for interaction in history[start:start + 1000]])
+    results.append(measure("get_recommendations (stored keyword counts)", game_assistant.get_recommendations, ["benchmark-history"] * args.iterations))
+    results.append(measure(
+        f"get_previous_interactions + generate_recommendations ({args.history} interactions)",
+        lambda user_id: game_assistant.generate_recommendations(game_assistant.get_previous_interactions(user_id)),
+        ["benchmark-history"] * max(1, args.iterations // 10)
+    ))
+    return results
+
+def scenario_end_to_end(game_assistant, args, rng, titles) -> List[dict]:
+    genres = game_assistant.get_facet_index().values("genre")
+    keywords = list(game_assistant.RECOMMENDATION_KEYWORDS)
+    requests = [
+        (f"benchmark-user-{rng.randrange(args.users)}", synthetic_question(rng, titles, genres, keywords))
+        for _ in range(args.requests)
+    ]
+    results = [measure("answer_question", lambda request: game_assistant.answer_question(*request), requests, args.concurrency)]
+    if game_assistant.interaction_queue is not None:
+        results.append(timed_once("write-behind drain", game_assistant.interaction_queue.flush))
+    return results
+
+SCENARIO_FUNCTIONS = {
+    "fetch": scenario_fetch,
+    "search": scenario_search,
+    "recommendations": scenario_recommendations,
+    "end_to_end": scenario_end_to_end,
+}
+
+def print_report(results: List[dict]):
+    header = f"{'scenario':<72} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'ops/s':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(f"{result['scenario']:<72} {result['count']:>6} {result['errors']:>6} {result['p50_ms']:>9.2f} "
+              f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['max_ms']:>9.2f} {result['throughput_per_s']:>9.1f}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the game assistant")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic catalog size")
+    parser.add_argument("--catalog", help="catalog CSV to use instead of generating one")
+    parser.add_argument("--workdir", help="directory for generated files (default: a temporary directory)")
+    parser.add_argument("--requests", type=int, default=500, help="calls per measured operation")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=50, help="repetitions of the recommendation scenarios")
+    parser.add_argument("--history", type=int, default=10_000, help="interactions in the long user history")
+    parser.add_argument("--users", type=int, default=100, help="distinct users in the end-to-end scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to Twitch, IGDB and RAWG responses")
+    parser.add_argument("--openai-latency", type=float, default=0.02, help="seconds added to every Assistants API response")
+    parser.add_argument("--run-seconds", type=float, default=0.5, help="time until a fake assistant run completes")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--miss-rate", type=float, default=0.1, help="fraction of titles the fake APIs do not know")
+    parser.add_argument("--fault", type=parse_fault, action="append", default=[],
+                        help="per-service override, e.g. igdb:latency=0.2,rate_limit_rate=0.05")
+    parser.add_argument("--mongo-latency", type=float, default=0.0, help="seconds added to every database operation")
+    parser.add_argument("--write-behind", action="store_true", help="save interactions through the write-behind queue")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    if not args.catalog:
+        args.catalog = os.path.join(workdir, f"catalog-{args.rows}-{args.seed}.csv")
+        if not os.path.exists(args.catalog):
+            write_catalog(args.catalog, args.rows, args.seed)
+
+    upstreams = prepare_environment(args)
+    import game_assistant
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    game_assistant.set_database(MemoryDatabase(latency=args.mongo_latency))
+    game_assistant.ensure_indexes()
+
+    results = [
+        timed_once("catalog load", game_assistant.get_video_games_df),
+        timed_once("catalog title index build", game_assistant.get_catalog_index),
+        timed_once("catalog facet index build", game_assistant.get_facet_index),
+        timed_once("catalog similarity index build", game_assistant.get_similarity_index),
+    ]
+    rng = random.Random(args.seed)
+    titles = game_assistant.get_video_games_df()["title"].dropna().astype(str).tolist()
+
+    try:
+        for scenario in args.scenario or SCENARIOS:
+            results.extend(SCENARIO_FUNCTIONS[scenario](game_assistant, args, rng, titles))
+    finally:
+        if game_assistant.interaction_queue is not None:
+            game_assistant.interaction_queue.close()
+        upstreams.stop()
+
+    from game_api_helper import api_cache
+    from telemetry import registry
+    print_report(results)
+    print(f"\nUpstream requests: {json.dumps(upstreams.stats())}")
+    print(f"API cache: {json.dumps(api_cache.stats())}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output_file:
+            json.dump({
+                "settings": {name: value for name, value in vars(args).items() if name != "fault"},
+                "faults": {service: vars(fault) for service, fault in upstreams.faults.items()},
+                "upstreams": upstreams.stats(),
+                "api_cache": api_cache.stats(),
+                "telemetry": registry.snapshot(),
+                "results": results,
+            }, output_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import logging
+import os
+import numpy as np
+import pandas as pd
+from csv_helper import read_csv_file
+
+# Synthetic game catalogs in the layout of "Video Games Data.csv", at any size. When the real
+# catalog is available its consoles, genres, publishers, years and title words are sampled
+# with their real frequencies; otherwise a built-in vocabulary is used.
+
+CONSOLES = ["PS4", "PS3", "PS2", "X360", "XOne", "PC", "Wii", "WiiU", "NS", "DS", "3DS", "GBA", "PSP", "PSV", "GC", "N64", "SNES", "NES", "GB", "DC"]
+GENRES = ["Action", "Action-Adventure", "Adventure", "Fighting", "Misc", "Platform", "Puzzle", "Racing", "Role-Playing", "Shooter", "Simulation", "Sports", "Strategy", "Survival Horror", "Open World", "Sandbox"]
+PUBLISHERS = ["Nintendo", "Electronic Arts", "Activision", "Sony Computer Entertainment", "Ubisoft", "Take-Two Interactive", "THQ", "Konami", "Sega", "Namco Bandai Games", "Capcom", "Square Enix", "Bethesda Softworks", "Warner Bros. Interactive", "Microsoft Game Studios", "Atari", "Focus Home Interactive", "Devolver Digital"]
+TITLE_WORDS = [
+    "Legend", "Dragon", "Shadow", "Star", "Quest", "Dark", "World", "Souls", "Kingdom", "Hearts", "Final", "Fantasy",
+    "Super", "Mario", "Galaxy", "Zelda", "Wild", "Breath", "Hollow", "Knight", "Call", "Duty", "Grand", "Theft", "Auto",
+    "Red", "Dead", "Redemption", "Halo", "Gears", "War", "God", "Last", "Us", "Uncharted", "Tomb", "Raider", "Metal",
+    "Gear", "Solid", "Resident", "Evil", "Silent", "Hill", "Street", "Fighter", "Mortal", "Kombat", "Racing", "Rally",
+    "Need", "Speed", "Tales", "Chronicles", "Odyssey", "Origins", "Rising", "Revenge", "Empire", "Lost", "Island",
+    "City", "Night", "Storm", "Blade", "Fire", "Ice", "Iron", "Crystal", "Ancient", "Eternal", "Cosmic", "Neon",
+]
+SUBTITLES = ["Remastered", "Deluxe Edition", "Definitive Edition", "Origins", "Reborn", "Legacy", "Awakening", "Returns", "Online", "Gold"]
+
+def _vocabulary(base_path):
+    vocabulary = {
+        "console": (CONSOLES, None),
+        "genre": (GENRES, None),
+        "publisher": (PUBLISHERS, None),
+        "release_year": (list(range(1985, 2025)), None),
+        "words": TITLE_WORDS,
+    }
+    if not base_path or not os.path.exists(base_path):
+        return vocabulary
+
+    base = read_csv_file(base_path).rename(columns=lambda column: str(column).strip().lower())
+    for column in ("console", "genre", "publisher", "release_year"):
+        if column in base.columns:
+            counts = base[column].dropna().value_counts()
+            if len(counts):
+                vocabulary[column] = (counts.index.tolist(), (counts / counts.sum()).to_numpy())
+    if "title" in base.columns:
+        words = pd.Series(base["title"].dropna().astype(str).str.split().explode().unique())
+        words = words[words.str.len() > 1].tolist()
+        if words:
+            vocabulary["words"] = words
+    return vocabulary
+
+# Build a catalog with the given number of rows. Titles are two to four random words with an
+# occasional sequel number or subtitle, so some repeat across consoles as in the real data.
+def generate_catalog(rows: int, seed: int = 0, base_path: str = None) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    vocabulary = _vocabulary(base_path)
+
+    words = np.array(vocabulary["words"], dtype=object)
+    lengths = rng.integers(2, 5, size=rows)
+    picks = rng.integers(0, len(words), size=(rows, 4))
+    sequels = rng.integers(2, 6, size=rows)
+    suffix_roll = rng.random(rows)
+    subtitles = rng.integers(0, len(SUBTITLES), size=rows)
+
+    titles = []
+    for row in range(rows):
+        title = " ".join(words[picks[row, :lengths[row]]])
+        if suffix_roll[row] < 0.15:
+            title = f"{title} {sequels[row]}"
+        elif suffix_roll[row] < 0.25:
+            title = f"{title}: {SUBTITLES[subtitles[row]]}"
+        titles.append(title)
+
+    columns = {"Title": titles}
+    for column, name in (("release_year", "Release_Year"), ("console", "Console"), ("genre", "Genre"), ("publisher", "Publisher")):
+        values, weights = vocabulary[column]
+        columns[name] = np.asarray(values, dtype=object)[rng.choice(len(values), size=rows, p=weights)]
+    return pd.DataFrame(columns)
+
+def write_catalog(output_path: str, rows: int, seed: int = 0, base_path: str = None) -> str:
+    catalog = generate_catalog(rows, seed, base_path)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    catalog.to_csv(output_path, index=False)
+    logging.info(f"Wrote {rows} synthetic catalog rows to {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Generate a synthetic game catalog CSV")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base", default=os.getenv("CATALOG_PATH", "data/Video Games Data.csv"),
+                        help="real catalog to sample value frequencies from, if present")
+    parser.add_argument("--output", default="data/Video Games Data Synthetic.csv")
+    args = parser.parse_args()
+    write_catalog(args.output, args.rows, args.seed, args.base)
@@ -0,0 +1,233 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# An entry is (value, expires_at, stale_until); a value of None is a cached "not found"
+Entry = Tuple[Any, float, float]
+
+# Two-tier cache: an in-process LRU in front of an optional SQLite file.
+# Fresh entries are served directly, stale entries are served while a background
+# refresh runs, and entries past their stale window are reloaded synchronously. With
+# serve_expired_on_error, a failed reload falls back to an expired value still held in memory.
+class TieredCache:
+    def __init__(self,
+                 max_entries: int = 2048,
+                 ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 3600,
+                 negative_ttl: float = 600,
+                 stale_ttl: float = 3600,
+                 db_path: Optional[str] = None,
+                 serve_expired_on_error: bool = False):
+        self.max_entries = max_entries
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.serve_expired_on_error = serve_expired_on_error
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stale_hits": 0,
+            "negative_hits": 0,
+            "disk_hits": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "refreshes": 0,
+            "error_fallbacks": 0,
+        }
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS cache ("
+                    "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, stale_until REAL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Could not open cache database {db_path}: {e}")
+                self._db = None
+
+    # Return the cached value for (entry_type, key), calling loader() on a miss.
+    # Exceptions raised by the loader propagate and are never cached.
+    def get_or_load(self, entry_type: str, key: str, loader: Callable[[], Any]) -> Any:
+        cache_key = f"{entry_type}:{key}"
+        now = time.time()
+        entry = self._get_entry(cache_key)
+
+        if entry is not None:
+            value, expires_at, stale_until = entry
+            if now < expires_at:
+                self._count("negative_hits" if value is None else "hits")
+                return value
+            if now < stale_until:
+                self._count("stale_hits")
+                self._schedule_refresh(entry_type, cache_key, loader)
+                return value
+
+        self._count("misses")
+        try:
+            return self._load(entry_type, cache_key, loader)
+        except Exception:
+            if entry is None or not self.serve_expired_on_error:
+                raise
+            self._count("error_fallbacks")
+            return entry[0]
+
+    # Batch form of get_or_load. loader(missing_keys) returns a dict of loaded values; keys it
+    # leaves out are treated as failed lookups, are not cached and are missing from the result.
+    def get_many_or_load(self, entry_type: str, keys: List[str], loader: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        results = {}
+        missing = []
+        expired = {}
+        now = time.time()
+
+        for key in keys:
+            cache_key = f"{entry_type}:{key}"
+            entry = self._get_entry(cache_key)
+            if entry is not None:
+                value, expires_at, stale_until = entry
+                if now < expires_at:
+                    self._count("negative_hits" if value is None else "hits")
+                    results[key] = value
+                    continue
+                if now < stale_until:
+                    self._count("stale_hits")
+                    self._schedule_refresh(entry_type, cache_key, lambda key=key: loader([key])[key])
+                    results[key] = value
+                    continue
+                expired[key] = value
+            missing.append(key)
+
+        if missing:
+            self._count("misses", len(missing))
+            self._count("loads")
+            try:
+                loaded = loader(missing)
+            except Exception:
+                self._count("load_errors")
+                raise
+            for key in missing:
+                if key in loaded:
+                    self._store(entry_type, f"{entry_type}:{key}", loaded[key])
+                    results[key] = loaded[key]
+                elif key in expired and self.serve_expired_on_error:
+                    self._count("error_fallbacks")
+                    results[key] = expired[key]
+
+        return results
+
+    # Current counters plus the number of entries held in memory
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+        return stats
+
+    # Drop every entry from both tiers
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _get_entry(self, cache_key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                return entry
+
+        entry = self._read_disk(cache_key)
+        if entry is not None:
+            self._count("disk_hits")
+            self._put_memory(cache_key, entry)
+        return entry
+
+    def _load(self, entry_type: str, cache_key: str, loader: Callable[[], Any]) -> Any:
+        self._count("loads")
+        try:
+            value = loader()
+        except Exception:
+            self._count("load_errors")
+            raise
+        self._store(entry_type, cache_key, value)
+        return value
+
+    def _store(self, entry_type: str, cache_key: str, value: Any):
+        ttl = self.negative_ttl if value is None else self.ttls.get(entry_type, self.default_ttl)
+        expires_at = time.time() + ttl
+        entry = (value, expires_at, expires_at + self.stale_ttl)
+        self._put_memory(cache_key, entry)
+        self._write_disk(cache_key, entry)
+
+    def _put_memory(self, cache_key: str, entry: Entry):
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _schedule_refresh(self, entry_type: str, cache_key: str, loader: Callable[[], Any]):
+        with self._lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+        self._refresh_executor.submit(self._refresh, entry_type, cache_key, loader)
+
+    def _refresh(self, entry_type: str, cache_key: str, loader: Callable[[], Any]):
+        try:
+            self._count("refreshes")
+            self._load(entry_type, cache_key, loader)
+        except Exception as e:
+            # Keep serving the stale value; the next stale hit will try again
+            logging.warning(f"Background refresh failed for {cache_key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(cache_key)
+
+    def _read_disk(self, cache_key: str) -> Optional[Entry]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at, stale_until FROM cache WHERE key = ?", (cache_key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Error reading cache database: {e}")
+            return None
+        if row is None or row[2] <= time.time():
+            return None
+        return (json.loads(row[0]), row[1], row[2])
+
+    def _write_disk(self, cache_key: str, entry: Entry):
+        if self._db is None:
+            return
+        value, expires_at, stale_until = entry
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, stale_until) VALUES (?, ?, ?, ?)",
+                    (cache_key, json.dumps(value), expires_at, stale_until)
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error writing cache database: {e}")
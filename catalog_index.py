@@ -0,0 +1,359 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from game_api_helper import normalize_title
+
+NGRAM_SIZE = 3
+
+# Character n-grams of a normalized string
+def _ngrams(text: str, size: int = NGRAM_SIZE) -> set:
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+# Title index over the catalog, built once when the catalog is loaded.
+# Row ids are positions into the DataFrame, so results can be fetched with df.iloc.
+class CatalogIndex:
+    def __init__(self, df: pd.DataFrame, title_column: str = 'title'):
+        self.df = df
+        self.titles: List[str] = []
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        grams = defaultdict(list)
+
+        titles = df[title_column] if title_column in df.columns else []
+        for row_id, title in enumerate(titles):
+            normalized = normalize_title(title) if isinstance(title, str) else ""
+            self.titles.append(normalized)
+            if not normalized:
+                continue
+            self.exact[normalized].append(row_id)
+            # Every gram shorter than NGRAM_SIZE is indexed too, so short queries are a single lookup
+            for size in range(1, NGRAM_SIZE + 1):
+                for gram in _ngrams(normalized, size):
+                    grams[gram].append(row_id)
+
+        # Row ids are appended in order, so every posting list is already sorted
+        self.postings: Dict[str, np.ndarray] = {
+            gram: np.asarray(rows, dtype=np.int64) for gram, rows in grams.items()
+        }
+        self.sorted_titles = sorted((title, row_id) for row_id, title in enumerate(self.titles) if title)
+
+    def __len__(self):
+        return len(self.titles)
+
+    # Row ids whose normalized title equals the given title
+    def lookup(self, title: str) -> List[int]:
+        return list(self.exact.get(normalize_title(title), []))
+
+    # Row ids of titles starting with the given prefix, in alphabetical order
+    def prefix_search(self, prefix: str, k: int = 10) -> List[int]:
+        prefix = normalize_title(prefix)
+        results = []
+        position = bisect_left(self.sorted_titles, (prefix, -1))
+        while position < len(self.sorted_titles) and len(results) < k:
+            title, row_id = self.sorted_titles[position]
+            if not title.startswith(prefix):
+                break
+            results.append(row_id)
+            position += 1
+        return results
+
+    # Row ids of every title containing the query, found by intersecting n-gram postings.
+    # A query shorter than an n-gram ("64", "x") is itself a posting key and needs no check.
+    def contains(self, query: str) -> List[int]:
+        query = normalize_title(query)
+        if not query:
+            return []
+        if len(query) < NGRAM_SIZE:
+            rows = self.postings.get(query)
+            return [] if rows is None else rows.tolist()
+
+        postings = []
+        for gram in _ngrams(query):
+            rows = self.postings.get(gram)
+            if rows is None:
+                return []
+            postings.append(rows)
+        postings.sort(key=len)
+
+        candidates = postings[0]
+        for rows in postings[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+            if not len(candidates):
+                return []
+
+        # N-gram overlap is necessary but not sufficient, so confirm each candidate
+        return [int(row_id) for row_id in candidates if query in self.titles[row_id]]
+
+    # Top-k substring matches ranked exact, then prefix, then earliest match, then shortest title
+    def search(self, query: str, k: int = 10) -> List[int]:
+        normalized = normalize_title(query)
+        return heapq.nsmallest(k, self.contains(normalized), key=lambda row_id: (
+            self.titles[row_id] != normalized,
+            self.titles[row_id].find(normalized),
+            len(self.titles[row_id]),
+            row_id
+        ))
+
+FACET_FIELDS = ('genre', 'console', 'publisher')
+# Facets matched on whole words of the value; the others must match it exactly
+WORD_MATCH_FIELDS = ('genre',)
+YEAR_FIELD = 'release_year'
+_WORD = re.compile(r"[a-z0-9]+")
+
+# True if the words of term appear consecutively among the words of value
+def _contains_words(value_words: List[str], term_words: List[str]) -> bool:
+    size = len(term_words)
+    return any(value_words[i:i + size] == term_words for i in range(len(value_words) - size + 1))
+
+# Intersect sorted, unique row id arrays, smallest first
+def _intersect(postings: List[np.ndarray]) -> np.ndarray:
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for rows in postings[1:]:
+        if not len(result):
+            break
+        result = np.intersect1d(result, rows, assume_unique=True)
+    return result
+
+# Inverted index from normalized genre, console and publisher values (and release year)
+# to sorted row id arrays, so facet filters combine by intersecting arrays instead of scanning rows.
+class FacetIndex:
+    def __init__(self, df: pd.DataFrame, fields=FACET_FIELDS, year_field: str = YEAR_FIELD):
+        self.df = df
+        self.size = len(df)
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+
+        for field in fields:
+            self.postings[field] = {}
+            if field not in df.columns:
+                continue
+            values = df[field].astype('string').str.lower().str.split().str.join(' ')
+            codes, uniques = pd.factorize(values)
+            order = np.argsort(codes, kind='stable')
+            boundaries = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            for code, value in enumerate(uniques):
+                self.postings[field][value] = order[boundaries[code]:boundaries[code + 1]].astype(np.int64)
+
+        # Years are kept sorted alongside their row ids so ranges resolve with two binary searches
+        if year_field in df.columns:
+            years = pd.to_numeric(df[year_field], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            valid = np.flatnonzero(~np.isnan(years))
+            order = np.argsort(years[valid], kind='stable')
+            self.year_rows = valid[order].astype(np.int64)
+            self.sorted_years = years[valid][order]
+        else:
+            self.year_rows = np.empty(0, dtype=np.int64)
+            self.sorted_years = np.empty(0)
+
+    # Distinct values recorded for a facet
+    def values(self, field: str) -> List[str]:
+        return sorted(self.postings.get(field, {}))
+
+    # Rows whose facet value equals the term (case and spacing aside); for word-matched facets,
+    # rows whose value contains the term's words ("rpg" matches "action rpg", not "rpgmaker").
+    # Only the distinct values are scanned, never the rows themselves.
+    def rows_for(self, field: str, term) -> np.ndarray:
+        index = self.postings.get(field, {})
+        term = normalize_title(str(term))
+        if field in WORD_MATCH_FIELDS:
+            term_words = _WORD.findall(term)
+            matches = [rows for value, rows in index.items() if term_words and _contains_words(_WORD.findall(value), term_words)]
+        else:
+            rows = index.get(term)
+            matches = [] if rows is None else [rows]
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+        if len(matches) == 1:
+            return matches[0]
+        return np.unique(np.concatenate(matches))
+
+    def rows_for_years(self, year_from=None, year_to=None) -> np.ndarray:
+        low = 0 if year_from is None else np.searchsorted(self.sorted_years, year_from, side='left')
+        high = len(self.sorted_years) if year_to is None else np.searchsorted(self.sorted_years, year_to, side='right')
+        return np.sort(self.year_rows[low:high])
+
+    # Row ids matching every given filter, e.g. query(genre="rpg", console="snes", year_from=1990, year_to=1995).
+    # Returns (total_matches, row_ids) where row_ids is limited to the requested page.
+    def query(self, offset: int = 0, limit: int = None, year_from=None, year_to=None, **filters):
+        postings = [self.rows_for(field, term) for field, term in filters.items() if term]
+        if year_from is not None or year_to is not None:
+            postings.append(self.rows_for_years(year_from, year_to))
+
+        if postings:
+            rows = _intersect(postings)
+        else:
+            rows = np.arange(self.size, dtype=np.int64)
+
+        end = None if limit is None else offset + limit
+        return len(rows), rows[offset:end]
+
+# Relative weight of each kind of feature in a game's similarity vector. A game has one feature
+# per facet value, one per word of its genre (so "action rpg" partly matches "rpg"), and its
+# release year both exactly and as a five-year era.
+SIMILARITY_WEIGHTS = {
+    'genre': 3.0,
+    'genre_word': 1.0,
+    'console': 1.0,
+    'publisher': 1.5,
+    'year': 0.5,
+    'era': 1.0,
+}
+ERA_YEARS = 5
+
+# Rows of each distinct value of a column, as (value, sorted row ids) pairs; missing values are skipped
+def _value_rows(values: pd.Series):
+    codes, uniques = pd.factorize(values)
+    order = np.argsort(codes, kind='stable')
+    boundaries = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    for code, value in enumerate(uniques):
+        yield value, order[boundaries[code]:boundaries[code + 1]].astype(np.int64)
+
+# Offsets into a flat array for the given (start, end) slices, concatenated
+def _slice_positions(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return np.arange(total, dtype=np.int64) + shifts
+
+# Sparse feature vectors of every catalog row over genre, console, publisher and release year,
+# stored twice: by feature (postings, for scoring the whole catalog with one bincount) and by
+# row (for scoring a candidate set). Norms and feature counts are precomputed, so a query costs
+# one pass over the postings of its own features plus a partial sort of the scores.
+class SimilarityIndex:
+    def __init__(self, df: pd.DataFrame, titles: List[str] = None, weights: Dict[str, float] = None):
+        weights = dict(SIMILARITY_WEIGHTS, **(weights or {}))
+        self.size = len(df)
+        self.features: List[str] = []
+        posting_rows, posting_weights = [], []
+
+        def add(feature: str, rows: np.ndarray, weight: float):
+            self.features.append(feature)
+            posting_rows.append(rows)
+            posting_weights.append(np.full(len(rows), weight, dtype=np.float32))
+
+        for field in FACET_FIELDS:
+            if field not in df.columns:
+                continue
+            values = df[field].astype('string').str.lower().str.split().str.join(' ')
+            words = defaultdict(list)
+            for value, rows in _value_rows(values):
+                add(f"{field}:{value}", rows, weights[field])
+                if field == 'genre':
+                    for word in set(_WORD.findall(value)):
+                        words[word].append(rows)
+            for word, row_lists in words.items():
+                add(f"genre_word:{word}", np.sort(np.concatenate(row_lists)), weights['genre_word'])
+
+        if YEAR_FIELD in df.columns:
+            years = pd.to_numeric(df[YEAR_FIELD], errors='coerce').astype('Int64')
+            for year, rows in _value_rows(years):
+                add(f"year:{year}", rows, weights['year'])
+            for era, rows in _value_rows(years // ERA_YEARS * ERA_YEARS):
+                add(f"era:{era}", rows, weights['era'])
+
+        lengths = np.array([len(rows) for rows in posting_rows], dtype=np.int64)
+        self.feature_ptr = np.concatenate(([0], np.cumsum(lengths)))
+        self.posting_rows = np.concatenate(posting_rows) if posting_rows else np.empty(0, dtype=np.int64)
+        self.posting_weights = np.concatenate(posting_weights) if posting_weights else np.empty(0, dtype=np.float32)
+        feature_ids = np.repeat(np.arange(len(self.features), dtype=np.int64), lengths)
+
+        order = np.argsort(self.posting_rows, kind='stable')
+        self.row_ptr = np.searchsorted(self.posting_rows[order], np.arange(self.size + 1))
+        self.row_features = feature_ids[order]
+        self.row_weights = self.posting_weights[order]
+
+        self.norms = np.sqrt(np.bincount(self.posting_rows, self.posting_weights.astype(np.float64) ** 2, minlength=self.size))
+        self.feature_counts = np.bincount(self.posting_rows, minlength=self.size)
+
+        # Different releases of the same game share a title code and are never returned for each other
+        if titles is None:
+            titles = [normalize_title(title) if isinstance(title, str) else "" for title in df['title']] if 'title' in df.columns else [""] * self.size
+        self.title_codes = pd.factorize(pd.Series(titles, dtype=object))[0]
+
+    def __len__(self):
+        return self.size
+
+    # Combined feature vector of the given rows, as (feature ids, weights)
+    def _query_vector(self, row_ids: np.ndarray):
+        positions = _slice_positions(self.row_ptr[row_ids], self.row_ptr[row_ids + 1])
+        features, inverse = np.unique(self.row_features[positions], return_inverse=True)
+        return features, np.bincount(inverse, self.row_weights[positions].astype(np.float64))
+
+    # Scores of every row against the query: one bincount over the postings of the query's features
+    def _score_all(self, features: np.ndarray, weights: np.ndarray, metric: str) -> np.ndarray:
+        starts, ends = self.feature_ptr[features], self.feature_ptr[features + 1]
+        positions = _slice_positions(starts, ends)
+        rows = self.posting_rows[positions]
+        if metric == 'jaccard':
+            shared = np.bincount(rows, minlength=self.size)
+            return shared / np.maximum(self.feature_counts + len(features) - shared, 1)
+        contributions = self.posting_weights[positions] * np.repeat(weights, ends - starts)
+        dots = np.bincount(rows, contributions, minlength=self.size)
+        return dots / np.maximum(self.norms * np.sqrt(np.dot(weights, weights)), 1e-12)
+
+    # Approximate search: only rows sharing the query's most telling features, up to about
+    # candidate_limit postings, are scored (exactly, from the row-major copy). Features are taken
+    # by weight times inverse document frequency, so a shared genre or publisher counts for more
+    # than a shared popular console or era, which is what makes exact search touch most rows.
+    def _score_candidates(self, features: np.ndarray, weights: np.ndarray, metric: str, candidate_limit: int):
+        lengths = self.feature_ptr[features + 1] - self.feature_ptr[features]
+        ranked = np.argsort(-weights * np.log(self.size / lengths), kind='stable')
+        budget = np.cumsum(lengths[ranked])
+        chosen = features[ranked[:max(1, int(np.searchsorted(budget, candidate_limit, side='right')))]]
+        positions = _slice_positions(self.feature_ptr[chosen], self.feature_ptr[chosen + 1])
+        marked = np.zeros(self.size, dtype=bool)
+        marked[self.posting_rows[positions]] = True
+        candidates = np.flatnonzero(marked)
+
+        dense = np.zeros(len(self.features), dtype=np.float64)
+        dense[features] = weights
+        starts, ends = self.row_ptr[candidates], self.row_ptr[candidates + 1]
+        positions = _slice_positions(starts, ends)
+        owners = np.repeat(np.arange(len(candidates)), ends - starts)
+        matched = dense[self.row_features[positions]]
+        if metric == 'jaccard':
+            shared = np.bincount(owners, matched > 0, minlength=len(candidates))
+            scores = shared / np.maximum(self.feature_counts[candidates] + len(features) - shared, 1)
+        else:
+            dots = np.bincount(owners, matched * self.row_weights[positions], minlength=len(candidates))
+            scores = dots / np.maximum(self.norms[candidates] * np.sqrt(np.dot(weights, weights)), 1e-12)
+        return candidates, scores
+
+    # Top-k rows most similar to the given rows (e.g. every release of one game), best first, as
+    # (row ids, scores). metric is "cosine" over the weighted features or "jaccard" over the
+    # feature sets. With candidate_limit set, large catalogs are searched approximately.
+    # Each title appears once, and the query's own title not at all.
+    def similar(self, row_ids, k: int = 10, metric: str = 'cosine', candidate_limit: int = None):
+        if metric not in ('cosine', 'jaccard'):
+            raise ValueError(f"Unknown similarity metric: {metric}")
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        if not len(row_ids) or not self.size:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        features, weights = self._query_vector(row_ids)
+        if not len(features):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        total_postings = int((self.feature_ptr[features + 1] - self.feature_ptr[features]).sum())
+        if candidate_limit and total_postings > candidate_limit:
+            rows, scores = self._score_candidates(features, weights, metric, candidate_limit)
+        else:
+            rows, scores = np.arange(self.size, dtype=np.int64), self._score_all(features, weights, metric)
+
+        keep = (scores > 0) & ~np.isin(self.title_codes[rows], self.title_codes[row_ids])
+        rows, scores = rows[keep], scores[keep]
+
+        # Partially sort a few times k rows so duplicate titles can be skipped, widening if needed
+        take = min(len(rows), k * 4)
+        while True:
+            top = np.argpartition(-scores, take - 1)[:take] if take < len(rows) else np.arange(len(rows))
+            top = top[np.lexsort((rows[top], -scores[top]))]
+            _, first = np.unique(self.title_codes[rows[top]], return_index=True)
+            top = top[np.sort(first)][:k]
+            if len(top) == k or take == len(rows):
+                return rows[top], scores[top]
+            take = min(len(rows), take * 4)
@@ -1,12 +1,86 @@
+import json
+import logging
+import os
 import pandas as pd
 
+# Columns of the game catalog used by the assistant, and how each one is stored
+CATALOG_COLUMNS = ['title', 'release_year', 'console', 'genre', 'publisher']
+CATALOG_DTYPES = {
+    'title': 'string',
+    'release_year': 'Int64',
+    'console': 'category',
+    'genre': 'category',
+    'publisher': 'category',
+}
+
+# Feather needs pyarrow; without it the snapshot falls back to a pickle
+try:
+    import pyarrow  # noqa: F401
+    SNAPSHOT_FORMAT = 'feather'
+except ImportError:
+    SNAPSHOT_FORMAT = 'pickle'
+
 def read_csv_file(file_path: str) -> pd.DataFrame:
     try:
         data = pd.read_csv(file_path)
         return data
     except Exception as e:
-        print(f"Error reading CSV file: {e}")
+        logging.error(f"Error reading CSV file: {e}")
         return pd.DataFrame()  # Return an empty DataFrame in case of error
 
+# Identity of a source file; the snapshot is rebuilt whenever it changes
+def _source_signature(file_path: str) -> dict:
+    stat = os.stat(file_path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'columns': CATALOG_COLUMNS, 'format': SNAPSHOT_FORMAT}
+
+def _read_snapshot(snapshot_path: str) -> pd.DataFrame:
+    if SNAPSHOT_FORMAT == 'feather':
+        return pd.read_feather(snapshot_path)
+    return pd.read_pickle(snapshot_path)
+
+def _write_snapshot(df: pd.DataFrame, snapshot_path: str):
+    if SNAPSHOT_FORMAT == 'feather':
+        df.reset_index(drop=True).to_feather(snapshot_path)
+    else:
+        df.to_pickle(snapshot_path)
+
+# Parse the catalog CSV, keeping only the needed columns with lower-cased names and explicit dtypes
+def _parse_catalog(file_path: str) -> pd.DataFrame:
+    df = pd.read_csv(file_path, usecols=lambda column: column.strip().lower() in CATALOG_COLUMNS)
+    df = df.rename(columns=lambda column: column.strip().lower())
+    for column in CATALOG_COLUMNS:
+        if column not in df.columns:
+            df[column] = pd.NA
+    df['release_year'] = pd.to_numeric(df['release_year'], errors='coerce').round()
+    return df[CATALOG_COLUMNS].astype(CATALOG_DTYPES)
+
+# Load the game catalog, using a columnar snapshot cached next to the CSV when it is still current
+def load_catalog(file_path: str) -> pd.DataFrame:
+    if not os.path.exists(file_path):
+        logging.error(f"Catalog file not found: {file_path}; continuing with an empty catalog")
+        return pd.DataFrame({column: pd.Series(dtype=CATALOG_DTYPES[column]) for column in CATALOG_COLUMNS})
+
+    snapshot_path = f"{file_path}.{SNAPSHOT_FORMAT}"
+    meta_path = f"{file_path}.snapshot.json"
+    signature = _source_signature(file_path)
+
+    try:
+        with open(meta_path, encoding='utf-8') as meta_file:
+            if json.load(meta_file) == signature:
+                return _read_snapshot(snapshot_path)
+    except (OSError, ValueError):
+        pass
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable catalog snapshot {snapshot_path}: {e}")
+
+    df = _parse_catalog(file_path)
+    try:
+        _write_snapshot(df, snapshot_path)
+        with open(meta_path, 'w', encoding='utf-8') as meta_file:
+            json.dump(signature, meta_file)
+    except Exception as e:
+        logging.warning(f"Could not write catalog snapshot {snapshot_path}: {e}")
+    return df
+
 def format_game_info(game_info: pd.Series) -> str:
     return f"{game_info['title']} was released on {game_info['release_year']} for {game_info['console']}. It is a {game_info['genre']} game published by {game_info['publisher']}."
@@ -0,0 +1,53 @@
+import os
+import json
+import logging
+import pandas as pd
+from dotenv import load_dotenv
+from csv_helper import load_catalog
+from game_api_helper import bulk_enrich, normalize_title
+
+# Enrich every title in the local catalog with IGDB and RAWG metadata.
+# Progress is kept in ENRICHMENT_PATH, so rerunning after an interruption resumes where it stopped;
+# the merged result is written to ENRICHED_CATALOG_PATH.
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", "data/Video Games Data.csv")
+ENRICHMENT_PATH = os.getenv("ENRICHMENT_PATH", "data/Video Games Enrichment.jsonl")
+ENRICHED_CATALOG_PATH = os.getenv("ENRICHED_CATALOG_PATH", "data/Video Games Data Enriched.csv")
+
+# Flatten one enrichment record into catalog columns
+def enrichment_columns(record):
+    igdb = record.get("igdb") or {}
+    rawg = record.get("rawg") or {}
+    return {
+        "title_key": normalize_title(record["title"]),
+        "igdb_release_date": igdb.get("release_date"),
+        "igdb_platforms": ", ".join(igdb.get("platforms", [])),
+        "igdb_developers": ", ".join(igdb.get("developers", [])),
+        "igdb_publishers": ", ".join(igdb.get("publishers", [])),
+        "rawg_release_date": rawg.get("release_date"),
+        "rawg_platforms": ", ".join(rawg.get("platforms", [])),
+    }
+
+def main():
+    catalog = load_catalog(CATALOG_PATH)
+    written = bulk_enrich(catalog["title"].dropna().tolist(), ENRICHMENT_PATH)
+    logging.info(f"Wrote {written} new enrichment records to {ENRICHMENT_PATH}")
+
+    with open(ENRICHMENT_PATH, encoding="utf-8") as enrichment_file:
+        records = [enrichment_columns(json.loads(line)) for line in enrichment_file if line.strip()]
+    if not records:
+        logging.info("No enrichment records available yet")
+        return
+    enrichment = pd.DataFrame(records).drop_duplicates("title_key", keep="last")
+
+    catalog["title_key"] = catalog["title"].map(lambda title: normalize_title(title) if isinstance(title, str) else None)
+    enriched = catalog.merge(enrichment, on="title_key", how="left").drop(columns="title_key")
+    enriched.to_csv(ENRICHED_CATALOG_PATH, index=False)
+    logging.info(f"Wrote enriched catalog to {ENRICHED_CATALOG_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,327 @@
+import json
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
 import requests
 from dotenv import load_dotenv
 from twitch_auth import get_client_credentials_access_token
+from http_sessions import get_session, REQUEST_TIMEOUT
+from cache_helper import TieredCache
+from telemetry import registry, span, submit, traced
+from resilience import TokenBucket, CircuitBreaker, DeadlineExceeded, backoff_delay, parse_retry_after
 
 load_dotenv()
 
 TWITCH_CLIENT_ID = os.getenv("NEXT_PUBLIC_TWITCH_CLIENT_ID")
 RAWG_API_KEY = os.getenv("RAWG_API_KEY")
 
+IGDB_API_URL = os.getenv("IGDB_API_URL", 'https://api.igdb.com/v4')
+RAWG_API_URL = os.getenv("RAWG_API_URL", 'https://api.rawg.io/api')
+IGDB_GAMES_URL = f'{IGDB_API_URL}/games'
+IGDB_MULTIQUERY_URL = f'{IGDB_API_URL}/multiquery'
+RAWG_GAMES_URL = f'{RAWG_API_URL}/games'
+
+IGDB_FIELDS = 'name,release_dates.date,platforms.name,developers.name,publishers.name'
+# IGDB accepts at most 10 queries per multiquery request
+IGDB_MULTIQUERY_SIZE = 10
+# Requests allowed in flight at once per upstream, across every thread in the process
+IGDB_MAX_CONCURRENCY = int(os.getenv("IGDB_MAX_CONCURRENCY", "4"))
+RAWG_MAX_CONCURRENCY = int(os.getenv("RAWG_MAX_CONCURRENCY", "4"))
+igdb_slots = threading.BoundedSemaphore(IGDB_MAX_CONCURRENCY)
+rawg_slots = threading.BoundedSemaphore(RAWG_MAX_CONCURRENCY)
+
+# Requests per second allowed by each provider (IGDB documents 4/s); 0 disables the limiter
+rate_limiters = {
+    "igdb": TokenBucket(float(os.getenv("IGDB_RATE_LIMIT", "4")), float(os.getenv("IGDB_RATE_BURST", "4")),
+                        float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))),
+    "rawg": TokenBucket(float(os.getenv("RAWG_RATE_LIMIT", "5")), float(os.getenv("RAWG_RATE_BURST", "5")),
+                        float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))),
+}
+# After CIRCUIT_FAILURE_THRESHOLD failed calls in a row a provider is skipped for
+# CIRCUIT_RESET_TIMEOUT seconds, during which cached and local catalog data are served
+circuit_breakers = {
+    name: CircuitBreaker(name, int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")), float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30")))
+    for name in ("igdb", "rawg")
+}
+# Retries for 429, 5xx and connection errors, with jittered exponential backoff between attempts
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.25"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "10"))
+upstream_slots = {"igdb": igdb_slots, "rawg": rawg_slots}
+
+for _name in ("igdb", "rawg"):
+    registry.register_collector(f"{_name}_rate_limiter", rate_limiters[_name].stats)
+    registry.register_collector(f"{_name}_circuit", circuit_breakers[_name].stats)
+
+# Limiter and breaker state per provider, for monitoring
+def upstream_status() -> Dict[str, dict]:
+    return {
+        name: {"rate_limiter": rate_limiters[name].stats(), "circuit": circuit_breakers[name].stats(), "state": circuit_breakers[name].state}
+        for name in ("igdb", "rawg")
+    }
+
+# Seconds left until a time.monotonic() deadline, or None when there is no deadline
+def _time_left(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else deadline - time.monotonic()
+
+# Send a request to an upstream through its rate limiter and circuit breaker, retrying 429s,
+# 5xx responses and connection errors. Other responses are returned to the caller as-is;
+# raises CircuitOpenError, RateLimitTimeout, DeadlineExceeded or RuntimeError when no usable
+# response came back. With a deadline (time.monotonic()), limiter waits and retries stop
+# once the caller has stopped waiting for the result.
+def _send(upstream: str, stage: str, send, deadline: Optional[float] = None):
+    breaker = circuit_breakers[upstream]
+    limiter = rate_limiters[upstream]
+    time_left = _time_left(deadline)
+    if time_left is not None and time_left <= 0:
+        registry.inc("upstream_deadline_exceeded_total", upstream=upstream)
+        raise DeadlineExceeded(f"{upstream.upper()} request was not sent before its deadline")
+    breaker.before_call()
+    outcome_recorded = False
+    try:
+        for attempt in range(UPSTREAM_MAX_RETRIES + 1):
+            limiter.acquire(_time_left(deadline))
+            retry_after = None
+            try:
+                with upstream_slots[upstream], span(stage):
+                    response = send()
+            except requests.RequestException as e:
+                failure = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    breaker.record_success()
+                    outcome_recorded = True
+                    return response
+                failure = f"{response.status_code} - {response.text[:200]}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if response.status_code == 429:
+                    registry.inc("upstream_rate_limited_total", upstream=upstream)
+                    # Everyone waits out the provider's window, not just this caller
+                    limiter.pause(retry_after if retry_after is not None else UPSTREAM_BACKOFF_BASE * 2 ** attempt)
+
+            if attempt == UPSTREAM_MAX_RETRIES:
+                break
+            delay = backoff_delay(attempt, UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX, retry_after)
+            time_left = _time_left(deadline)
+            if time_left is not None and delay >= time_left:
+                # The caller has given up by then, so don't hold a worker asleep for nothing
+                registry.inc("upstream_deadline_exceeded_total", upstream=upstream)
+                break
+            registry.inc("upstream_retries_total", upstream=upstream)
+            time.sleep(delay)
+
+        breaker.record_failure()
+        outcome_recorded = True
+        raise RuntimeError(f"Failed to fetch data from {upstream.upper()} after {attempt + 1} attempts: {failure}")
+    finally:
+        if not outcome_recorded:
+            # e.g. the rate limiter queue was full; the provider itself was never judged
+            breaker.release()
+
+# Catalog metadata rarely changes, so lookups are cached per source (TTLs in seconds).
+# Set API_CACHE_DB_PATH to keep the cache on disk across restarts.
+api_cache = TieredCache(
+    max_entries=int(os.getenv("API_CACHE_MAX_ENTRIES", "2048")),
+    ttls={
+        "igdb": float(os.getenv("CACHE_TTL_IGDB", str(7 * 24 * 3600))),
+        "rawg": float(os.getenv("CACHE_TTL_RAWG", str(7 * 24 * 3600))),
+    },
+    negative_ttl=float(os.getenv("CACHE_TTL_NOT_FOUND", str(24 * 3600))),
+    stale_ttl=float(os.getenv("CACHE_STALE_TTL", str(24 * 3600))),
+    db_path=os.getenv("API_CACHE_DB_PATH"),
+    # While a provider is failing, its last known answer is better than none
+    serve_expired_on_error=True
+)
+registry.register_collector("api_cache", api_cache.stats)
+
+# Normalize a title for comparisons and cache keys
+def normalize_title(title: str) -> str:
+    return " ".join(title.lower().split())
+
 # Utility function to clean and match titles
 def clean_and_match_title(query_title: str, record_title: str) -> bool:
-    clean_query = query_title.lower().strip()
-    clean_record = record_title.lower().strip()
-    return clean_query == clean_record
+    return normalize_title(query_title) == normalize_title(record_title)
 
-# Fetch game data from IGDB
-def fetch_from_igdb(game_title: str) -> str:
-    try:
+# Structured IGDB record for a single game
+def _igdb_record(game: dict) -> dict:
+    return {
+        'name': game['name'],
+        'release_date': game['release_dates'][0]['date'] if 'release_dates' in game else 'Unknown',
+        'platforms': [platform['name'] for platform in game.get('platforms', [])],
+        'developers': [dev['name'] for dev in game.get('developers', [])],
+        'publishers': [pub['name'] for pub in game.get('publishers', [])],
+    }
+
+def _format_igdb_record(record: dict) -> str:
+    platforms = ', '.join(record['platforms'])
+    developers = ', '.join(record['developers'])
+    publishers = ', '.join(record['publishers'])
+    return (f"The game {record['name']} was released on {record['release_date']}. "
+            f"It was developed by {developers or 'unknown developers'} and published by {publishers or 'unknown publishers'} "
+            f"and was released on {platforms or 'unknown platforms'}.")
+
+def _igdb_headers() -> dict:
+    with span("twitch.token"):
         access_token = get_client_credentials_access_token()  # Ensure token is valid and get it
-        headers = {
-            'Client-ID': TWITCH_CLIENT_ID,
-            'Authorization': f'Bearer {access_token}'
-        }
-        body = f'fields name,release_dates.date,platforms.name,developers.name,publishers.name; where name ~ "{game_title}";'
-        response = requests.post('https://api.igdb.com/v4/games', data=body, headers=headers)
-
-        if response.status_code == 200:
-            games = response.json()
-            for game in games:
-                if clean_and_match_title(game_title, game['name']):
-                    release_date = game['release_dates'][0]['date'] if 'release_dates' in game else 'Unknown'
-                    platforms = ', '.join([platform['name'] for platform in game.get('platforms', [])])
-                    developers = ', '.join([dev['name'] for dev in game.get('developers', [])])
-                    publishers = ', '.join([pub['name'] for pub in game.get('publishers', [])])
-                    return (f"The game {game['name']} was released on {release_date}. "
-                            f"It was developed by {developers or 'unknown developers'} and published by {publishers or 'unknown publishers'} "
-                            f"and was released on {platforms or 'unknown platforms'}.")
-        else:
-            logging.error(f"Failed to fetch data from IGDB: {response.status_code} - {response.text}")
-        return None
+    return {
+        'Client-ID': TWITCH_CLIENT_ID,
+        'Authorization': f'Bearer {access_token}'
+    }
+
+def _igdb_query(game_title: str) -> str:
+    escaped_title = game_title.replace('"', '\\"')
+    return f'fields {IGDB_FIELDS}; where name ~ "{escaped_title}";'
+
+# Query IGDB for a title. Returns None when the game is not found and raises on
+# request failures so that errors are never cached as "not found".
+def _lookup_igdb(game_title: str, deadline: Optional[float] = None) -> Optional[dict]:
+    headers = _igdb_headers()
+    response = _send("igdb", "igdb.request", lambda: get_session("igdb").post(
+        IGDB_GAMES_URL, data=_igdb_query(game_title), headers=headers, timeout=REQUEST_TIMEOUT
+    ), deadline)
+
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to fetch data from IGDB: {response.status_code} - {response.text}")
+
+    for game in response.json():
+        if clean_and_match_title(game_title, game['name']):
+            return _igdb_record(game)
+    return None
+
+# Fetch game data from IGDB; deadline is the time.monotonic() at which the caller stops waiting
+@traced("igdb")
+def fetch_from_igdb(game_title: str, deadline: Optional[float] = None) -> str:
+    try:
+        record = api_cache.get_or_load("igdb", normalize_title(game_title), lambda: _lookup_igdb(game_title, deadline))
+        return _format_igdb_record(record) if record else None
 
     except Exception as e:
         logging.error(f"Error in fetch_from_igdb: {e}")
         return None
 
-# Fetch game data from RAWG
-def fetch_from_rawg(game_title: str) -> str:
+# Structured RAWG record for a single game
+def _rawg_record(game: dict) -> dict:
+    return {
+        'name': game['name'],
+        'release_date': game.get('released', 'Unknown'),
+        'platforms': [platform['platform']['name'] for platform in game.get('platforms') or []],
+    }
+
+def _format_rawg_record(record: dict) -> str:
+    platforms = ', '.join(record['platforms'])
+    return (f"The game {record['name']} was released on {record['release_date']}. "
+            f"It was released on {platforms}.")
+
+# Query RAWG for a title, with the same None/raise contract as _lookup_igdb
+def _lookup_rawg(game_title: str, deadline: Optional[float] = None) -> Optional[dict]:
+    params = {'key': RAWG_API_KEY, 'search': game_title}
+    response = _send("rawg", "rawg.request", lambda: get_session("rawg").get(RAWG_GAMES_URL, params=params, timeout=REQUEST_TIMEOUT), deadline)
+
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to fetch data from RAWG: {response.status_code} - {response.text}")
+
+    for game in response.json()['results']:
+        if clean_and_match_title(game_title, game['name']):
+            return _rawg_record(game)
+    return None
+
+# Fetch game data from RAWG, with the same deadline as fetch_from_igdb
+@traced("rawg")
+def fetch_from_rawg(game_title: str, deadline: Optional[float] = None) -> str:
     try:
-        url = f"https://api.rawg.io/api/games?key={RAWG_API_KEY}&search={game_title}"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            games = response.json()['results']
-            for game in games:
-                if clean_and_match_title(game_title, game['name']):
-                    release_date = game.get('released', 'Unknown')
-                    platforms = ', '.join([platform['platform']['name'] for platform in game.get('platforms', [])])
-                    return (f"The game {game['name']} was released on {release_date}. "
-                            f"It was released on {platforms}.")
-        else:
-            logging.error(f"Failed to fetch data from RAWG: {response.status_code} - {response.text}")
-        return None
+        record = api_cache.get_or_load("rawg", normalize_title(game_title), lambda: _lookup_rawg(game_title, deadline))
+        return _format_rawg_record(record) if record else None
 
     except Exception as e:
         logging.error(f"Error in fetch_from_rawg: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# Look up to IGDB_MULTIQUERY_SIZE titles with a single multiquery request
+def _lookup_igdb_batch(game_titles: List[str]) -> Dict[str, Optional[dict]]:
+    body = "".join(f'query games "{i}" {{ {_igdb_query(title)} }};' for i, title in enumerate(game_titles))
+    headers = _igdb_headers()
+    response = _send("igdb", "igdb.multiquery", lambda: get_session("igdb").post(
+        IGDB_MULTIQUERY_URL, data=body, headers=headers, timeout=REQUEST_TIMEOUT
+    ))
+
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to fetch data from IGDB: {response.status_code} - {response.text}")
+
+    results = {title: None for title in game_titles}
+    for query_result in response.json():
+        title = game_titles[int(query_result['name'])]
+        for game in query_result.get('result', []):
+            if clean_and_match_title(title, game['name']):
+                results[title] = _igdb_record(game)
+                break
+    return results
+
+# Batch loader for the cache: failed batches are left out of the result so they are retried later
+def _lookup_igdb_many(game_titles: List[str]) -> Dict[str, Optional[dict]]:
+    results = {}
+    for start in range(0, len(game_titles), IGDB_MULTIQUERY_SIZE):
+        batch = game_titles[start:start + IGDB_MULTIQUERY_SIZE]
+        try:
+            results.update(_lookup_igdb_batch(batch))
+        except Exception as e:
+            logging.error(f"Error in IGDB multiquery for {len(batch)} titles: {e}")
+    return results
+
+# RAWG has no batch endpoint, so titles are searched in parallel with bounded concurrency
+def _lookup_rawg_many(game_titles: List[str]) -> Dict[str, Optional[dict]]:
+    results = {}
+    with ThreadPoolExecutor(max_workers=RAWG_MAX_CONCURRENCY, thread_name_prefix="rawg") as executor:
+        futures = {submit(executor, _lookup_rawg, title): title for title in game_titles}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                logging.error(f"Error in RAWG lookup for '{futures[future]}': {e}")
+    return results
+
+# Structured IGDB and RAWG records for many titles at once, served from the cache where possible.
+# Returns {title: {"title": title, "igdb": record or None, "rawg": record or None, "complete": bool}},
+# where complete is False if either lookup failed rather than finding nothing.
+@traced("fetch_many")
+def fetch_many(game_titles: List[str]) -> Dict[str, dict]:
+    keys = {title: normalize_title(title) for title in game_titles}
+    unique_keys = list(dict.fromkeys(keys.values()))
+
+    igdb = api_cache.get_many_or_load("igdb", unique_keys, _lookup_igdb_many)
+    rawg = api_cache.get_many_or_load("rawg", unique_keys, _lookup_rawg_many)
+
+    return {
+        title: {'title': title, 'igdb': igdb.get(key), 'rawg': rawg.get(key), 'complete': key in igdb and key in rawg}
+        for title, key in keys.items()
+    }
+
+# Resumable bulk enrichment: appends one JSON line per title to output_path and skips
+# titles already written there, so an interrupted run picks up where it stopped.
+def bulk_enrich(game_titles: List[str], output_path: str, batch_size: int = 50) -> int:
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path, encoding='utf-8') as output_file:
+            for line in output_file:
+                if line.strip():
+                    done.add(normalize_title(json.loads(line)['title']))
+
+    pending = []
+    for title in game_titles:
+        if isinstance(title, str) and title.strip() and normalize_title(title) not in done:
+            done.add(normalize_title(title))
+            pending.append(title)
+
+    written = 0
+    with open(output_path, 'a', encoding='utf-8') as output_file:
+        for start in range(0, len(pending), batch_size):
+            for record in fetch_many(pending[start:start + batch_size]).values():
+                # Failed lookups are not written so the next run retries them
+                if record['complete']:
+                    output_file.write(json.dumps(record) + '\n')
+                    written += 1
+            output_file.flush()
+            logging.info(f"Enriched {start + len(pending[start:start + batch_size])}/{len(pending)} titles")
+    return written
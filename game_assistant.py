@@ -1,12 +1,24 @@
 import os
+import json
+import asyncio
+import contextvars
+import hashlib
 import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from openai import OpenAI
-import pandas as pd
-from twitch_auth import get_client_credentials_access_token
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import ObjectId
+from openai import OpenAI, APIError, NotFoundError
 from game_api_helper import fetch_from_igdb, fetch_from_rawg
-from csv_helper import read_csv_file, format_game_info
+from csv_helper import load_catalog, format_game_info
+from catalog_index import CatalogIndex, FacetIndex, SimilarityIndex
+from answer_cache import AnswerCache
+from write_behind import WriteBehindQueue
+from telemetry import FULL_OBJECT_LOGS, registry, request_context, span, submit, traced
 
 # Load environment variables
 load_dotenv()
@@ -19,106 +31,354 @@ twitch_client_secret = os.getenv("TWITCH_CLIENT_SECRET")
 twitch_token_url = os.getenv("TWITCH_TOKEN_URL")
 mongo_uri = os.getenv("MONGODB_URI")
 
-client = OpenAI(api_key=openai_api_key)
-
-# Ensure environment variables are loaded correctly
-if not all([openai_api_key, rawg_api_key, next_public_twitch_client_id, twitch_client_secret, twitch_token_url, mongo_uri]):
-    raise ValueError("One or more environment variables are missing or not set correctly")
+# Path of the game catalog; a columnar snapshot of it is cached next to it for fast loads
+CATALOG_PATH = os.getenv("CATALOG_PATH", "data/Video Games Data.csv")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Ensure environment variables are loaded correctly
+def check_environment():
+    if not all([openai_api_key, rawg_api_key, next_public_twitch_client_id, twitch_client_secret, twitch_token_url, mongo_uri]):
+        raise ValueError("One or more environment variables are missing or not set correctly")
+
+# Clients and datasets are created on first use, so importing this module does no I/O
+_init_lock = threading.RLock()
+_openai_client = None
+_database = None
+_video_games_df = None
+_catalog_index = None
+_facet_index = None
+_similarity_index = None
+
+def get_openai_client():
+    global _openai_client
+    with _init_lock:
+        if _openai_client is None:
+            # Check if API key is loaded
+            if openai_api_key is None:
+                raise ValueError("API key not found. Please set the OPENAI_API_KEY environment variable.")
+            _openai_client = OpenAI(api_key=openai_api_key)
+        return _openai_client
+
 # Connect to MongoDB
-mongo_client = MongoClient(mongo_uri)
-db = mongo_client["Wingman"]
-user_id_collection = db["userID"]
-questions_collection = db["question"]
+def get_database():
+    global _database
+    with _init_lock:
+        if _database is None:
+            if not mongo_uri:
+                raise ValueError("MONGODB_URI environment variable is missing")
+            _database = MongoClient(mongo_uri)["Wingman"]
+        return _database
+
+# Use an already connected database (or a compatible stand-in) instead of MONGODB_URI
+def set_database(database):
+    global _database
+    with _init_lock:
+        _database = database
+
+def get_user_collection():
+    return get_database()["userID"]
+
+def get_questions_collection():
+    return get_database()["question"]
 
-# Load the CSV files
-video_games_df = read_csv_file('data/Video Games Data.csv')
-data_dictionary_df = read_csv_file('data/vg_data_dictionary.csv')
+def get_assistants_collection():
+    return get_database()["assistant"]
+
+# Load the game catalog
+def get_video_games_df():
+    global _video_games_df
+    with _init_lock:
+        if _video_games_df is None:
+            _video_games_df = load_catalog(CATALOG_PATH)
+        return _video_games_df
+
+# Title and facet indexes built once so lookups scale with the result size rather than the catalog size
+def get_catalog_index():
+    global _catalog_index
+    with _init_lock:
+        if _catalog_index is None:
+            _catalog_index = CatalogIndex(get_video_games_df())
+        return _catalog_index
+
+def get_facet_index():
+    global _facet_index
+    with _init_lock:
+        if _facet_index is None:
+            _facet_index = FacetIndex(get_video_games_df())
+        return _facet_index
+
+# Feature vectors for "similar to" questions, sharing the title index's normalized titles
+def get_similarity_index():
+    global _similarity_index
+    with _init_lock:
+        if _similarity_index is None:
+            _similarity_index = SimilarityIndex(get_video_games_df(), titles=get_catalog_index().titles)
+        return _similarity_index
+
+# Module attributes kept for callers that used the eagerly created globals
+_LAZY_ATTRIBUTES = {
+    "client": get_openai_client,
+    "db": get_database,
+    "user_id_collection": get_user_collection,
+    "questions_collection": get_questions_collection,
+    "assistants_collection": get_assistants_collection,
+    "video_games_df": get_video_games_df,
+    "catalog_index": get_catalog_index,
+    "facet_index": get_facet_index,
+    "similarity_index": get_similarity_index,
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Number of catalog rows listed when answering a genre question
+GENRE_RESULTS_LIMIT = int(os.getenv("GENRE_RESULTS_LIMIT", "10"))
+
+# Search the catalog by any combination of genre, console, publisher and release year range.
+# Returns one page of matching rows and the total number of matches.
+@traced("catalog.facets")
+def search_games(genre=None, console=None, publisher=None, year_from=None, year_to=None, page=1, page_size=20):
+    total, row_ids = get_facet_index().query(
+        offset=(page - 1) * page_size,
+        limit=page_size,
+        year_from=year_from,
+        year_to=year_to,
+        genre=genre,
+        console=console,
+        publisher=publisher
+    )
+    return get_video_games_df().iloc[row_ids], total
 
 # Search games by genre
 def search_games_by_genre(genre):
-    results = video_games_df[video_games_df['Genre'].str.contains(genre, case=False, na=False)]
-    return results
+    total, row_ids = get_facet_index().query(genre=genre)
+    return get_video_games_df().iloc[row_ids]
 
-# Search games by name
-def search_game_by_name(game_name):
-    results = video_games_df[video_games_df['title'].str.contains(game_name, case=False)]
-    return results
+# Answer a genre question from the local catalog, or None if the catalog has no match
+def answer_genre_question(genre, limit=None):
+    results, total = search_games(genre=genre, page_size=limit or GENRE_RESULTS_LIMIT)
+    if results.empty:
+        return None
+    games = "\n".join(format_game_info(game_info) for _, game_info in results.iterrows())
+    return f"Found {total} {genre} games in the catalog. Here are {len(results)} of them:\n{games}"
+
+# Number of similar games listed, the similarity metric ("cosine" or "jaccard") and, for very
+# large catalogs, how many candidate rows an approximate search scores (0 searches exactly)
+SIMILAR_RESULTS_LIMIT = int(os.getenv("SIMILAR_RESULTS_LIMIT", "10"))
+SIMILARITY_METRIC = os.getenv("SIMILARITY_METRIC", "cosine").lower()
+SIMILAR_CANDIDATE_LIMIT = int(os.getenv("SIMILAR_CANDIDATE_LIMIT", "0"))
+
+# Catalog games most similar to the named game by genre, console, publisher and release year.
+# Returns (the game's catalog rows, similar rows, their scores), or None if the game is not in the catalog.
+@traced("catalog.similar")
+def find_similar_games(game_name, limit=None):
+    row_ids = get_catalog_index().lookup(game_name)
+    if not row_ids:
+        best = get_catalog_index().search(game_name, 1)
+        if not best:
+            return None
+        row_ids = get_catalog_index().lookup(get_catalog_index().titles[best[0]])
+    similar_rows, scores = get_similarity_index().similar(
+        row_ids,
+        k=limit or SIMILAR_RESULTS_LIMIT,
+        metric=SIMILARITY_METRIC,
+        candidate_limit=SIMILAR_CANDIDATE_LIMIT
+    )
+    df = get_video_games_df()
+    return df.iloc[row_ids], df.iloc[similar_rows], scores
+
+# Answer a "similar to" question from the local catalog, or None if the game is not in it
+def answer_similar_question(game_name, limit=None):
+    found = find_similar_games(game_name.strip(" ?!.\"'"), limit)
+    if found is None:
+        return None
+    games, similar, scores = found
+    title = games.iloc[0]['title']
+    about = "\n".join(format_game_info(game_info) for _, game_info in games.iterrows())
+    if similar.empty:
+        return f"{about}\nNo similar games were found in the catalog."
+    listed = "\n".join(format_game_info(game_info) for _, game_info in similar.iterrows())
+    return f"{about}\nGames in the catalog most similar to {title}:\n{listed}"
+
+# Search games by name (substring match); pass limit to get only the best-ranked matches
+@traced("catalog.search")
+def search_game_by_name(game_name, limit=None):
+    if limit is None:
+        row_ids = get_catalog_index().contains(game_name)
+    else:
+        row_ids = get_catalog_index().search(game_name, limit)
+    return get_video_games_df().iloc[row_ids]
+
+# Per-source deadlines (seconds) for the concurrent lookups in fetch_data_from_all_sources
+SOURCE_TIMEOUTS = {
+    "IGDB": float(os.getenv("IGDB_TIMEOUT", "5")),
+    "RAWG": float(os.getenv("RAWG_TIMEOUT", "5")),
+}
+
+# One bounded worker pool per remote source, so a slow or rate-limited provider can only
+# tie up its own workers and never delays the other lookups
+source_executors = {
+    "IGDB": ThreadPoolExecutor(max_workers=int(os.getenv("IGDB_SOURCE_WORKERS", "8")), thread_name_prefix="igdb-source"),
+    "RAWG": ThreadPoolExecutor(max_workers=int(os.getenv("RAWG_SOURCE_WORKERS", "8")), thread_name_prefix="rawg-source"),
+}
+# Background work such as pre-warming assistant threads
+background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+
+# Look up a game in the local CSV catalog
+@traced("csv")
+def fetch_from_csv(game_name):
+    row_ids = get_catalog_index().lookup(game_name)
+    return format_game_info(get_video_games_df().iloc[row_ids[0]]) if row_ids else None
 
 # Fetch data from IGDB, RAWG, and CSV files
+@traced("sources")
 def fetch_data_from_all_sources(game_name):
     try:
-        access_token = get_client_credentials_access_token()
-        
-        igdb_data = fetch_from_igdb(game_name, access_token)
-        rawg_data = fetch_from_rawg(game_name)
-        
-        csv_game_info = video_games_df[video_games_df['title'].str.lower() == game_name.lower()]
-        csv_info = format_game_info(csv_game_info.iloc[0]) if not csv_game_info.empty else None
-        
+        sources = {
+            "IGDB": fetch_from_igdb,
+            "RAWG": fetch_from_rawg,
+        }
+        start = time.monotonic()
+        deadlines = {name: start + SOURCE_TIMEOUTS[name] for name in sources}
+        futures = {name: submit(source_executors[name], fetch, game_name, deadlines[name]) for name, fetch in sources.items()}
+
+        # The local catalog is an in-memory index lookup, so it runs here while the APIs are queried
+        try:
+            csv_data = fetch_from_csv(game_name)
+        except Exception as e:
+            logging.error(f"Error fetching data from CSV: {e}")
+            csv_data = None
+
+        results = {}
+        # Every source runs against its own deadline, so a slow provider only drops its own section
+        for name, future in futures.items():
+            remaining = deadlines[name] - time.monotonic()
+            try:
+                results[name] = future.result(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                future.cancel()
+                registry.inc("source_timeouts_total", source=name)
+                logging.warning(f"{name} lookup for '{game_name}' missed its {SOURCE_TIMEOUTS[name]}s deadline")
+            except Exception as e:
+                logging.error(f"Error fetching data from {name}: {e}")
+        results["CSV"] = csv_data
+
         combined_response = ""
-        
-        if igdb_data:
-            combined_response += f"IGDB Data:\n{igdb_data}\n"
-        
-        if rawg_data:
-            combined_response += f"RAWG Data:\n{rawg_data}\n"
-        
-        if csv_info:
-            combined_response += f"CSV Data:\n{csv_info}\n"
-        
+        for name, data in results.items():
+            if data:
+                combined_response += f"{name} Data:\n{data}\n"
+
         if not combined_response.strip():
             combined_response = "No relevant game information found in any database."
-        
+
         return combined_response
-    
+
     except Exception as e:
         logging.error(f"Error fetching data from APIs: {e}")
         return "Failed to fetch data due to an error."
 
-# Check if API key is loaded
-if openai_api_key is None:
-    raise ValueError("API key not found. Please set the OPENAI_API_KEY environment variable.")
-
 # AI Assistant (Video Game Wingman)
+ASSISTANT_NAME = "Video Game Wingman"
+ASSISTANT_MODEL = os.getenv("ASSISTANT_MODEL", "gpt-4o")
+ASSISTANT_TOOLS = [{"type": "code_interpreter"}]
+ASSISTANT_INSTRUCTIONS = """
+    You are an AI assistant specializing in video games. You can provide detailed analytics and insights into gameplay, helping players track their progress and identify areas for improvement. 
+    You can answer questions about game completion times, strategies to progress past difficult sections, fastest speedrun times, and general tips and tricks.
+    For example:
+    - "How long would it take to fully complete Super Mario Bros. on NES?"
+    - "How do I progress past the Water Temple in The Legend of Zelda: Ocarina of Time?"
+    - "What is the fastest speedrun time for Sonic the Hedgehog?"
+    - "Give me tips and tricks to improve my gameplay in Fortnite."
+    - "Give me a guide on how to clear Chapter 3 in Paper Mario: The Thousand Year Door."
+    - "What is the best strategy for completing Shrines in The Legend of Zelda: Breath of the Wild?"
+    - "What games in terms of genre are similar to Super Metroid?"
+    - "What games could you recommend to someone who is playing a Role-Playing Game for the first time?"
+    - "What types of games are you familiar with?"
+    -" What are some of the biggest challenges impacting the Global Video Game Industry?
+    Use up-to-date information and provide the best possible answers to enhance the user's gaming experience.
+"""
+
+# The assistant is created once and its id persisted, in ASSISTANT_REGISTRY_PATH when set
+# or the "assistant" collection otherwise, and updated only when its configuration changes
+ASSISTANT_REGISTRY_PATH = os.getenv("ASSISTANT_REGISTRY_PATH")
+_assistant = None
+_assistant_lock = threading.Lock()
+
+# Hash of everything that defines the assistant, used to detect configuration changes
+def assistant_fingerprint():
+    config = {"instructions": ASSISTANT_INSTRUCTIONS, "model": ASSISTANT_MODEL, "tools": ASSISTANT_TOOLS}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_assistant_record():
+    if ASSISTANT_REGISTRY_PATH:
+        if not os.path.exists(ASSISTANT_REGISTRY_PATH):
+            return None
+        with open(ASSISTANT_REGISTRY_PATH, encoding="utf-8") as registry_file:
+            return json.load(registry_file)
+    return get_assistants_collection().find_one({"name": ASSISTANT_NAME}, {"_id": 0})
+
+def store_assistant_record(assistant_id, fingerprint):
+    record = {"name": ASSISTANT_NAME, "assistantId": assistant_id, "fingerprint": fingerprint}
+    if ASSISTANT_REGISTRY_PATH:
+        with open(ASSISTANT_REGISTRY_PATH, "w", encoding="utf-8") as registry_file:
+            json.dump(record, registry_file)
+    else:
+        get_assistants_collection().update_one({"name": ASSISTANT_NAME}, {"$set": record}, upsert=True)
+
+def create_openai_assistant():
+    return get_openai_client().beta.assistants.create(
+        name=ASSISTANT_NAME,
+        instructions=ASSISTANT_INSTRUCTIONS,
+        tools=ASSISTANT_TOOLS,
+        model=ASSISTANT_MODEL
+    )
+
+# Return the registered assistant, creating or updating it only when needed
+@traced("assistant.setup")
 def setup_openai_assistant():
-    try:
-        assistant = client.beta.assistants.create(
-            name="Video Game Wingman",
-            instructions="""
-            You are an AI assistant specializing in video games. You can provide detailed analytics and insights into gameplay, helping players track their progress and identify areas for improvement. 
-            You can answer questions about game completion times, strategies to progress past difficult sections, fastest speedrun times, and general tips and tricks.
-            For example:
-            - "How long would it take to fully complete Super Mario Bros. on NES?"
-            - "How do I progress past the Water Temple in The Legend of Zelda: Ocarina of Time?"
-            - "What is the fastest speedrun time for Sonic the Hedgehog?"
-            - "Give me tips and tricks to improve my gameplay in Fortnite."
-            - "Give me a guide on how to clear Chapter 3 in Paper Mario: The Thousand Year Door."
-            - "What is the best strategy for completing Shrines in The Legend of Zelda: Breath of the Wild?"
-            - "What games in terms of genre are similar to Super Metroid?"
-            - "What games could you recommend to someone who is playing a Role-Playing Game for the first time?"
-            - "What types of games are you familiar with?"
-            -" What are some of the biggest challenges impacting the Global Video Game Industry?
-            Use up-to-date information and provide the best possible answers to enhance the user's gaming experience.
-            """,
-            tools=[{"type": "code_interpreter"}],
-            model="gpt-4o"
-        )
-        return assistant
-    except Exception as e:
-        logging.error(f"Failed to create assistant: {e}")
-        return None
+    global _assistant
+    with _assistant_lock:
+        if _assistant is not None:
+            return _assistant
+        try:
+            fingerprint = assistant_fingerprint()
+            record = load_assistant_record()
+            assistant = None
+            if record:
+                try:
+                    if record.get("fingerprint") == fingerprint:
+                        assistant = get_openai_client().beta.assistants.retrieve(record["assistantId"])
+                    else:
+                        logging.info("Assistant configuration changed, updating registered assistant")
+                        assistant = get_openai_client().beta.assistants.update(
+                            record["assistantId"],
+                            instructions=ASSISTANT_INSTRUCTIONS,
+                            tools=ASSISTANT_TOOLS,
+                            model=ASSISTANT_MODEL
+                        )
+                except NotFoundError:
+                    logging.warning(f"Registered assistant {record['assistantId']} no longer exists, creating a new one")
+            if assistant is None:
+                assistant = create_openai_assistant()
+            if not record or record.get("assistantId") != assistant.id or record.get("fingerprint") != fingerprint:
+                store_assistant_record(assistant.id, fingerprint)
+            _assistant = assistant
+            return assistant
+        except Exception as e:
+            logging.error(f"Failed to create assistant: {e}")
+            return None
 
 # Create a thread
-from openai import APIError
-
+@traced("assistant.thread")
 def create_thread():
     try:
-        thread = client.beta.threads.create()
-        logging.info(f"Thread created: {thread}")
+        thread = get_openai_client().beta.threads.create()
+        if FULL_OBJECT_LOGS:
+            logging.info(f"Thread created: {thread}")
         return thread
     except APIError as e:
         logging.error(f"Error creating thread: {e}")
@@ -127,47 +387,173 @@ def create_thread():
         logging.error(f"Unexpected error: {e}")
         return None
 
+# Users keep one thread across questions; it is replaced after THREAD_MAX_TURNS questions,
+# and each run only sends the last ASSISTANT_CONTEXT_MESSAGES messages (0 sends the whole thread)
+THREAD_MAX_TURNS = int(os.getenv("THREAD_MAX_TURNS", "50"))
+ASSISTANT_CONTEXT_MESSAGES = int(os.getenv("ASSISTANT_CONTEXT_MESSAGES", "20"))
+
+# Number of empty threads kept ready so a new conversation does not wait on thread creation
+THREAD_PREWARM_SIZE = int(os.getenv("THREAD_PREWARM_SIZE", "0"))
+prewarmed_threads = deque()
+_prewarm_lock = threading.Lock()
+
+# Fill the pool of empty threads up to THREAD_PREWARM_SIZE
+def prewarm_threads():
+    if not _prewarm_lock.acquire(blocking=False):
+        return  # another refill is already running
+    try:
+        while len(prewarmed_threads) < THREAD_PREWARM_SIZE:
+            thread = create_thread()
+            if thread is None:
+                return
+            prewarmed_threads.append(thread)
+    finally:
+        _prewarm_lock.release()
+
+# Take a pre-warmed thread if one is ready, otherwise create one
+def take_thread():
+    try:
+        thread = prewarmed_threads.popleft()
+    except IndexError:
+        thread = create_thread()
+    if THREAD_PREWARM_SIZE:
+        background_executor.submit(prewarm_threads)
+    return thread
+
+# True if the user's next assistant question opens a new thread, so its answer cannot
+# depend on earlier turns
+def starts_new_thread(user):
+    return not user.get("threadId") or user.get("threadTurns", 0) >= THREAD_MAX_TURNS
+
+# Thread id to use for this user's next question, reusing their current thread when possible
+@traced("thread.lookup")
+def get_user_thread(user):
+    if not starts_new_thread(user):
+        return user["threadId"]
+    thread = take_thread()
+    if thread is None:
+        return None
+    get_user_collection().update_one(
+        {"userId": user["userId"]},
+        {"$set": {"threadId": thread.id, "threadTurns": 0}},
+        upsert=True
+    )
+    user["threadId"] = thread.id
+    user["threadTurns"] = 0
+    return thread.id
+
+# Count a question against the user's current thread
+@traced("mongo.thread_turn")
+def record_thread_turn(user):
+    get_user_collection().update_one({"userId": user["userId"]}, {"$inc": {"threadTurns": 1}})
+    user["threadTurns"] = user.get("threadTurns", 0) + 1
+
 # Add a message to a thread
+@traced("assistant.message")
 def add_message_to_thread(thread_id, message_content):
     try:
-        message = client.beta.threads.messages.create(
+        message = get_openai_client().beta.threads.messages.create(
             thread_id=thread_id,
             role="user",
             content=message_content
         )
-        logging.info(f"Message added to thread: {message}")
+        if FULL_OBJECT_LOGS:
+            logging.info(f"Message added to thread: {message}")
         return message
     except Exception as e:
         logging.error(f"Error adding message to thread: {e}")
         return None
 
+# Options shared by polled and streamed runs
+def run_options():
+    options = {}
+    if ASSISTANT_CONTEXT_MESSAGES:
+        options["truncation_strategy"] = {"type": "last_messages", "last_messages": ASSISTANT_CONTEXT_MESSAGES}
+    return options
+
 # Run the assistant
+@traced("assistant.run")
 def run_assistant(thread_id, assistant_id):
     try:
-        run = client.beta.threads.runs.create(
+        run = get_openai_client().beta.threads.runs.create(
             thread_id=thread_id,
-            assistant_id=assistant_id
+            assistant_id=assistant_id,
+            **run_options()
         )
-        logging.info(f"Run created: {run}")
+        if FULL_OBJECT_LOGS:
+            logging.info(f"Run created: {run}")
         return run
     except Exception as e:
         logging.error(f"Error running assistant: {e}")
         return None
 
-# Retrieve and display the assistant's response
-import time
+# Assistant runs allowed in flight at once from this process
+ASSISTANT_MAX_CONCURRENCY = int(os.getenv("ASSISTANT_MAX_CONCURRENCY", "8"))
+assistant_slots = threading.BoundedSemaphore(ASSISTANT_MAX_CONCURRENCY)
+
+# Latency budget for a single assistant run and the polling schedule used while waiting on it
+ASSISTANT_RUN_TIMEOUT = float(os.getenv("ASSISTANT_RUN_TIMEOUT", "60"))
+RUN_POLL_INITIAL_INTERVAL = float(os.getenv("RUN_POLL_INITIAL_INTERVAL", "0.25"))
+RUN_POLL_MAX_INTERVAL = float(os.getenv("RUN_POLL_MAX_INTERVAL", "2.0"))
+RUN_POLL_BACKOFF = 1.5
+TERMINAL_RUN_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete", "requires_action"}
+# Streaming events that end a run; thread.run.step.* events carry a status too, but only for one step
+TERMINAL_RUN_EVENTS = {f"thread.run.{status}" for status in TERMINAL_RUN_STATUSES}
+
+# Poll a run until it reaches a terminal state, cancelling it if it overruns the deadline
+@traced("assistant.wait")
+def wait_for_run(thread_id, run_id, timeout=None):
+    timeout = ASSISTANT_RUN_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    interval = RUN_POLL_INITIAL_INTERVAL
+    while True:
+        run = get_openai_client().beta.threads.runs.retrieve(run_id, thread_id=thread_id)
+        registry.inc("assistant_run_polls_total")
+        if run.status in TERMINAL_RUN_STATUSES:
+            return run
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+        interval = min(interval * RUN_POLL_BACKOFF, RUN_POLL_MAX_INTERVAL)
 
-def display_assistant_response(thread_id, run_id):
+    registry.inc("assistant_run_timeouts_total")
+    logging.warning(f"Run {run_id} did not finish within {timeout}s (last status: {run.status}), cancelling")
+    return cancel_run(thread_id, run_id) or run
+
+# Cancel a run so the thread accepts new messages again; returns the run, or None if that failed
+def cancel_run(thread_id, run_id):
     try:
-        logging.info(f"Processing response for thread_id: {thread_id} and run_id: {run_id}")
-        time.sleep(15)
-        messages = client.beta.threads.messages.list(thread_id=thread_id)
-        for message in reversed(messages.data):
+        return get_openai_client().beta.threads.runs.cancel(run_id, thread_id=thread_id)
+    except Exception as e:
+        logging.error(f"Error cancelling run {run_id}: {e}")
+        return None
+
+# Retrieve and display the assistant's response
+def display_assistant_response(thread_id, run_id, timeout=None):
+    try:
+        if FULL_OBJECT_LOGS:
+            logging.info(f"Processing response for thread_id: {thread_id} and run_id: {run_id}")
+        run = wait_for_run(thread_id, run_id, timeout)
+        registry.inc("assistant_runs_total", status=run.status)
+        if run.status != "completed":
+            logging.info(f"Run {run_id} ended with status {run.status}, no response from assistant.")
+            return None
+        with span("assistant.response"):
+            messages = get_openai_client().beta.threads.messages.list(
+                thread_id=thread_id,
+                run_id=run_id,
+                order="desc",
+                limit=1
+            )
+        for message in messages.data:
             if message.role == "assistant":
-                logging.info(f"Full Assistant Message: {message}")
+                if FULL_OBJECT_LOGS:
+                    logging.info(f"Full Assistant Message: {message}")
                 if message.content and message.content[0].text and message.content[0].text.value:
                     response = message.content[0].text.value
-                    logging.info(f"Assistant: {response}")
+                    if FULL_OBJECT_LOGS:
+                        logging.info(f"Assistant: {response}")
                     return response
                 else:
                     logging.info("Assistant message does not have the expected content format.")
@@ -175,153 +561,573 @@ def display_assistant_response(thread_id, run_id):
     except Exception as e:
         logging.error(f"Error retrieving messages: {e}")
 
+# Interactions live only in the question collection; this index serves the per-user history queries
+def ensure_indexes():
+    get_questions_collection().create_index([("userId", ASCENDING), ("timestamp", DESCENDING)])
+    # Serves the answer cache warm-up query
+    get_questions_collection().create_index([("source", ASCENDING), ("timestamp", DESCENDING)])
+    # One document per user, however many first requests race to create it
+    get_user_collection().create_index("userId", unique=True)
+
 # Get or create user in MongoDB
+@traced("mongo.user")
 def get_or_create_user(user_id):
-    user = user_id_collection.find_one({"userId": user_id})
+    user = get_user_collection().find_one({"userId": user_id}, {"conversations": 0})
     if not user:
         user = {
             "userId": user_id,
-            "conversations": []
+            "keywordCounts": {}
         }
-        user_id_collection.insert_one(user)
+        # Concurrent first requests from the same user must not create a document each
+        try:
+            result = get_user_collection().update_one({"userId": user_id}, {"$setOnInsert": {"keywordCounts": {}}}, upsert=True)
+        except DuplicateKeyError:
+            # Another request inserted the user between our lookup and the upsert
+            result = None
+        if result is None or result.upserted_id is None:
+            user = get_user_collection().find_one({"userId": user_id}, {"conversations": 0}) or user
+    if "keywordCounts" not in user:
+        # Users created before keyword counts were tracked get them backfilled once from their history
+        user["keywordCounts"] = count_keywords(get_previous_interactions(user_id))
+        get_user_collection().update_one(
+            {"userId": user_id},
+            {"$set": {"keywordCounts": user["keywordCounts"]}}
+        )
     return user
 
 # Save interaction in MongoDB
 import datetime
 
-def save_interaction(user_id, question, response):
+# Optional write-behind buffering so request handling does not wait on MongoDB writes
+INTERACTION_WRITE_BEHIND = os.getenv("INTERACTION_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+interaction_queue = None
+
+# Write a batch of interactions: one insert_many plus one bulk_write of per-user updates.
+# Interactions are stored with countPending set and it is cleared once their keywords are
+# added to the user's counts, so a retried batch counts each interaction exactly once.
+@traced("mongo.write")
+def persist_interactions(interactions):
+    interactions = [dict(interaction, countPending=True) for interaction in interactions]
+    try:
+        get_questions_collection().insert_many(interactions, ordered=False)
+    except BulkWriteError as e:
+        # Interactions replayed from a spill file or a resumed batch may already be stored;
+        # only those whose counting never completed are counted now
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        duplicates = {error["index"] for error in errors}
+        pending = {
+            stored["_id"] for stored in get_questions_collection().find(
+                {"_id": {"$in": [interactions[position]["_id"] for position in duplicates]}, "countPending": True}, {"_id": 1}
+            )
+        }
+        interactions = [
+            interaction for position, interaction in enumerate(interactions)
+            if position not in duplicates or interaction["_id"] in pending
+        ]
+
+    user_updates = {}
+    for interaction in interactions:
+        update = user_updates.setdefault(interaction["userId"], {"$max": {}, "$inc": {}})
+        update["$max"]["lastInteractionAt"] = interaction["timestamp"]
+        for keyword, count in match_keywords(interaction["question"]).items():
+            field = f"keywordCounts.{keyword}"
+            update["$inc"][field] = update["$inc"].get(field, 0) + count
+
+    operations = [
+        UpdateOne({"userId": user_id}, {operator: fields for operator, fields in update.items() if fields}, upsert=True)
+        for user_id, update in user_updates.items()
+    ]
+    if operations:
+        get_user_collection().bulk_write(operations, ordered=False)
+        get_questions_collection().update_many(
+            {"_id": {"$in": [interaction["_id"] for interaction in interactions]}},
+            {"$unset": {"countPending": ""}}
+        )
+
+def get_interaction_queue():
+    global interaction_queue
+    if interaction_queue is None:
+        interaction_queue = WriteBehindQueue(
+            persist_interactions,
+            max_batch=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "1.0")),
+            max_queue=int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000")),
+            spill_path=os.getenv("WRITE_BEHIND_SPILL_PATH")
+        )
+        registry.register_collector("write_behind", interaction_queue.metrics)
+    return interaction_queue
+
+# source records how the response was produced: "assistant", "answer_cache", "catalog" or "sources".
+# For assistant answers thread_turn is the question's turn on the user's thread (1 for the first).
+def build_interaction(user_id, question, response, source=None, interaction_id=None, thread_turn=None):
     interaction = {
+        # The id is assigned up front so a replayed write cannot create a duplicate
+        "_id": interaction_id or ObjectId(),
         "userId": user_id,
         "question": question,
         "response": response,
         "timestamp": datetime.datetime.now()
     }
-    questions_collection.insert_one(interaction)
-    user_id_collection.update_one(
-        {"userId": user_id},
-        {"$push": {"conversations": interaction}},
-        upsert=True
-    )
+    if source:
+        interaction["source"] = source
+    if thread_turn is not None and source in ("assistant", "assistant_partial"):
+        interaction["threadTurn"] = thread_turn
+    return interaction
+
+@traced("save_interaction")
+def save_interaction(user_id, question, response, source=None, thread_turn=None):
+    interaction = build_interaction(user_id, question, response, source, thread_turn=thread_turn)
+    if INTERACTION_WRITE_BEHIND:
+        get_interaction_queue().put(interaction)
+    else:
+        persist_interactions([interaction])
 
 # Retrieve and analyze previous interactions
 import re
 
-def get_previous_interactions(user_id):
-    user = user_id_collection.find_one({"userId": user_id})
-    if user and "conversations" in user:
-        return user["conversations"]
-    return []
+INTERACTION_PROJECTION = {"_id": 0, "question": 1, "response": 1, "timestamp": 1}
+
+# Previous interactions in chronological order. Pass limit to get only the last N, and
+# before (the timestamp of the oldest interaction already seen) to page further back.
+@traced("mongo.history")
+def get_previous_interactions(user_id, limit=None, before=None):
+    query = {"userId": user_id}
+    if before is not None:
+        query["timestamp"] = {"$lt": before}
+
+    if limit is None:
+        cursor = get_questions_collection().find(query, INTERACTION_PROJECTION).sort("timestamp", ASCENDING)
+        return list(cursor)
+
+    cursor = get_questions_collection().find(query, INTERACTION_PROJECTION).sort("timestamp", DESCENDING).limit(limit)
+    return list(reversed(list(cursor)))
+
+# Genre keywords and the game recommended when a user asks about them
+RECOMMENDATION_KEYWORDS = {
+    "role-playing game": "Try playing 'Final Fantasy VII'",
+    "rpg": "Try playing 'Paper Mario: The Thousand-Year Door'",
+    "action-adventure": "Try playing 'The Last of Us'",
+    "hack and slash": "You might enjoy 'Devil May Cry 3'",
+    "action rpg": "Try playing 'Xenoblade Chronicles'",
+    "battle royale": "Try playing 'Fortnite'",
+    "platformer": "Try playing 'Super Mario 64'",
+    "survival horror": "Try playing 'Resident Evil 4'",
+    "third-person shooter": "Try playing 'Splatoon 3'",
+    "metroidvania": "Try playing 'Castlevania: Symphony of the Night'",
+    "first-person shooter": "Try playing 'Bioshock Infinite'",
+    "sandbox": "Try playing 'Minecraft'",
+    "roguelike": "Try playing 'Hades'",
+    "social simulation": "Try playing 'Animal Crossing: New Horizons'",
+    "mmo": "Try playing 'Runescape'",
+    "massively multiplayer online role-playing game": "Try playing 'World of Warcraft'",
+    "moba": "Try playing 'League of Legends'",
+    "multiplayer online battle arena": "Try playing 'Dota 2'",
+    "puzzle-platformer": "Try playing 'Portal'",
+    "fighting game": "Try playing 'Super Smash Bros. Ultimate'",
+    "tactical role-playing game": "Try playing 'Fire Emblem: Awakening'",
+    "tower defense": "Try playing 'Bloons TD 6'",
+    "racing": "Try playing 'Forza Horizon 5'",
+    "kart racing": "Try playing 'Mario Kart 8 Deluxe'",
+    "rail shooter": "Try playing 'Star Fox 64'",
+    "stealth": "Try playing 'Metal Gear Solid'",
+    "run and gun": "Try playing 'Cuphead'",
+    "turn-based strategy": "Try playing 'Advance Wars'",
+    "4x": "Try playing 'Sid Meier's Civilization VI'",
+    "sports": "Try playing 'Wii Sports'",
+    "party": "Try playing 'Mario Party Superstars'",
+    "rhythm": "Try playing 'Rock Band'",
+    "point and click": "Try playing 'Five Night's at Freddy's'",
+    "visual novel": "Try playing 'Phoenix Wright: Ace Attorney'",
+    "real-time strategy": "Try playing 'Command & Conquer'",
+    "beat 'em up": "Try playing 'Streets of Rage 4'",
+    "puzzle": "Try playing 'Tetris'",
+    "turn-based tactics": "Try playing 'XCOM: Enemy Unknown'",
+    "interactive story": "Try playing 'The Stanley Parable'",
+    "maze": "Try playing 'Pac-Man'",
+    "game creation system": "Try playing 'Roblox'",
+    "level editor": "Try playing 'Super Mario Maker'",
+    "endless runner": "Try playing 'Temple Run'",
+    "digital collectible card game": "Try playing 'Yu-Gi-Oh! Master Duel'",
+    "exergaming": "Try playing 'Wii Fit'",
+    "immersive sim": "Try playing 'Deathloop'",
+    "tile-matching": "Try playing 'Bejeweled'",
+    "text based": "Try playing 'The Oregon Trail'",
+    "augmented reality": "Try playing 'Pokémon Go'"
+}
+
+# All keywords compiled into one alternation, longest first so the most specific keyword wins.
+# Like the per-keyword re.search it replaced, a keyword matches anywhere in the text, so plurals
+# and compounds count too ("platformers", "JRPG", "MMORPG" for both "mmo" and "rpg"). The
+# alternation sits in a lookahead so it is tried at every position and overlapping keywords
+# are all found ("role-playing game creation system" has "role-playing game" and "game creation system").
+KEYWORD_PATTERN = re.compile(
+    "(?=(" + "|".join(re.escape(keyword) for keyword in sorted(RECOMMENDATION_KEYWORDS, key=len, reverse=True)) + "))",
+    re.IGNORECASE
+)
+
+# A match on a longer keyword also counts, at a lower weight, for the keywords it contains
+# (e.g. "action rpg" also counts towards "rpg")
+IMPLIED_KEYWORD_WEIGHT = 0.5
+IMPLIED_KEYWORDS = {
+    keyword: [
+        other for other in RECOMMENDATION_KEYWORDS
+        if other != keyword and other in keyword
+    ]
+    for keyword in RECOMMENDATION_KEYWORDS
+}
+
+# Weighted keyword counts for a single piece of text, found in one pass over it
+def match_keywords(text):
+    counts = {}
+    matched_until = 0
+    for match in KEYWORD_PATTERN.finditer(text):
+        # A keyword inside an earlier match is already counted as implied by it
+        if match.end(1) <= matched_until:
+            continue
+        matched_until = match.end(1)
+        keyword = match.group(1).lower()
+        counts[keyword] = counts.get(keyword, 0) + 1
+        for implied in IMPLIED_KEYWORDS[keyword]:
+            counts[implied] = counts.get(implied, 0) + IMPLIED_KEYWORD_WEIGHT
+    return counts
+
+# Weighted keyword counts across a list of interactions
+def count_keywords(interactions):
+    counts = {}
+    for interaction in interactions:
+        for keyword, count in match_keywords(interaction["question"]).items():
+            counts[keyword] = counts.get(keyword, 0) + count
+    return counts
+
+# Recommendations ordered by how often their keyword came up, ties broken by table order
+def rank_recommendations(keyword_counts):
+    order = {keyword: position for position, keyword in enumerate(RECOMMENDATION_KEYWORDS)}
+    ranked = sorted(
+        (keyword for keyword, count in keyword_counts.items() if count > 0 and keyword in order),
+        key=lambda keyword: (-keyword_counts[keyword], order[keyword])
+    )
+    recommendations = []
+    for keyword in ranked:
+        recommendation = RECOMMENDATION_KEYWORDS[keyword]
+        if recommendation not in recommendations:
+            recommendations.append(recommendation)
+    return recommendations
 
 # Generate recommendations based on previous interactions
+@traced("recommendations.scan")
 def generate_recommendations(previous_interactions):
-    recommendations = []
-    keywords = {
-        "role-playing game": "Try playing 'Final Fantasy VII'",
-        "rpg": "Try playing 'Paper Mario: The Thousand-Year Door'",
-        "action-adventure": "Try playing 'The Elder Scrolls V: Skyrim'",
-        "hack and slash": "You might enjoy 'Devil May Cry 3'",
-        "action rpg": "Try playing 'Xenoblade Chronicles'",
-        "battle royale": "Try playing 'Fortnite'",
-        "platformer": "Try playing 'Super Mario 64'",
-        "survival horror": "Try playing 'Resident Evil 4'",
-        "third-person shooter": "Try playing 'Splatoon 3'",
-        "metroidvania": "Try playing 'Castlevania: Symphony of the Night'",
-        "first-person shooter": "Try playing 'Bioshock Infinite'",
-        "sandbox": "Try playing 'Minecraft'",
-        "roguelike": "Try playing 'Hades'",
-        "social simulation": "Try playing 'Animal Crossing: New Horizons'",
-        "mmo": "Try playing 'Runescape'",
-        "massively multiplayer online role-playing game": "Try playing 'World of Warcraft'",
-        "moba": "Try playing 'League of Legends'",
-        "multiplayer online battle arena": "Try playing 'Dota 2'",
-        "puzzle-platformer": "Try playing 'Portal'",
-        "fighting game": "Try playing 'Super Smash Bros. Ultimate'",
-        "tactical role-playing game": "Try playing 'Fire Emblem: Awakening'",
-        "tower defense": "Try playing 'Bloons TD 6'",
-        "racing": "Try playing 'Forza Horizon 5'",
-        "kart racing": "Try playing 'Mario Kart 8 Deluxe'",
-        "rail shooter": "Try playing 'Star Fox 64'",
-        "stealth": "Try playing 'Metal Gear Solid'",
-        "run and gun": "Try playing 'Cuphead'",
-        "turn-based strategy": "Try playing 'Advance Wars'",
-        "4x": "Try playing 'Sid Meier's Civilization VI'",
-        "sports": "Try playing 'Wii Sports'",
-        "party": "Try playing 'Mario Party Superstars'",
-        "rhythm": "Try playing 'Rock Band'",
-        "point and click": "Try playing 'Five Night's at Freddy's'",
-        "visual novel": "Try playing 'Phoenix Wright: Ace Attorney'",
-        "real-time strategy": "Try playing 'Command & Conquer'",
-        "beat 'em up": "Try playing 'Streets of Rage 4'",
-        "puzzle": "Try playing 'Tetris'",
-        "turn-based tactics": "Try playing 'XCOM: Enemy Unknown'",
-        "interactive story": "Try playing 'The Stanley Parable'",
-        "maze": "Try playing 'Pac-Man'",
-        "game creation system": "Try playing 'Roblox'",
-        "level editor": "Try playing 'Super Mario Maker'",
-        "endless runner": "Try playing 'Temple Run'",
-        "digital collectible card game": "Try playing 'Yu-Gi-Oh! Master Duel'",
-        "exergaming": "Try playing 'Wii Fit'",
-        "immersive sim": "Try playing 'Deathloop'",
-        "tile-matching": "Try playing 'Bejeweled'",
-        "text based": "Try playing 'The Oregon Trail'",
-        "augmented reality": "Try playing 'Pokémon Go'",
-        "action-adventure": "Try playing 'The Last of Us'"
-    }
+    return rank_recommendations(count_keywords(previous_interactions))
 
-    for interaction in previous_interactions:
-        for keyword, recommendation in keywords.items():
-            if re.search(keyword, interaction["question"], re.IGNORECASE):
-                if recommendation not in recommendations:
-                    recommendations.append(recommendation)
-    
-    return recommendations
+# Recommendations from the keyword counts kept up to date by save_interaction,
+# so the user's history never has to be rescanned
+@traced("recommendations")
+def get_recommendations(user_id):
+    user = get_user_collection().find_one({"userId": user_id}, {"keywordCounts": 1})
+    if not user:
+        return []
+    return rank_recommendations(user.get("keywordCounts", {}))
+
+# Assistant answers are reused for repeated or near-identical questions: an exact match on the
+# normalized question first, then cosine similarity of hashed n-gram vectors at or above
+# ANSWER_CACHE_THRESHOLD. The cache is per process and shared by all users, so it only holds
+# answers given on the first turn of a thread, which no earlier conversation could have shaped,
+# and is warmed from recent answers of that kind.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+ANSWER_CACHE_WARM_LIMIT = int(os.getenv("ANSWER_CACHE_WARM_LIMIT", "5000"))
+_answer_cache = None
+
+def get_answer_cache():
+    global _answer_cache
+    with _init_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache(
+                threshold=ANSWER_CACHE_THRESHOLD,
+                ttl=ANSWER_CACHE_TTL,
+                max_entries=ANSWER_CACHE_MAX_ENTRIES
+            )
+            registry.register_collector("answer_cache", _answer_cache.stats)
+            warm_answer_cache(_answer_cache)
+        return _answer_cache
+
+# Load the most recent assistant answers still inside the TTL from the question collection
+def warm_answer_cache(cache):
+    since = datetime.datetime.now() - datetime.timedelta(seconds=ANSWER_CACHE_TTL)
+    try:
+        cursor = get_questions_collection().find(
+            {"source": "assistant", "threadTurn": 1, "timestamp": {"$gte": since}},
+            {"_id": 0, "question": 1, "response": 1, "timestamp": 1}
+        ).sort("timestamp", DESCENDING).limit(ANSWER_CACHE_WARM_LIMIT)
+        interactions = list(cursor)
+    except Exception as e:
+        logging.error(f"Could not warm the answer cache: {e}")
+        return
+    loaded = cache.warm(
+        (interaction["question"], interaction["response"], interaction["timestamp"].timestamp())
+        for interaction in reversed(interactions)
+        if interaction.get("response")
+    )
+    logging.info(f"Answer cache warmed with {loaded} answers")
+
+@traced("answer_cache")
+def lookup_cached_answer(question):
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    match = get_answer_cache().lookup(question)
+    return match[0] if match else None
+
+# Cache an answer the assistant just gave the user, unless their thread had earlier turns
+def store_cached_answer(user, question, answer):
+    if ANSWER_CACHE_ENABLED and user.get("threadTurns") == 1:
+        get_answer_cache().put(question, answer)
+
+# Forget cached answers about a game, e.g. after a patch changes it; returns how many were dropped
+def invalidate_cached_answers(game_title):
+    if not ANSWER_CACHE_ENABLED:
+        return 0
+    return get_answer_cache().invalidate_game(game_title)
+
+# Decide how a question is answered: ("similar", game), ("genre", genre) or ("assistant", question)
+def route_question(question):
+    lowered = question.lower()
+    if "similar to" in lowered:
+        return "similar", question[lowered.index("similar to") + len("similar to"):].strip()
+    if "genre" in lowered:
+        return "genre", question[lowered.index("genre") + len("genre"):].strip()
+    return "assistant", question
+
+# Ask the assistant on the user's thread; returns None if any step fails
+def ask_assistant(user, question):
+    assistant = setup_openai_assistant()
+    if assistant is None:
+        logging.error("Assistant could not be created.")
+        return None
+
+    thread_id = get_user_thread(user)
+    if not thread_id:
+        logging.error("Failed to create thread")
+        return None
+
+    # Time spent waiting for a free slot under ASSISTANT_MAX_CONCURRENCY
+    with span("assistant.queue"):
+        assistant_slots.acquire()
+    try:
+        message = add_message_to_thread(thread_id, question)
+        if not message:
+            logging.error("Failed to add message to thread")
+            return None
+        record_thread_turn(user)
+
+        run = run_assistant(thread_id, assistant.id)
+        if not run:
+            logging.error("Failed to run assistant")
+            return None
+        return display_assistant_response(thread_id, run.id)
+    finally:
+        assistant_slots.release()
+
+# Ask the assistant on the user's thread and yield its answer as text deltas while the run
+# generates it, so the first words reach the caller long before the run finishes. Returns the
+# run's final status ("timeout" past ASSISTANT_RUN_TIMEOUT), or None if the run could not be
+# started. A run that does not complete, including when the caller stops reading, is cancelled.
+def stream_assistant(user, question, timeout=None):
+    assistant = setup_openai_assistant()
+    if assistant is None:
+        logging.error("Assistant could not be created.")
+        return None
+
+    thread_id = get_user_thread(user)
+    if not thread_id:
+        logging.error("Failed to create thread")
+        return None
+
+    timeout = ASSISTANT_RUN_TIMEOUT if timeout is None else timeout
+    with span("assistant.queue"):
+        assistant_slots.acquire()
+    run_id = None
+    status = None
+    try:
+        message = add_message_to_thread(thread_id, question)
+        if not message:
+            logging.error("Failed to add message to thread")
+            return None
+        record_thread_turn(user)
+
+        start = time.monotonic()
+        first_token = True
+        # The request timeout bounds the wait for each event, the deadline the whole run
+        stream = get_openai_client().beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=assistant.id,
+            stream=True,
+            timeout=timeout,
+            **run_options()
+        )
+        with stream:
+            for event in stream:
+                if event.event == "thread.run.created":
+                    run_id = event.data.id
+                elif event.event == "thread.message.delta":
+                    for content in event.data.delta.content or []:
+                        if content.type == "text" and content.text and content.text.value:
+                            if first_token:
+                                first_token = False
+                                registry.observe("assistant_first_token_seconds", time.monotonic() - start)
+                            yield content.text.value
+                elif event.event in TERMINAL_RUN_EVENTS:
+                    status = event.data.status
+                elif event.event == "error":
+                    logging.error(f"Assistant stream error: {event.data}")
+                if status is None and time.monotonic() - start > timeout:
+                    registry.inc("assistant_run_timeouts_total")
+                    logging.warning(f"Run {run_id} did not finish within {timeout}s, cancelling")
+                    status = "timeout"
+                if status is not None:
+                    break
+        registry.observe("assistant_stream_seconds", time.monotonic() - start)
+        registry.inc("assistant_runs_total", status=status or "unknown")
+        return status
+    except Exception as e:
+        logging.error(f"Error streaming assistant response: {e}")
+        return None
+    finally:
+        if status != "completed" and run_id:
+            cancel_run(thread_id, run_id)
+        assistant_slots.release()
+
+# Produce the answer to a question without saving it, along with where it came from
+def generate_answer_with_source(user, question):
+    route, argument = route_question(question)
+    registry.inc("questions_total", route=route)
+    if route == "similar":
+        answer = answer_similar_question(argument)
+        return (answer, "catalog") if answer else (fetch_data_from_all_sources(argument), "sources")
+    if route == "genre":
+        answer = answer_genre_question(argument)
+        return (answer, "catalog") if answer else (fetch_data_from_all_sources(argument), "sources")
+
+    answer = lookup_cached_answer(question)
+    if answer:
+        return answer, "answer_cache"
+    answer = ask_assistant(user, question)
+    if answer:
+        store_cached_answer(user, question, answer)
+        return answer, "assistant"
+    return fetch_data_from_all_sources(question), "sources"
+
+# Produce the answer to a question without saving it
+def generate_answer(user, question):
+    return generate_answer_with_source(user, question)[0]
+
+# Answer a user's question and save the interaction
+def answer_question(user_id, question):
+    with request_context("answer_question"):
+        user = get_or_create_user(user_id)
+        response, source = generate_answer_with_source(user, question)
+        save_interaction(user_id, question, response, source, user.get("threadTurns"))
+        return response
+
+# Answer a user's question like answer_question, yielding the response in pieces as it is
+# produced: assistant answers arrive as text deltas, every other route in one piece. The
+# interaction is saved once the answer is complete. If the stream is cut off (the caller stops
+# reading, or the run fails or times out midway) the text received so far is saved with
+# source "assistant_partial" and is not added to the answer cache.
+def stream_answer(user_id, question, correlation_id=None):
+    with request_context("stream_answer", correlation_id):
+        user = get_or_create_user(user_id)
+        if route_question(question)[0] == "assistant":
+            registry.inc("questions_total", route="assistant")
+            response, source = lookup_cached_answer(question), "answer_cache"
+        else:
+            response, source = generate_answer_with_source(user, question)
+
+        if not response:
+            parts = []
+            status = None
+            deltas = stream_assistant(user, question)
+            try:
+                while True:
+                    try:
+                        delta = next(deltas)
+                    except StopIteration as done:
+                        status = done.value
+                        break
+                    parts.append(delta)
+                    yield delta
+            finally:
+                deltas.close()
+                if status != "completed" and parts:
+                    registry.inc("assistant_partial_answers_total")
+                    logging.warning(f"Answer stream for user {user_id} was cut off after {len(parts)} deltas, saving the partial answer")
+                    save_interaction(user_id, question, "".join(parts), "assistant_partial", user.get("threadTurns"))
+
+            if parts:
+                if status == "completed":
+                    response = "".join(parts)
+                    store_cached_answer(user, question, response)
+                    save_interaction(user_id, question, response, "assistant", user.get("threadTurns"))
+                return
+            response, source = fetch_data_from_all_sources(question), "sources"
+
+        # Answers that are complete before anything is sent are saved before sending
+        save_interaction(user_id, question, response, source)
+        yield response
+
+_STREAM_END = object()
+
+# Async iterator over stream_answer for event loop callers. The answer is produced on a worker
+# thread (executor, or the loop's default one) and handed over delta by delta; if the consumer
+# stops early the stream is closed after the next delta, which saves the partial answer.
+async def astream_answer(user_id, question, correlation_id=None, executor=None):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def produce():
+        stream = stream_answer(user_id, question, correlation_id)
+        try:
+            for delta in stream:
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, delta)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            stream.close()
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+
+    producer = loop.run_in_executor(executor, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        await producer
 
 # Generate response
 def main():
     try:
-        assistant = setup_openai_assistant()
-        if assistant is None:
-            raise Exception("Assistant could not be created.")
+        check_environment()
 
         user_id = input("Enter your user ID: ")
         question = input("Enter your gameplay data or question for analysis: ")
 
-        # Get or create user in MongoDB
-        user = get_or_create_user(user_id)
-        
-        thread = create_thread()
-        if thread:
-            if "similar to" in question.lower():
-                game_name = question.split("similar to ")[1].strip()
-                response = fetch_data_from_all_sources(game_name)
-                print(response)
-                save_interaction(user_id, question, response)
-            elif "genre" in question.lower():
-                genre = question.split("genre ")[1].strip()
-                response = fetch_data_from_all_sources(genre)
-                print(response)
-                save_interaction(user_id, question, response)
-            else:
-                message = add_message_to_thread(thread.id, question)
-                if message:
-                    run = run_assistant(thread.id, assistant.id)
-                    if run:
-                        response = display_assistant_response(thread.id, run.id)
-                        if response:
-                            save_interaction(user_id, question, response)
-                        else:
-                            response = fetch_data_from_all_sources(question)
-                            print(response)
-                            save_interaction(user_id, question, response)
-                    else:
-                        logging.error("Failed to run assistant")
-                else:
-                    logging.error("Failed to add message to thread")
-        else:
-            logging.error("Failed to create thread")
+        ensure_indexes()
+        # Print the answer as it arrives instead of after the whole run
+        for delta in stream_answer(user_id, question):
+            print(delta, end="", flush=True)
+        print()
 
-        previous_interactions = get_previous_interactions(user_id)
-        recommendations = generate_recommendations(previous_interactions)
+        recommendations = get_recommendations(user_id)
         if recommendations:
             recommendations_str = ", ".join(recommendations)
             print(f"Recommendations based on your previous interactions: {recommendations_str}")
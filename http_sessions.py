@@ -0,0 +1,27 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Keep-alive connections per upstream host, shared by every thread in the process
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+# Upper bound for a single upstream HTTP call so a stuck provider cannot hold a worker forever
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Shared requests.Session for an upstream (e.g. "twitch", "igdb", "rawg"), created on first use
+def get_session(name: str) -> requests.Session:
+    session = _sessions.get(name)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(name)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _sessions[name] = session
+    return session
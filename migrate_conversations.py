@@ -0,0 +1,52 @@
+import os
+import logging
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+# One-off migration: move interactions embedded in userID.conversations into the
+# question collection and drop the embedded arrays. Safe to run more than once; keyword
+# counts for migrated users are rebuilt from the question collection by get_or_create_user.
+
+load_dotenv()
+
+mongo_uri = os.getenv("MONGODB_URI")
+
+if not mongo_uri:
+    raise ValueError("MONGODB_URI environment variable is missing")
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Upsert that inserts an embedded interaction only if the question collection does not have it yet.
+# Embedded copies were pushed after insert_one, so they normally carry the same _id.
+def interaction_upsert(user_id, interaction):
+    fields = dict(interaction, userId=user_id)
+    if "_id" in fields:
+        match = {"_id": fields.pop("_id")}
+    else:
+        match = {key: fields.pop(key, None) for key in ("userId", "question", "timestamp")}
+    return UpdateOne(match, {"$setOnInsert": fields}, upsert=True)
+
+def migrate(db, batch_size=500):
+    users = db["userID"]
+    questions = db["question"]
+    migrated_users = 0
+    inserted = 0
+
+    for user in users.find({"conversations": {"$exists": True}}, {"userId": 1, "conversations": 1}):
+        user_id = user["userId"]
+        conversations = user.get("conversations") or []
+
+        for start in range(0, len(conversations), batch_size):
+            operations = [interaction_upsert(user_id, interaction) for interaction in conversations[start:start + batch_size]]
+            result = questions.bulk_write(operations, ordered=False)
+            inserted += result.upserted_count
+
+        users.update_one({"_id": user["_id"]}, {"$unset": {"conversations": ""}})
+        migrated_users += 1
+        logging.info(f"Migrated {len(conversations)} interactions for user {user_id}")
+
+    logging.info(f"Migration finished: {migrated_users} users, {inserted} interactions inserted")
+
+if __name__ == "__main__":
+    client = MongoClient(mongo_uri)
+    migrate(client["Wingman"])
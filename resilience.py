@@ -0,0 +1,168 @@
+import datetime
+import email.utils
+import random
+import threading
+import time
+from typing import Optional
+
+# Client-side protection for upstream APIs: a token bucket that keeps requests under the
+# provider's rate limit, a circuit breaker that fails fast while a provider is down, and the
+# backoff schedule used between retries.
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+class RateLimitTimeout(RuntimeError):
+    pass
+
+class DeadlineExceeded(RuntimeError):
+    pass
+
+# Allows `rate` requests per second on average with bursts of up to `burst`. Callers reserve
+# a token and sleep until it is due, so concurrent callers are spaced out evenly.
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1.0, max_wait: float = 30.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = {"acquired": 0, "throttled": 0, "wait_seconds": 0.0, "timeouts": 0, "pauses": 0}
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Wait for a token; raises RateLimitTimeout instead of queueing for longer than max_wait,
+    # or than the caller's own max_wait when that is shorter
+    def acquire(self, max_wait: Optional[float] = None):
+        if self.rate <= 0:
+            return
+        limit = self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > limit:
+                self._counters["timeouts"] += 1
+                raise RateLimitTimeout(f"rate limit queue is {wait:.1f}s long")
+            self._tokens -= 1
+            self._counters["acquired"] += 1
+            if wait:
+                self._counters["throttled"] += 1
+                self._counters["wait_seconds"] += wait
+        if wait:
+            time.sleep(wait)
+
+    # Hold back new requests for `seconds`, e.g. after the provider answered 429 with Retry-After
+    def pause(self, seconds: float):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+            self._counters["pauses"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            stats = dict(self._counters)
+            stats.update(rate=self.rate, burst=self.burst, tokens=round(self._tokens, 3))
+        return stats
+
+# Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout`
+# seconds, then lets a single probe through (half-open); the probe's outcome closes or reopens it.
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    # Called with self._lock held
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    # Raise CircuitOpenError unless a call may go through now
+    def before_call(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self._counters["rejected"] += 1
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._counters["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    # End a call that neither succeeded nor failed, freeing the half-open probe slot
+    def release(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            stats = dict(self._counters)
+            stats.update(state=self.STATE_CODES[state], consecutive_failures=self._failures)
+        return stats
+
+# Seconds to wait according to a Retry-After header (delta seconds or an HTTP date), or None
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+# Delay before retry number `attempt` (0-based): full-jitter exponential backoff, or the
+# provider's Retry-After plus a little jitter so waiting clients do not return in lockstep
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    if retry_after is not None:
+        return min(cap, retry_after) + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
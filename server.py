@@ -0,0 +1,311 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import signal
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import game_assistant
+from game_api_helper import normalize_title, upstream_status
+from answer_cache import is_self_contained, question_key
+import telemetry
+
+# HTTP/JSON service mode: POST /ask with {"userId": ..., "question": ...} runs the same
+# routing as main() and returns {"response": ...}. Identical catalog questions in flight at the
+# same time are answered once and shared; every caller still gets its own saved interaction.
+# Assistant questions run on the asker's own thread, one at a time per user, since a thread
+# accepts no new message while a run is active.
+# POST /ask/stream takes the same body and streams the answer as server-sent events while it
+# is generated: {"delta": ...} events, then {"done": true} (or {"error": ...}).
+# GET /metrics returns a JSON snapshot, /metrics/prometheus the Prometheus text format and
+# /debug/slow the sampled slow requests. POST /cache/invalidate with {"game": ...} drops cached
+# assistant answers about that game. Requests carry the X-Request-ID header as their
+# correlation id (one is generated when it is missing) and it is echoed in the response.
+
+load_dotenv()
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+# Worker threads running the (blocking) answering pipeline
+SERVER_MAX_WORKERS = int(os.getenv("SERVER_MAX_WORKERS", "32"))
+# Seconds to wait for in-flight requests when shutting down
+SERVER_SHUTDOWN_GRACE = float(os.getenv("SERVER_SHUTDOWN_GRACE", "60"))
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class QuestionServer:
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, max_workers=SERVER_MAX_WORKERS):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="answer")
+        self.in_flight = {}
+        # userId -> [lock, number of requests holding or waiting for it]
+        self.user_locks = {}
+        self.active_requests = set()
+        self.connections = set()
+        self.shutting_down = False
+        self.metrics = {"requests": 0, "coalesced": 0, "errors": 0}
+        self._server = None
+        telemetry.registry.register_collector("server", self.metrics_snapshot)
+
+    def metrics_snapshot(self):
+        return dict(self.metrics, in_flight=len(self.in_flight), active=len(self.active_requests))
+
+    # Run blocking work in the pool, keeping the request's correlation id and trace
+    async def run_in_worker(self, function, *args):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, function, *args)
+
+    # Hold the user's turn for an assistant question; other routes never touch the thread
+    @contextlib.asynccontextmanager
+    async def user_turn(self, user_id, question):
+        if game_assistant.route_question(question)[0] != "assistant":
+            yield
+            return
+        entry = self.user_locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.user_locks[user_id]
+
+    # Answer a question, sharing the work with any identical question already in flight.
+    # Assistant answers come from the asker's thread, so they are only shared between first
+    # turns of self-contained questions, the same answers the answer cache would reuse.
+    async def coalesced_answer(self, user, question):
+        if game_assistant.route_question(question)[0] == "assistant":
+            if not (game_assistant.starts_new_thread(user) and is_self_contained(question)):
+                return await self.run_in_worker(game_assistant.generate_answer_with_source, user, question)
+            key = ("assistant", question_key(question))
+        else:
+            key = normalize_title(question)
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.metrics["coalesced"] += 1
+            response, source = await asyncio.shield(future)
+            # The answer was added to the first asker's thread, not this user's
+            return response, "answer_cache" if source == "assistant" else source
+
+        future = asyncio.ensure_future(self.run_in_worker(game_assistant.generate_answer_with_source, user, question))
+        self.in_flight[key] = future
+        future.add_done_callback(lambda done: self.in_flight.pop(key) if self.in_flight.get(key) is done else None)
+        return await asyncio.shield(future)
+
+    async def ask(self, payload, correlation_id=None):
+        user_id = payload.get("userId")
+        question = payload.get("question")
+        if not isinstance(user_id, str) or not isinstance(question, str) or not question.strip():
+            return 400, {"error": "userId and question are required"}
+
+        with telemetry.request_context("ask", correlation_id):
+            async with self.user_turn(user_id, question):
+                user = await self.run_in_worker(game_assistant.get_or_create_user, user_id)
+                response, source = await self.coalesced_answer(user, question)
+                await self.run_in_worker(game_assistant.save_interaction, user_id, question, response, source, user.get("threadTurns"))
+        return 200, {"response": response}
+
+    # Validated here so a bad request still gets a plain 400 before any event is sent
+    def ask_stream(self, payload, correlation_id=None):
+        user_id = payload.get("userId")
+        question = payload.get("question")
+        if not isinstance(user_id, str) or not isinstance(question, str) or not question.strip():
+            return 400, {"error": "userId and question are required"}
+        return 200, self.stream_answer(user_id, question, correlation_id)
+
+    async def stream_answer(self, user_id, question, correlation_id=None):
+        async with self.user_turn(user_id, question):
+            deltas = game_assistant.astream_answer(user_id, question, correlation_id, executor=self.executor)
+            try:
+                async for delta in deltas:
+                    yield delta
+            finally:
+                await deltas.aclose()
+
+    async def invalidate(self, payload):
+        game = payload.get("game")
+        if not isinstance(game, str) or not game.strip():
+            return 400, {"error": "game is required"}
+        return 200, {"invalidated": await self.run_in_worker(game_assistant.invalidate_cached_answers, game)}
+
+    async def dispatch(self, method, path, body, correlation_id=None):
+        if path == "/health":
+            return 200, {"status": "draining" if self.shutting_down else "ok"}
+        if path == "/metrics":
+            return 200, dict(self.metrics_snapshot(), upstreams=upstream_status(), telemetry=telemetry.registry.snapshot())
+        if path == "/metrics/prometheus":
+            return 200, telemetry.registry.render_prometheus()
+        if path == "/debug/slow":
+            return 200, {"slow_requests": telemetry.slow_requests()}
+        if path not in ("/ask", "/ask/stream", "/cache/invalidate"):
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        if self.shutting_down:
+            return 503, {"error": "server is shutting down"}
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "invalid JSON"}
+        if not isinstance(payload, dict):
+            return 400, {"error": "expected a JSON object"}
+        if path == "/cache/invalidate":
+            return await self.invalidate(payload)
+        if path == "/ask/stream":
+            return self.ask_stream(payload, correlation_id)
+        return await self.ask(payload, correlation_id)
+
+    # Minimal HTTP/1.1 handling with keep-alive: one JSON request and response at a time per connection
+    async def handle_connection(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self.write_response(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", "0") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.write_response(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self.write_response(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+                correlation_id = headers.get("x-request-id", "")[:64] or uuid.uuid4().hex[:16]
+
+                task = asyncio.current_task()
+                self.active_requests.add(task)
+                self.metrics["requests"] += 1
+                try:
+                    try:
+                        status, result = await self.dispatch(method.upper(), path.split("?", 1)[0], body, correlation_id)
+                    except Exception as e:
+                        logging.error(f"Error handling {method} {path} (cid={correlation_id}): {e}")
+                        self.metrics["errors"] += 1
+                        status, result = 500, {"error": "internal error"}
+                    # A streamed answer is produced while it is written, so it counts as in flight until sent
+                    await self.write_response(writer, status, result, keep_alive and not self.shutting_down, correlation_id)
+                finally:
+                    self.active_requests.discard(task)
+                if not keep_alive or self.shutting_down:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    # Text results are sent as-is (the Prometheus exposition format), async iterators as a
+    # stream of events, anything else as JSON
+    async def write_response(self, writer, status, result, keep_alive=True, correlation_id=None):
+        if hasattr(result, "__aiter__"):
+            return await self.write_stream(writer, result, keep_alive, correlation_id)
+        if isinstance(result, str):
+            body, content_type = result.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(result, default=str).encode("utf-8"), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            + (f"X-Request-ID: {correlation_id}\r\n" if correlation_id else "")
+            + f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    # Server-sent events in chunked encoding, one event per delta as soon as it is produced.
+    # If the client disconnects the iterator is closed, which saves the partial answer.
+    async def write_stream(self, writer, deltas, keep_alive=True, correlation_id=None):
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/event-stream\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            + (f"X-Request-ID: {correlation_id}\r\n" if correlation_id else "")
+            + f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1"))
+
+        async def send(event):
+            chunk = f"data: {json.dumps(event)}\n\n".encode("utf-8")
+            writer.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            await writer.drain()
+
+        try:
+            async for delta in deltas:
+                await send({"delta": delta})
+            await send({"done": True})
+        except ConnectionError:
+            raise
+        except Exception as e:
+            logging.error(f"Error streaming answer (cid={correlation_id}): {e}")
+            self.metrics["errors"] += 1
+            await send({"error": "internal error"})
+        finally:
+            await deltas.aclose()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def serve(self):
+        game_assistant.check_environment()
+        await self.run_in_worker(game_assistant.ensure_indexes)
+
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        logging.info(f"Serving on http://{self.host}:{self.port}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # Windows
+                pass
+
+        async with self._server:
+            await stop.wait()
+            await self.shutdown()
+
+    # Stop accepting connections, let in-flight requests finish, then flush pending writes
+    async def shutdown(self):
+        self.shutting_down = True
+        self._server.close()
+        if self.active_requests:
+            logging.info(f"Draining {len(self.active_requests)} in-flight requests")
+            _, pending = await asyncio.wait(set(self.active_requests), timeout=SERVER_SHUTDOWN_GRACE)
+            if pending:
+                logging.warning(f"{len(pending)} requests did not finish within {SERVER_SHUTDOWN_GRACE}s")
+        # Idle keep-alive connections would otherwise hold the server open
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown, True)
+        if game_assistant.interaction_queue is not None:
+            game_assistant.interaction_queue.close()
+        logging.info("Server stopped")
+
+if __name__ == "__main__":
+    asyncio.run(QuestionServer().serve())
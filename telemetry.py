@@ -0,0 +1,265 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+# Timing spans around each stage of answering a question, aggregated into counters and latency
+# histograms that render in the Prometheus text format. Every request gets a correlation id
+# that follows it into worker threads (see submit), and slow requests are sampled with their
+# per-stage breakdown.
+
+# "timing" logs one structured line per request with the time spent in each stage,
+# "full" keeps logging the full thread, message and run objects, "off" logs neither
+LOG_MODE = os.getenv("TELEMETRY_LOG_MODE", "timing").lower()
+FULL_OBJECT_LOGS = LOG_MODE == "full"
+
+# Requests slower than this (seconds) are logged with their stage breakdown, at the given sample rate
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1.0"))
+SLOW_REQUEST_HISTORY = int(os.getenv("SLOW_REQUEST_HISTORY", "50"))
+
+METRIC_PREFIX = "wingman"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_correlation_id = contextvars.ContextVar("correlation_id", default=None)
+_trace = contextvars.ContextVar("trace", default=None)
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+# Counters and histograms keyed by metric name and labels, plus collectors that report
+# the current state of other components (caches, queues, the server) when rendered
+class MetricsRegistry:
+    def __init__(self):
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[tuple, _Histogram] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, metric: str, amount: float = 1, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, metric: str, value: float, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    # collector() returns a flat dict of numbers, exported as gauges named <prefix>_<key>
+    def register_collector(self, prefix: str, collector: Callable[[], dict]):
+        with self._lock:
+            self._collectors[prefix] = collector
+
+    # Counters, histogram summaries and collector values as plain data
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {_series_name(name, labels): value for (name, labels), value in self._counters.items()}
+            histograms = {
+                _series_name(name, labels): {"count": histogram.count, "sum": round(histogram.sum, 6)}
+                for (name, labels), histogram in self._histograms.items()
+            }
+            collectors = dict(self._collectors)
+        return {"counters": counters, "histograms": histograms, "collectors": _collect(collectors)}
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, (list(histogram.counts), histogram.sum, histogram.count)) for key, histogram in self._histograms.items()),
+                key=lambda item: item[0]
+            )
+            collectors = dict(self._collectors)
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            metric = f"{METRIC_PREFIX}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+
+        for prefix, values in sorted(_collect(collectors).items()):
+            for key, value in sorted(values.items()):
+                metric = f"{METRIC_PREFIX}_{prefix}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+def _collect(collectors: Dict[str, Callable[[], dict]]) -> Dict[str, dict]:
+    results = {}
+    for prefix, collector in collectors.items():
+        try:
+            results[prefix] = {
+                key: float(value) for key, value in collector().items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)
+            }
+        except Exception as e:
+            logging.error(f"Metrics collector {prefix} failed: {e}")
+    return results
+
+def _series_name(name: str, labels: tuple) -> str:
+    return f"{name}{_labels(labels)}"
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+registry = MetricsRegistry()
+
+# Extra span sinks, called as sink(stage, seconds, error, correlation_id) for every finished span
+_sinks: List[Callable[[str, float, bool, Optional[str]], None]] = []
+_slow_requests = deque(maxlen=SLOW_REQUEST_HISTORY)
+
+def add_sink(sink: Callable[[str, float, bool, Optional[str]], None]):
+    _sinks.append(sink)
+
+def get_correlation_id() -> Optional[str]:
+    return _correlation_id.get()
+
+def _record(stage: str, seconds: float, error: bool):
+    registry.observe("stage_duration_seconds", seconds, stage=stage)
+    if error:
+        registry.inc("stage_errors_total", stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((stage, seconds, error))
+    for sink in _sinks:
+        try:
+            sink(stage, seconds, error, _correlation_id.get())
+        except Exception as e:
+            logging.error(f"Telemetry sink failed: {e}")
+
+# Time a block as one stage: with span("igdb.request"): ...
+class span:
+    __slots__ = ("stage", "_start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _record(self.stage, time.perf_counter() - self._start, exc_type is not None)
+        return False
+
+# Decorator form of span for a whole function
+def traced(stage: str):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Scope of one request: assigns the correlation id and collects the stage timings that are
+# logged and sampled when it ends. Nested inside another request it acts as a plain span.
+class request_context:
+    def __init__(self, name: str = "request", correlation_id: Optional[str] = None):
+        self.name = name
+        self.correlation_id = correlation_id
+        self._nested = False
+        self._tokens = None
+        self._trace = None
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if _trace.get() is not None:
+            self._nested = True
+            return self
+        self.correlation_id = self.correlation_id or uuid.uuid4().hex[:16]
+        self._trace = []
+        self._tokens = (_correlation_id.set(self.correlation_id), _trace.set(self._trace))
+        return self
+
+    # Total seconds per stage recorded so far in this request
+    def stage_seconds(self) -> Dict[str, float]:
+        totals = {}
+        for stage, seconds, _ in self._trace or []:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self._start
+        if self._nested:
+            _record(self.name, seconds, exc_type is not None)
+            return False
+        _correlation_id.reset(self._tokens[0])
+        _trace.reset(self._tokens[1])
+
+        registry.inc("requests_total", request=self.name)
+        registry.observe("request_duration_seconds", seconds, request=self.name)
+        if exc_type is not None:
+            registry.inc("request_errors_total", request=self.name)
+        self._report(seconds, exc_type is not None)
+        return False
+
+    def _report(self, seconds: float, error: bool):
+        if LOG_MODE == "timing":
+            stages = " ".join(f"{stage}={elapsed * 1000:.1f}ms" for stage, elapsed, _ in self._trace)
+            logging.info(f"timing request={self.name} cid={self.correlation_id} total={seconds * 1000:.1f}ms error={error} {stages}")
+        if seconds >= SLOW_REQUEST_SECONDS and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+            registry.inc("slow_requests_total", request=self.name)
+            record = {
+                "name": self.name,
+                "correlation_id": self.correlation_id,
+                "seconds": round(seconds, 6),
+                "error": error,
+                "stages": [{"stage": stage, "seconds": round(elapsed, 6), "error": failed} for stage, elapsed, failed in self._trace],
+            }
+            _slow_requests.append(record)
+            logging.warning(f"Slow request cid={self.correlation_id} took {seconds:.2f}s: {record['stages']}")
+
+# Most recent sampled slow requests, oldest first
+def slow_requests() -> List[dict]:
+    return list(_slow_requests)
+
+# Submit work to an executor so it runs with the caller's correlation id and trace
+def submit(executor, function, *args, **kwargs):
+    return executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
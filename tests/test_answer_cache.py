@@ -0,0 +1,69 @@
+import time
+import game_assistant
+from answer_cache import AnswerCache, is_self_contained
+
+QUESTION = "How do I beat Malenia in Elden Ring?"
+
+def test_exact_and_rephrased_questions_hit():
+    cache = AnswerCache(threshold=0.6)
+    cache.put(QUESTION, "Dodge her waterfowl dance.")
+    assert cache.lookup("how do i beat malenia in elden ring") == ("Dodge her waterfowl dance.", 1.0)
+    answer, score = cache.lookup("How can I beat Malenia in Elden Ring?")
+    assert answer == "Dodge her waterfowl dance."
+    assert 0.6 <= score < 1.0
+
+def test_threshold_rejects_unrelated_questions():
+    cache = AnswerCache(threshold=0.9)
+    cache.put(QUESTION, "Dodge her waterfowl dance.")
+    assert cache.lookup("Best starting class for Dark Souls") is None
+    strict = AnswerCache(threshold=1.01)
+    strict.put(QUESTION, "Dodge her waterfowl dance.")
+    assert strict.lookup("How can I beat Malenia in Elden Ring?") is None
+
+def test_entries_expire_after_ttl():
+    cache = AnswerCache(ttl=60)
+    cache.put(QUESTION, "old answer", stored_at=time.time() - 61)
+    assert cache.lookup(QUESTION) is None
+    cache.put(QUESTION, "new answer")
+    assert cache.lookup(QUESTION)[0] == "new answer"
+    assert cache.warm([("Best Zelda dungeon order", "stale", time.time() - 120)]) == 0
+
+def test_invalidation_by_game_and_question():
+    cache = AnswerCache()
+    cache.put(QUESTION, "Dodge her waterfowl dance.")
+    cache.put("Where is the Master Sword in Zelda Breath of the Wild?", "Korok Forest.")
+    assert cache.invalidate_game("Elden Ring") == 1
+    assert cache.lookup(QUESTION) is None
+    assert cache.lookup("Where is the Master Sword in Zelda Breath of the Wild?") is not None
+    assert cache.invalidate_question("where is the master sword in zelda breath of the wild")
+    assert cache.stats()["size"] == 0
+
+def test_questions_that_depend_on_the_conversation_are_not_cached():
+    cache = AnswerCache(threshold=0.5)
+    cache.put("Can you tell me more?", "More about the game you asked about.")
+    assert cache.lookup("Tell me more!") is None
+    assert cache.lookup("Can you tell me more?") is None
+    assert cache.stats()["size"] == 0
+    assert not is_self_contained("Is it any good?")
+    assert not is_self_contained("What about that one")
+    assert not is_self_contained("Thanks!")
+    assert is_self_contained(QUESTION)
+
+def test_only_first_turn_answers_are_stored(monkeypatch):
+    cache = AnswerCache()
+    monkeypatch.setattr(game_assistant, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(game_assistant, "get_answer_cache", lambda: cache)
+    game_assistant.store_cached_answer({"userId": "u1", "threadTurns": 3}, QUESTION, "tailored to u1's thread")
+    assert cache.lookup(QUESTION) is None
+    game_assistant.store_cached_answer({"userId": "u2", "threadTurns": 1}, QUESTION, "fresh thread answer")
+    assert cache.lookup(QUESTION)[0] == "fresh thread answer"
+
+def test_questions_about_a_different_game_do_not_match():
+    cache = AnswerCache(threshold=0.5)
+    cache.put("What is the fastest speedrun time for Sonic the Hedgehog?", "About 20 minutes.")
+    cache.put("Where are all the stars in Super Mario 64?", "Spread across 15 courses.")
+    assert cache.lookup("What is the fastest speedrun time for Sonic the Hedgehog 2?") is None
+    assert cache.lookup("Where are all the stars in Super Mario 64 DS?") is None
+    assert cache.lookup("Where are all the stars in Super Mario Sunshine?") is None
+    assert cache.lookup("Fastest speedrun time for Sonic the Hedgehog")[0] == "About 20 minutes."
+    assert cache.stats()["similar_hits"] == 1
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+import pytest
+import cache_helper
+from cache_helper import TieredCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    clock.time = lambda: clock.now
+    monkeypatch.setattr(cache_helper, "time", clock)
+    return clock
+
+def loader(values, calls):
+    def load():
+        calls.append(1)
+        value = values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return load
+
+def finish_refreshes(cache):
+    cache._refresh_executor.shutdown(wait=True)
+
+def test_stale_entries_are_served_while_a_refresh_runs(clock):
+    cache = TieredCache(ttls={"igdb": 60}, stale_ttl=30)
+    calls = []
+    load = loader(["v1", "v2"], calls)
+    assert cache.get_or_load("igdb", "zelda", load) == "v1"
+    clock.now += 60
+    assert cache.get_or_load("igdb", "zelda", load) == "v1"
+    finish_refreshes(cache)
+    assert cache.get_or_load("igdb", "zelda", load) == "v2"
+    assert len(calls) == 2
+    assert cache.stats()["stale_hits"] == 1 and cache.stats()["refreshes"] == 1
+
+def test_entries_past_the_stale_window_are_reloaded(clock):
+    cache = TieredCache(ttls={"igdb": 60}, stale_ttl=30)
+    calls = []
+    load = loader(["v1", "v2"], calls)
+    cache.get_or_load("igdb", "zelda", load)
+    clock.now += 90
+    assert cache.get_or_load("igdb", "zelda", load) == "v2"
+    assert cache.stats()["stale_hits"] == 0
+
+def test_not_found_is_cached_for_the_negative_ttl(clock):
+    cache = TieredCache(ttls={"igdb": 3600}, negative_ttl=10, stale_ttl=0)
+    calls = []
+    load = loader([None, "found"], calls)
+    assert cache.get_or_load("igdb", "unreleased", load) is None
+    clock.now += 9
+    assert cache.get_or_load("igdb", "unreleased", load) is None
+    clock.now += 1
+    assert cache.get_or_load("igdb", "unreleased", load) == "found"
+    assert len(calls) == 2
+    assert cache.stats()["negative_hits"] == 1
+
+def test_load_errors_are_not_cached_and_expired_values_cover_them(clock):
+    strict = TieredCache(default_ttl=60, stale_ttl=0)
+    calls = []
+    load = loader([RuntimeError("down"), "v1"], calls)
+    with pytest.raises(RuntimeError):
+        strict.get_or_load("rawg", "zelda", load)
+    assert strict.get_or_load("rawg", "zelda", load) == "v1"
+
+    lenient = TieredCache(default_ttl=60, stale_ttl=0, serve_expired_on_error=True)
+    load = loader(["v1", RuntimeError("down"), "v2"], calls)
+    lenient.get_or_load("rawg", "zelda", load)
+    clock.now += 61
+    assert lenient.get_or_load("rawg", "zelda", load) == "v1"
+    assert lenient.get_or_load("rawg", "zelda", load) == "v2"
+    assert lenient.stats()["error_fallbacks"] == 1
+
+def test_sqlite_tier_survives_a_restart(clock, tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = TieredCache(default_ttl=60, stale_ttl=30, db_path=db_path)
+    cache.get_or_load("igdb", "zelda", lambda: {"name": "Zelda"})
+
+    restarted = TieredCache(default_ttl=60, stale_ttl=30, db_path=db_path)
+    assert restarted.get_or_load("igdb", "zelda", lambda: pytest.fail("loaded despite the disk entry")) == {"name": "Zelda"}
+    assert restarted.stats()["disk_hits"] == 1
+
+    # Entries past their stale window are not read back from disk
+    clock.now += 90
+    assert TieredCache(default_ttl=60, stale_ttl=30, db_path=db_path).get_or_load("igdb", "zelda", lambda: "reloaded") == "reloaded"
+
+def test_batch_loads_treat_omitted_keys_as_failures(clock):
+    cache = TieredCache(default_ttl=60, stale_ttl=0, serve_expired_on_error=True)
+    batches = []
+    def load_many(keys):
+        batches.append(keys)
+        return {key: key.upper() for key in keys if key != "b"}
+
+    assert cache.get_many_or_load("igdb", ["a", "b", "c"], load_many) == {"a": "A", "c": "C"}
+    assert cache.get_many_or_load("igdb", ["a", "b", "c"], load_many) == {"a": "A", "c": "C"}
+    assert batches == [["a", "b", "c"], ["b"]]
+
+    clock.now += 61
+    assert cache.get_many_or_load("igdb", ["a"], lambda keys: {}) == {"a": "A"}
+    assert cache.stats()["error_fallbacks"] == 1
@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+from catalog_index import CatalogIndex, FacetIndex
+from csv_helper import CATALOG_DTYPES
+
+GAMES = [
+    ("Super Mario Bros.", 1985, "NES", "Platform", "Nintendo"),
+    ("Super Metroid", 1994, "SNES", "Action-Adventure", "Nintendo"),
+    ("Chrono Trigger", 1995, "SNES", "Role-Playing", "Square"),
+    ("Final Fantasy VII", 1997, "PS", "Role-Playing", "Square"),
+    ("Crisis Core", 2007, "PSP", "Action RPG", "Square Enix"),
+    ("Kingdom Hearts", 2002, "PS2", "Action RPG", "Square"),
+    ("Persona 5", 2016, "PS4", "RPG", "Atlus"),
+    ("Celeste", 2018, "PC", "Platform", "Matt Makes Games"),
+    ("RPG Maker", 2000, "PC", "RPGMaker", "Enterbrain"),
+]
+
+@pytest.fixture(scope="module")
+def facets():
+    df = pd.DataFrame(GAMES, columns=list(CATALOG_DTYPES)).astype(CATALOG_DTYPES)
+    return FacetIndex(df)
+
+def titles(facets, **query):
+    _, rows = facets.query(**query)
+    return [GAMES[row][0] for row in rows]
+
+def test_console_and_publisher_match_exactly(facets):
+    assert titles(facets, console="NES") == ["Super Mario Bros."]
+    assert titles(facets, console="snes") == ["Super Metroid", "Chrono Trigger"]
+    assert titles(facets, console="PS") == ["Final Fantasy VII"]
+    assert titles(facets, publisher="Square") == ["Chrono Trigger", "Final Fantasy VII", "Kingdom Hearts"]
+    assert titles(facets, publisher="Squ") == []
+
+def test_genre_matches_whole_words(facets):
+    assert titles(facets, genre="rpg") == ["Crisis Core", "Kingdom Hearts", "Persona 5"]
+    assert titles(facets, genre="role playing") == ["Chrono Trigger", "Final Fantasy VII"]
+    assert titles(facets, genre="action") == ["Super Metroid", "Crisis Core", "Kingdom Hearts"]
+    assert titles(facets, genre="plat") == []
+
+def test_combined_facets_intersect(facets):
+    assert titles(facets, genre="role-playing", console="SNES") == ["Chrono Trigger"]
+    assert titles(facets, genre="rpg", publisher="Square") == ["Kingdom Hearts"]
+    assert titles(facets, genre="platform", console="PC", publisher="Nintendo") == []
+
+def test_year_ranges_are_inclusive(facets):
+    assert titles(facets, year_from=1994, year_to=1997) == ["Super Metroid", "Chrono Trigger", "Final Fantasy VII"]
+    assert titles(facets, year_from=2016) == ["Persona 5", "Celeste"]
+    assert titles(facets, year_to=1985) == ["Super Mario Bros."]
+    assert titles(facets, genre="platform", year_from=2000) == ["Celeste"]
+
+def test_pagination_reports_the_total(facets):
+    total, first = facets.query(genre="rpg", offset=0, limit=2)
+    _, second = facets.query(genre="rpg", offset=2, limit=2)
+    assert total == 3
+    assert [GAMES[row][0] for row in first] == ["Crisis Core", "Kingdom Hearts"]
+    assert [GAMES[row][0] for row in second] == ["Persona 5"]
+    total, past_end = facets.query(offset=100, limit=10)
+    assert total == len(GAMES)
+    assert len(past_end) == 0
+
+@pytest.fixture(scope="module")
+def title_index():
+    return CatalogIndex(pd.DataFrame({"title": ["Super Mario 64", "Mega Man X", "Xenoblade Chronicles", "Final Fantasy X-2", "Celeste", None]}))
+
+def test_short_queries_match_anywhere_in_the_title(title_index):
+    assert title_index.contains("64") == [0]
+    assert title_index.contains("x") == [1, 2, 3]
+    assert title_index.contains("X") == [1, 2, 3]
+    assert title_index.contains("-2") == [3]
+
+def test_short_queries_are_answered_from_postings(title_index):
+    for title in filter(None, title_index.titles):
+        for size in (1, 2):
+            for start in range(len(title) - size + 1):
+                query = title[start:start + size]
+                if query != query.strip():
+                    continue
+                assert title_index.contains(query) == [row_id for row_id, other in enumerate(title_index.titles) if query in other]
+    assert title_index.contains("q") == []
+
+def test_longer_queries_use_the_ngram_index(title_index):
+    assert title_index.contains("mario") == [0]
+    assert title_index.contains("man x") == [1]
+    assert title_index.contains("chronicles") == [2]
+    assert title_index.contains("zelda") == []
+
+def test_search_ranks_earliest_match_first(title_index):
+    assert title_index.search("x", 2) == [2, 1]
+    assert title_index.search("celeste", 1) == [4]
+    assert title_index.search("super mario 64") == [0]
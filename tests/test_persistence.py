@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from pymongo.errors import DuplicateKeyError
+import game_assistant
+from benchmarks.memory_mongo import MemoryDatabase
+
+@pytest.fixture
+def database():
+    database = MemoryDatabase()
+    game_assistant.set_database(database)
+    yield database
+    game_assistant.set_database(None)
+
+def keyword_counts(user_id):
+    return game_assistant.get_user_collection().find_one({"userId": user_id})["keywordCounts"]
+
+def test_replayed_interactions_are_counted_once(database):
+    interaction = game_assistant.build_interaction("u1", "Recommend a platformer", "Try Celeste.")
+    game_assistant.persist_interactions([dict(interaction)])
+    game_assistant.persist_interactions([dict(interaction)])
+    assert game_assistant.get_questions_collection().count_documents({"userId": "u1"}) == 1
+    assert keyword_counts("u1") == {"platformer": 1}
+
+def test_partially_replayed_batch_counts_only_new_interactions(database):
+    stored = game_assistant.build_interaction("u1", "Recommend a platformer", "Try Celeste.")
+    game_assistant.persist_interactions([dict(stored)])
+    new = game_assistant.build_interaction("u1", "Any good platformer or puzzle games?", "Try Fez.")
+    game_assistant.persist_interactions([dict(stored), dict(new)])
+    assert game_assistant.get_questions_collection().count_documents({"userId": "u1"}) == 2
+    assert keyword_counts("u1") == {"platformer": 2, "puzzle": 1}
+
+def test_concurrent_first_requests_create_one_user():
+    database = MemoryDatabase(latency=0.05)
+    game_assistant.set_database(database)
+    try:
+        game_assistant.ensure_indexes()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            users = list(executor.map(game_assistant.get_or_create_user, ["u1"] * 4))
+        assert game_assistant.get_user_collection().count_documents({"userId": "u1"}) == 1
+        assert all(user["userId"] == "u1" and user["keywordCounts"] == {} for user in users)
+    finally:
+        game_assistant.set_database(None)
+
+def test_unique_user_index_rejects_duplicates(database):
+    game_assistant.ensure_indexes()
+    game_assistant.get_user_collection().insert_one({"userId": "u1"})
+    with pytest.raises(DuplicateKeyError):
+        game_assistant.get_user_collection().insert_one({"userId": "u1"})
+
+def test_batch_retried_after_failed_user_update_is_counted_once(database, monkeypatch):
+    interactions = [
+        game_assistant.build_interaction("u1", "Recommend a platformer", "Try Celeste."),
+        game_assistant.build_interaction("u1", "Any good puzzle games?", "Try Baba Is You."),
+    ]
+    users = game_assistant.get_user_collection()
+    bulk_write = users.bulk_write
+    def failing_bulk_write(operations, ordered=True):
+        raise ConnectionError("connection reset")
+    monkeypatch.setattr(users, "bulk_write", failing_bulk_write)
+    with pytest.raises(ConnectionError):
+        game_assistant.persist_interactions([dict(interaction) for interaction in interactions])
+
+    monkeypatch.setattr(users, "bulk_write", bulk_write)
+    game_assistant.persist_interactions([dict(interaction) for interaction in interactions])
+    game_assistant.persist_interactions([dict(interaction) for interaction in interactions])
+    assert keyword_counts("u1") == {"platformer": 1, "puzzle": 1}
+    assert game_assistant.get_questions_collection().count_documents({"countPending": True}) == 0
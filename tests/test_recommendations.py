@@ -0,0 +1,44 @@
+import re
+import pytest
+import game_assistant
+
+# The matching done before keywords were compiled into one pattern: one re.search per keyword
+def baseline_keywords(text):
+    return {keyword for keyword in game_assistant.RECOMMENDATION_KEYWORDS if re.search(keyword, text, re.IGNORECASE)}
+
+PHRASES = [
+    "What are the best RPGs of 2023?",
+    "I love platformers",
+    "any good roguelikes?",
+    "Is there a good MMORPG for beginners",
+    "recommend me a JRPG",
+    "I like action RPG and puzzle-platformer games",
+    "Looking for Metroidvanias and survival horror",
+    "massively multiplayer online role-playing game suggestions",
+    "esports and racing games",
+    "How do I get better at fighting games?",
+    "Kart racing with friends",
+    "role-playing game creation system",
+    "nothing relevant here",
+]
+
+@pytest.mark.parametrize("phrase", PHRASES)
+def test_matches_the_same_keywords_as_the_per_keyword_search(phrase):
+    assert set(game_assistant.match_keywords(phrase)) == baseline_keywords(phrase)
+
+def test_plural_and_compound_forms_are_counted():
+    assert game_assistant.match_keywords("I love platformers") == {"platformer": 1}
+    assert game_assistant.match_keywords("Is there a good MMORPG") == {"mmo": 1, "rpg": 1}
+    assert game_assistant.match_keywords("action RPG") == {"action rpg": 1, "rpg": game_assistant.IMPLIED_KEYWORD_WEIGHT}
+
+def test_overlapping_keywords_are_both_counted():
+    counts = game_assistant.match_keywords("Any role-playing game creation system?")
+    assert counts["role-playing game"] == 1
+    assert counts["game creation system"] == 1
+
+def test_recommendations_from_plural_questions():
+    interactions = [{"question": "What are the best RPGs?"}, {"question": "any good roguelikes?"}, {"question": "more roguelikes please"}]
+    assert game_assistant.generate_recommendations(interactions)[:2] == [
+        game_assistant.RECOMMENDATION_KEYWORDS["roguelike"],
+        game_assistant.RECOMMENDATION_KEYWORDS["rpg"],
+    ]
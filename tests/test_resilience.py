@@ -0,0 +1,153 @@
+import datetime
+import email.utils
+from types import SimpleNamespace
+import pytest
+import requests
+import game_api_helper
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, RateLimitTimeout, TokenBucket, backoff_delay, parse_retry_after
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience, "time", clock)
+    monkeypatch.setattr(game_api_helper, "time", clock)
+    return clock
+
+def test_token_bucket_spaces_requests_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.sleeps == [0.5, 0.5, 0.5]
+    assert bucket.stats()["throttled"] == 3
+
+def test_token_bucket_refuses_to_queue_past_max_wait(clock):
+    bucket = TokenBucket(rate=1, burst=1, max_wait=2)
+    clock.sleep = clock.sleeps.append  # concurrent callers reserve tokens without time passing
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == [1.0, 2.0]
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire()
+    with pytest.raises(RateLimitTimeout):
+        TokenBucket(rate=1, burst=1, max_wait=30).acquire(max_wait=-1)
+    assert bucket.stats()["timeouts"] == 1
+
+def test_pause_holds_back_the_next_request(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    bucket.pause(3)
+    bucket.acquire()
+    assert clock.sleeps == [3.0]
+    assert bucket.stats()["pauses"] == 1
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=60)
+    assert 55 <= parse_retry_after(email.utils.format_datetime(retry_at, usegmt=True)) <= 60
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+def test_backoff_delay_honours_retry_after_and_cap():
+    assert 0 <= backoff_delay(10, 0.25, 4) <= 4
+    assert 7 <= backoff_delay(0, 0.25, 10, retry_after=7) <= 7.25
+    assert 10 <= backoff_delay(0, 0.25, 10, retry_after=60) <= 10.25
+
+def test_circuit_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker("igdb", failure_threshold=2, reset_timeout=10)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    # Only one probe at a time while half-open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["opened"] == 2
+
+def test_probe_slot_is_released_when_the_probe_hits_the_rate_limit(clock, monkeypatch):
+    breaker = CircuitBreaker("igdb", failure_threshold=1, reset_timeout=10)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 10
+    monkeypatch.setitem(game_api_helper.circuit_breakers, "igdb", breaker)
+    monkeypatch.setitem(game_api_helper.rate_limiters, "igdb", TokenBucket(rate=1, burst=1, max_wait=0))
+    game_api_helper.rate_limiters["igdb"].pause(5)
+
+    with pytest.raises(RateLimitTimeout):
+        game_api_helper._send("igdb", "igdb.request", lambda: pytest.fail("request sent past the limiter"))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+
+def response(status_code, headers=None):
+    return SimpleNamespace(status_code=status_code, text="", headers=headers or {})
+
+@pytest.fixture
+def upstream(clock, monkeypatch):
+    monkeypatch.setitem(game_api_helper.circuit_breakers, "rawg", CircuitBreaker("rawg", failure_threshold=5, reset_timeout=30))
+    monkeypatch.setitem(game_api_helper.rate_limiters, "rawg", TokenBucket(rate=100, burst=100))
+    monkeypatch.setattr(game_api_helper, "UPSTREAM_MAX_RETRIES", 3)
+
+    def send_sequence(*outcomes):
+        outcomes = list(outcomes)
+        attempts = []
+        def send():
+            attempts.append(clock.now)
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return send, attempts
+    return send_sequence
+
+def test_send_waits_out_retry_after_on_429(upstream, clock):
+    send, attempts = upstream(response(429, {"Retry-After": "2"}), response(200))
+    assert game_api_helper._send("rawg", "rawg.request", send).status_code == 200
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 2
+    assert game_api_helper.rate_limiters["rawg"].stats()["pauses"] == 1
+    assert game_api_helper.circuit_breakers["rawg"].stats()["successes"] == 1
+
+def test_send_retries_server_errors_and_connection_errors(upstream):
+    send, attempts = upstream(response(503), requests.ConnectionError("reset"), response(502), response(200))
+    assert game_api_helper._send("rawg", "rawg.request", send).status_code == 200
+    assert len(attempts) == 4
+
+def test_send_gives_up_after_the_last_retry(upstream):
+    send, attempts = upstream(*[requests.Timeout("read timed out")] * 4)
+    with pytest.raises(RuntimeError, match="after 4 attempts: Timeout"):
+        game_api_helper._send("rawg", "rawg.request", send)
+    assert len(attempts) == 4
+    assert game_api_helper.circuit_breakers["rawg"].stats()["consecutive_failures"] == 1
+
+def test_send_returns_client_errors_without_retrying(upstream):
+    send, attempts = upstream(response(404))
+    assert game_api_helper._send("rawg", "rawg.request", send).status_code == 404
+    assert len(attempts) == 1
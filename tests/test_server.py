@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+import pytest
+import game_assistant
+import server
+
+@pytest.fixture
+def answers(monkeypatch):
+    calls = []
+    active = {}
+    peak = {}
+    lock = threading.Lock()
+
+    def generate(user, question):
+        user_id = user["userId"]
+        with lock:
+            calls.append((user_id, question))
+            active[user_id] = active.get(user_id, 0) + 1
+            peak[user_id] = max(peak.get(user_id, 0), active[user_id])
+        time.sleep(0.2)
+        with lock:
+            active[user_id] -= 1
+        return f"answer for {user_id}", "assistant"
+
+    # Users in the middle of a conversation unless a test says otherwise
+    monkeypatch.setattr(game_assistant, "get_or_create_user", lambda user_id: {"userId": user_id, "threadId": f"thread_{user_id}", "threadTurns": 3})
+    monkeypatch.setattr(game_assistant, "generate_answer_with_source", generate)
+    monkeypatch.setattr(game_assistant, "save_interaction", lambda *args: None)
+    return calls, peak
+
+def ask_all(requests):
+    async def run():
+        question_server = server.QuestionServer(max_workers=8)
+        try:
+            return await asyncio.gather(*(question_server.ask({"userId": user_id, "question": question}) for user_id, question in requests))
+        finally:
+            question_server.executor.shutdown()
+    return asyncio.run(run())
+
+def test_assistant_questions_run_one_at_a_time_per_user(answers):
+    calls, peak = answers
+    ask_all([("u1", "How do I parry in Sekiro?"), ("u1", "Best early weapon in Elden Ring?"), ("u2", "How do I parry in Sekiro?")])
+    assert len(calls) == 3
+    assert peak == {"u1": 1, "u2": 1}
+
+def test_assistant_answers_are_not_shared_across_users(answers):
+    calls, _ = answers
+    results = ask_all([("u1", "How do I parry in Sekiro?"), ("u2", "How do I parry in Sekiro?")])
+    assert sorted(user_id for user_id, _ in calls) == ["u1", "u2"]
+    assert [result[1]["response"] for result in results] == ["answer for u1", "answer for u2"]
+
+def test_first_turn_self_contained_questions_are_shared(answers, monkeypatch):
+    calls, _ = answers
+    saved = []
+    monkeypatch.setattr(game_assistant, "get_or_create_user", lambda user_id: {"userId": user_id})
+    monkeypatch.setattr(game_assistant, "save_interaction", lambda user_id, question, response, source, turn: saved.append((user_id, source)))
+    results = ask_all([("u1", "How do I parry in Sekiro?"), ("u2", "How do I parry in Sekiro?"), ("u3", "Is it any good?"), ("u4", "Is it any good?")])
+    assert sorted(user_id for user_id, _ in calls) == ["u1", "u3", "u4"]
+    assert results[1][1]["response"] == "answer for u1"
+    assert sorted(saved) == [("u1", "assistant"), ("u2", "answer_cache"), ("u3", "assistant"), ("u4", "assistant")]
+
+def test_identical_catalog_questions_are_coalesced(answers):
+    calls, _ = answers
+    results = ask_all([("u1", "Show me genre platformer"), ("u2", "Show me genre platformer")])
+    assert len(calls) == 1
+    assert [status for status, _ in results] == [200, 200]
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_invalid_content_length_is_rejected(length):
+    async def run():
+        question_server = server.QuestionServer()
+        listener = await asyncio.start_server(question_server.handle_connection, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST /ask HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        status_line = await reader.readline()
+        writer.close()
+        listener.close()
+        question_server.executor.shutdown()
+        return status_line
+    assert asyncio.run(run()).startswith(b"HTTP/1.1 400")
@@ -0,0 +1,51 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import game_assistant
+import game_api_helper
+
+def test_csv_section_survives_saturated_remote_pools(monkeypatch):
+    release = threading.Event()
+    def stuck_fetch(game_name, deadline=None):
+        # A provider that ignores the deadline and keeps its worker busy
+        release.wait(2)
+        return None
+
+    monkeypatch.setattr(game_assistant, "SOURCE_TIMEOUTS", {"IGDB": 0.2, "RAWG": 0.2})
+    monkeypatch.setattr(game_assistant, "fetch_from_igdb", stuck_fetch)
+    monkeypatch.setattr(game_assistant, "fetch_from_rawg", stuck_fetch)
+    monkeypatch.setattr(game_assistant, "fetch_from_csv", lambda game_name: f"{game_name} from the catalog")
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=32) as callers:
+            answers = list(callers.map(game_assistant.fetch_data_from_all_sources, [f"Game {i}" for i in range(64)]))
+        elapsed = time.perf_counter() - start
+    finally:
+        release.set()
+
+    assert all(answer == f"CSV Data:\nGame {i} from the catalog\n" for i, answer in enumerate(answers))
+    assert elapsed < 1.5
+
+def test_send_stops_retrying_at_the_deadline(monkeypatch):
+    class Unavailable:
+        status_code = 503
+        text = "unavailable"
+        headers = {"Retry-After": "5"}
+
+    attempts = []
+    def send():
+        attempts.append(time.monotonic())
+        return Unavailable()
+
+    monkeypatch.setitem(game_api_helper.circuit_breakers, "rawg", game_api_helper.CircuitBreaker("rawg", 100, 30))
+
+    start = time.monotonic()
+    try:
+        game_api_helper._send("rawg", "rawg.request", send, deadline=start + 0.3)
+    except RuntimeError as e:
+        assert "after 1 attempts" in str(e)
+    else:
+        raise AssertionError("expected the request to fail")
+    assert len(attempts) == 1
+    assert time.monotonic() - start < 0.3
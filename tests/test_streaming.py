@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+import pytest
+import game_assistant
+from benchmarks.memory_mongo import MemoryDatabase
+
+def run_event(name, status):
+    return SimpleNamespace(event=name, data=SimpleNamespace(id="run_1", status=status))
+
+def step_event(name, status):
+    return SimpleNamespace(event=name, data=SimpleNamespace(id="step_1", status=status))
+
+def delta_event(text):
+    content = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+    return SimpleNamespace(event="thread.message.delta", data=SimpleNamespace(delta=SimpleNamespace(content=[content])))
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        return iter(self.events)
+
+class FakeClient:
+    def __init__(self, events):
+        self.cancelled = []
+        runs = SimpleNamespace(
+            create=lambda **kwargs: FakeStream(events),
+            cancel=lambda run_id, thread_id: self.cancelled.append(run_id),
+        )
+        self.beta = SimpleNamespace(threads=SimpleNamespace(runs=runs))
+
+@pytest.fixture
+def assistant(monkeypatch):
+    def install(events):
+        client = FakeClient(events)
+        monkeypatch.setattr(game_assistant, "get_openai_client", lambda: client)
+        monkeypatch.setattr(game_assistant, "setup_openai_assistant", lambda: SimpleNamespace(id="asst_1"))
+        monkeypatch.setattr(game_assistant, "get_user_thread", lambda user: "thread_1")
+        monkeypatch.setattr(game_assistant, "add_message_to_thread", lambda thread_id, question: SimpleNamespace(id="msg_1"))
+        monkeypatch.setattr(game_assistant, "record_thread_turn", lambda user: None)
+        monkeypatch.setattr(game_assistant, "INTERACTION_WRITE_BEHIND", False)
+        monkeypatch.setattr(game_assistant, "ANSWER_CACHE_ENABLED", False)
+        game_assistant.set_database(MemoryDatabase())
+        return client
+    yield install
+    game_assistant.set_database(None)
+
+def stream(generator):
+    deltas = []
+    while True:
+        try:
+            deltas.append(next(generator))
+        except StopIteration as done:
+            return deltas, done.value
+
+def test_run_step_events_do_not_end_the_stream(assistant):
+    client = assistant([
+        run_event("thread.run.created", "queued"),
+        run_event("thread.run.in_progress", "in_progress"),
+        delta_event("Let me compute that. "),
+        step_event("thread.run.step.completed", "completed"),
+        delta_event("The answer is 42."),
+        run_event("thread.run.completed", "completed"),
+    ])
+    deltas, status = stream(game_assistant.stream_assistant({"userId": "u1"}, "What is 6 * 7?"))
+    assert deltas == ["Let me compute that. ", "The answer is 42."]
+    assert status == "completed"
+    assert client.cancelled == []
+
+def test_failed_run_is_cancelled_and_saved_as_partial(assistant):
+    client = assistant([
+        run_event("thread.run.created", "queued"),
+        delta_event("Partial "),
+        step_event("thread.run.step.failed", "failed"),
+        delta_event("answer"),
+        run_event("thread.run.failed", "failed"),
+    ])
+    deltas = list(game_assistant.stream_answer("u1", "Explain speedrunning"))
+    assert deltas == ["Partial ", "answer"]
+    assert client.cancelled == ["run_1"]
+    stored = game_assistant.get_questions_collection().find_one({"userId": "u1"})
+    assert stored["source"] == "assistant_partial"
+    assert stored["response"] == "Partial answer"
+
+def test_complete_stream_is_saved_once(assistant):
+    assistant([
+        run_event("thread.run.created", "queued"),
+        delta_event("Let me compute that. "),
+        step_event("thread.run.step.completed", "completed"),
+        delta_event("The answer is 42."),
+        run_event("thread.run.completed", "completed"),
+    ])
+    assert "".join(game_assistant.stream_answer("u1", "What is 6 * 7?")) == "Let me compute that. The answer is 42."
+    stored = list(game_assistant.get_questions_collection().find({"userId": "u1"}))
+    assert [(interaction["source"], interaction["response"]) for interaction in stored] == [("assistant", "Let me compute that. The answer is 42.")]
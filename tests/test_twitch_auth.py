@@ -0,0 +1,50 @@
+import threading
+import time
+from twitch_auth import TwitchTokenManager
+
+def manager_in_refresh_window(request_token, retry_interval=10.0):
+    manager = TwitchTokenManager(refresh_margin=300, cache_path=None, retry_interval=retry_interval)
+    manager._token, manager._expires_at = "old", time.time() + 100
+    manager._request_token = request_token
+    return manager
+
+def test_callers_are_served_while_the_background_refresh_runs():
+    release = threading.Event()
+    def slow_request():
+        release.wait(5)
+        return "new", time.time() + 3600
+    manager = manager_in_refresh_window(slow_request)
+
+    start = time.perf_counter()
+    tokens = [manager.get_token() for _ in range(5)]
+    assert time.perf_counter() - start < 0.5
+    assert tokens == ["old"] * 5
+
+    release.set()
+    manager._background_refresh.join(5)
+    assert manager.get_token() == "new"
+
+def test_failed_background_refresh_backs_off():
+    attempts = []
+    def failing_request():
+        attempts.append(time.time())
+        raise RuntimeError("twitch is down")
+    manager = manager_in_refresh_window(failing_request, retry_interval=60)
+
+    for _ in range(20):
+        assert manager.get_token() == "old"
+        if manager._background_refresh:
+            manager._background_refresh.join(5)
+    assert len(attempts) == 1
+
+    # The next attempt waits twice as long after another failure
+    manager._background_retry_at = 0.0
+    manager.get_token()
+    manager._background_refresh.join(5)
+    assert len(attempts) == 2
+    assert manager._background_retry_at - time.time() > 100
+
+def test_expired_token_is_refreshed_before_returning():
+    manager = manager_in_refresh_window(lambda: ("new", time.time() + 3600))
+    manager._expires_at = time.time() - 1
+    assert manager.get_token() == "new"
@@ -0,0 +1,45 @@
+import threading
+import time
+from write_behind import WriteBehindQueue
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_spilled_items_are_replayed_once_writes_succeed_again(tmp_path):
+    written = []
+    available = threading.Event()
+    def flush(batch):
+        if not available.is_set():
+            raise ConnectionError("database unavailable")
+        written.extend(item["n"] for item in batch)
+
+    spill_path = tmp_path / "spill.jsonl"
+    queue = WriteBehindQueue(flush, max_batch=2, flush_interval=0.05, spill_path=str(spill_path))
+    try:
+        queue.put({"n": 1})
+        queue.put({"n": 2})
+        assert wait_for(lambda: queue.metrics()["spilled"] == 2)
+
+        available.set()
+        queue.put({"n": 3})
+        queue.put({"n": 4})
+        assert wait_for(lambda: sorted(written) == [1, 2, 3, 4])
+        assert not spill_path.exists()
+    finally:
+        queue.close()
+
+def test_replay_only_fills_the_room_left_in_the_buffer(tmp_path):
+    spill_path = tmp_path / "spill.jsonl"
+    spill_path.write_text("".join(f'{{"n": {n}}}\n' for n in range(5)), encoding="utf-8")
+    written = []
+    queue = WriteBehindQueue(lambda batch: written.extend(item["n"] for item in batch),
+                             max_batch=1, flush_interval=0.05, max_queue=2, spill_path=str(spill_path))
+    try:
+        assert queue.metrics()["depth"] <= 2
+        assert wait_for(lambda: written == [0, 1, 2, 3, 4])
+        assert not spill_path.exists()
+    finally:
+        queue.close()
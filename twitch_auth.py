@@ -1,8 +1,17 @@
 import datetime
+import json
 import logging
 import os
-import requests
+import threading
+import time
 from dotenv import load_dotenv
+from http_sessions import get_session, REQUEST_TIMEOUT
+from telemetry import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: the shared token file is used without an inter-process lock
+    fcntl = None
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -13,40 +22,168 @@ TWITCH_CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
 TWITCH_REDIRECT_URI = os.getenv("TWITCH_REDIRECT_URI")
 TWITCH_TOKEN_URL = os.getenv("TWITCH_TOKEN_URL")
 
-# Variables to store the access token and its expiration time
-cached_access_token = None
-token_expiry_time = None
+# Tokens are refreshed this many seconds before they expire
+TWITCH_TOKEN_REFRESH_MARGIN = float(os.getenv("TWITCH_TOKEN_REFRESH_MARGIN", "300"))
+# Seconds before retrying a failed background refresh, doubling after each further failure
+TWITCH_TOKEN_RETRY_INTERVAL = float(os.getenv("TWITCH_TOKEN_RETRY_INTERVAL", "10"))
+# Optional file used to share the token between worker processes
+TWITCH_TOKEN_CACHE_PATH = os.getenv("TWITCH_TOKEN_CACHE_PATH")
 
-# Function to get a client credentials access token from Twitch
-def get_client_credentials_access_token():
-    global cached_access_token, token_expiry_time
-    
-    # Check if we have a cached token that hasn't expired
-    if cached_access_token and token_expiry_time and token_expiry_time > datetime.datetime.now():
-        return cached_access_token
-    
-    logging.info("Fetching new access token")
+# Client credentials token cache. Only one caller refreshes at a time while the others wait
+# for its result, tokens close to expiry are refreshed in the background while the current
+# one is still served (backing off after failures), and the token can be shared across
+# processes through a locked file.
+class TwitchTokenManager:
+    def __init__(self,
+                 refresh_margin: float = TWITCH_TOKEN_REFRESH_MARGIN,
+                 cache_path: str = TWITCH_TOKEN_CACHE_PATH,
+                 retry_interval: float = TWITCH_TOKEN_RETRY_INTERVAL):
+        self.refresh_margin = refresh_margin
+        self.cache_path = cache_path
+        self.retry_interval = retry_interval
+        self._token = None
+        self._expires_at = 0.0
+        # Held for the whole token request
+        self._lock = threading.Lock()
+        # Only guards starting the background refresh, so callers serving the current token never wait on a request
+        self._background_lock = threading.Lock()
+        self._background_refresh = None
+        self._background_failures = 0
+        self._background_retry_at = 0.0
 
-    # Parameters for the token request
-    params = {
-        'client_id': TWITCH_CLIENT_ID,
-        'client_secret': TWITCH_CLIENT_SECRET,
-        'grant_type': 'client_credentials'
-    }
+    def get_token(self) -> str:
+        now = time.time()
+        if self._token and now < self._expires_at - self.refresh_margin:
+            return self._token
+
+        if self._token and now < self._expires_at:
+            self._start_background_refresh()
+            return self._token
+
+        with self._lock:
+            self._refresh_if_needed()
+            return self._token
+
+    def _needs_refresh(self) -> bool:
+        return not self._token or time.time() >= self._expires_at - self.refresh_margin
+
+    def _start_background_refresh(self):
+        with self._background_lock:
+            if self._background_refresh and self._background_refresh.is_alive():
+                return
+            if time.time() < self._background_retry_at:
+                return
+            self._background_refresh = threading.Thread(target=self._background_refresh_run, name="twitch-token-refresh", daemon=True)
+            self._background_refresh.start()
+
+    def _background_refresh_run(self):
+        try:
+            with self._lock:
+                self._refresh_if_needed()
+        except Exception as e:
+            with self._background_lock:
+                self._background_failures += 1
+                delay = self.retry_interval * 2 ** (self._background_failures - 1)
+                self._background_retry_at = time.time() + delay
+            logging.error(f"Background Twitch token refresh failed, retrying in {delay:.0f}s: {e}")
+        else:
+            with self._background_lock:
+                self._background_failures = 0
+                self._background_retry_at = 0.0
+
+    # Called with self._lock held
+    def _refresh_if_needed(self):
+        if not self._needs_refresh():
+            return
+        if self._adopt_shared_token():
+            return
+        with self._shared_lock():
+            # Another process may have refreshed while we waited for the file lock
+            if self._adopt_shared_token():
+                return
+            token, expires_at = self._request_token()
+            self._token, self._expires_at = token, expires_at
+            self._write_shared_token()
 
-    # Make the POST request to Twitch to get a new access token
-    response = requests.post(TWITCH_TOKEN_URL, data=params)
-    response.raise_for_status()  # Raise an error for any unsuccessful request
-    token_data = response.json()
+    def _request_token(self):
+        logging.info("Fetching new access token")
 
-    # Cache the new token and calculate its expiration time
-    cached_access_token = token_data['access_token']
-    token_expiry_time = datetime.datetime.now() + datetime.timedelta(seconds=token_data['expires_in'])
+        # Parameters for the token request
+        params = {
+            'client_id': TWITCH_CLIENT_ID,
+            'client_secret': TWITCH_CLIENT_SECRET,
+            'grant_type': 'client_credentials'
+        }
 
-    logging.info(f"New access token fetched: {cached_access_token}")
-    logging.info(f"Token expires at: {token_expiry_time}")
+        # Make the POST request to Twitch to get a new access token
+        with span("twitch.token.refresh"):
+            response = get_session("twitch").post(TWITCH_TOKEN_URL, data=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()  # Raise an error for any unsuccessful request
+        token_data = response.json()
 
-    return cached_access_token
+        expires_at = time.time() + token_data['expires_in']
+        logging.info(f"Token expires at: {datetime.datetime.fromtimestamp(expires_at)}")
+        return token_data['access_token'], expires_at
+
+    # Use the token from the shared file if it is fresher than ours and not due for refresh
+    def _adopt_shared_token(self) -> bool:
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, encoding="utf-8") as cache_file:
+                record = json.load(cache_file)
+        except (OSError, ValueError):
+            return False
+        if record.get("expires_at", 0) - self.refresh_margin <= time.time():
+            return False
+        self._token, self._expires_at = record["access_token"], record["expires_at"]
+        return True
+
+    def _write_shared_token(self):
+        if not self.cache_path:
+            return
+        temp_path = f"{self.cache_path}.tmp"
+        try:
+            # The file holds a credential, so it is only readable by the owner
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+                json.dump({"access_token": self._token, "expires_at": self._expires_at}, cache_file)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            logging.error(f"Could not write shared Twitch token cache: {e}")
+
+    def _shared_lock(self):
+        return _FileLock(f"{self.cache_path}.lock") if self.cache_path else _NoLock()
+
+# Exclusive inter-process lock held for the duration of a with block
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+token_manager = TwitchTokenManager()
+
+# Function to get a client credentials access token from Twitch
+def get_client_credentials_access_token():
+    return token_manager.get_token()
 
 # Function to get user data from Twitch using the access token
 def get_twitch_user_data(access_token):
@@ -57,8 +194,8 @@ def get_twitch_user_data(access_token):
     }
     
     # Make the GET request to fetch the user data from Twitch
-    response = requests.get('https://api.twitch.tv/helix/users', headers=headers)
+    response = get_session("twitch").get('https://api.twitch.tv/helix/users', headers=headers, timeout=REQUEST_TIMEOUT)
     if response.status_code == 200:
         return response.json()
     else:
-        raise Exception("Failed to retrieve user data")
\ No newline at end of file
+        raise Exception("Failed to retrieve user data")
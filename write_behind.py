@@ -0,0 +1,197 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+from bson import ObjectId
+
+# JSON encoding for spilled items, which hold datetimes and ObjectIds
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _decode(value: dict):
+    if "$date" in value:
+        return datetime.datetime.fromisoformat(value["$date"])
+    if "$oid" in value:
+        return ObjectId(value["$oid"])
+    return value
+
+# Buffers items in memory and hands them to flush_fn in batches from a background thread,
+# once max_batch items are waiting or flush_interval seconds have passed.
+# When the buffer is full, put() waits up to put_timeout for room and then appends the item
+# to spill_path so it is not lost; spilled items are replayed on start and after every
+# successful flush, as far as the buffer has room. Without a spill file, put() blocks until
+# there is room and failed batches are retried.
+class WriteBehindQueue:
+    def __init__(self,
+                 flush_fn: Callable[[List[dict]], None],
+                 max_batch: int = 100,
+                 flush_interval: float = 1.0,
+                 max_queue: int = 10000,
+                 put_timeout: float = 0.05,
+                 spill_path: Optional[str] = None):
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.spill_path = spill_path
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        self._retry_pending = False
+        self._metrics = {
+            "enqueued": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+
+        self.replay_spill()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Queue an item for the next flush
+    def put(self, item: dict):
+        with self._cond:
+            if not self._closed:
+                # Without a spill file the only safe option is to wait for room
+                deadline = time.monotonic() + self.put_timeout if self.spill_path else None
+                while len(self._items) >= self.max_queue and not self._closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._closed and len(self._items) < self.max_queue:
+                    self._items.append(item)
+                    self._metrics["enqueued"] += 1
+                    if len(self._items) >= self.max_batch:
+                        self._cond.notify_all()
+                    return
+
+        if self._closed:
+            # Late writes after shutdown go straight through
+            self._write([item])
+        else:
+            self._spill([item])
+
+    # Write out everything currently buffered
+    def flush(self):
+        while self._flush_batch():
+            pass
+
+    # Stop the background thread and flush what is left; called automatically at exit
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+        if self._items:
+            logging.error(f"Write-behind queue closed with {len(self._items)} unwritten items")
+
+    def metrics(self) -> dict:
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics["depth"] = len(self._items)
+        return metrics
+
+    # Re-enqueue spilled items, oldest first, up to the room left in the buffer; the rest stay
+    # in the spill file for a later replay
+    def replay_spill(self):
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with self._spill_lock:
+            with self._cond:
+                room = self.max_queue - len(self._items)
+            if room <= 0:
+                return
+            with open(self.spill_path, encoding="utf-8") as spill_file:
+                lines = [line for line in spill_file if line.strip()]
+            items = [json.loads(line, object_hook=_decode) for line in lines[:room]]
+            if len(lines) > room:
+                remaining_path = f"{self.spill_path}.tmp"
+                with open(remaining_path, "w", encoding="utf-8") as remaining_file:
+                    remaining_file.writelines(lines[room:])
+                os.replace(remaining_path, self.spill_path)
+            else:
+                os.remove(self.spill_path)
+            with self._cond:
+                self._items.extend(items)
+                self._metrics["replayed"] += len(items)
+        if items:
+            logging.info(f"Replayed {len(items)} spilled items from {self.spill_path}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # After a failed write, wait a full interval before retrying even if a batch is ready
+                if not self._closed and (self._retry_pending or len(self._items) < self.max_batch):
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            # The store is reachable again, so spilled items can go back in the queue
+            if self._flush_batch() and self.spill_path:
+                self.replay_spill()
+
+    # Flush up to max_batch items; returns False when there was nothing to flush or the flush failed
+    def _flush_batch(self) -> bool:
+        with self._flush_lock:
+            with self._cond:
+                if not self._items:
+                    return False
+                batch = [self._items.popleft() for _ in range(min(self.max_batch, len(self._items)))]
+                self._cond.notify_all()
+            return self._write(batch)
+
+    def _write(self, batch: List[dict]) -> bool:
+        start = time.monotonic()
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            logging.error(f"Write-behind flush of {len(batch)} items failed: {e}")
+            with self._cond:
+                self._metrics["flush_errors"] += 1
+                self._retry_pending = not self.spill_path
+                if not self.spill_path:
+                    # Keep the batch at the front of the queue for the next attempt
+                    self._items.extendleft(reversed(batch))
+            if self.spill_path:
+                self._spill(batch)
+            return False
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._retry_pending = False
+            self._metrics["flushes"] += 1
+            self._metrics["flushed"] += len(batch)
+            self._metrics["last_flush_seconds"] = elapsed
+            self._metrics["total_flush_seconds"] += elapsed
+            self._metrics["max_flush_seconds"] = max(self._metrics["max_flush_seconds"], elapsed)
+        return True
+
+    def _spill(self, items: List[dict]):
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+                for item in items:
+                    spill_file.write(json.dumps(item, default=_encode) + "\n")
+        with self._cond:
+            self._metrics["spilled"] += len(items)